@@ -7,7 +7,7 @@ DEFAULT_TOP_P = 0.9
 DEFAULT_TOP_K = 40
 DEFAULT_MAX_TOKENS = 1000
 
-# Available models
+# Available models (fallback when the installed list cannot be fetched from Ollama)
 AVAILABLE_MODELS = [
     "llama3.2",
     "llama3.1",
@@ -21,10 +21,30 @@ PAGE_ICON = "🤖"
 LAYOUT = "wide"
 
 # File paths
-CHAT_HISTORY_FILE = "data/chat_history.json"
+CHAT_HISTORY_FILE = "data/chat_history.json"  # Legacy format, imported once into the store
+CHAT_HISTORY_DB = "data/chat_history.db"
+CSV_EXPORT_FILE = "data/ollama_output.csv"  # Rolling CSV export, appended to
+
+# Chat history store settings
+CHAT_HISTORY_USER = "default"
+CHAT_HISTORY_MAX_ENTRIES = 10000  # Per user, applied on compaction
+HISTORY_PAGE_SIZE = 20  # Conversations rendered per history page
 
 # Ollama settings
 OLLAMA_BASE_URL = "http://localhost:11434"
 
+# Conversation memory settings
+MEMORY_TOKEN_BUDGET = 2048  # Prompt tokens available for system prompt, summary and recent turns
+MEMORY_MAX_TURNS = 50  # Most recent exchanges sent verbatim; older ones are folded into the summary
+MEMORY_SUMMARY_BATCH_TURNS = 4  # Turns folded into the summary per summarization call
+MEMORY_SUMMARY_MAX_TOKENS = 256  # Length cap for the running summary
+
+# Model comparison settings
+COMPARISON_MAX_CONCURRENCY = 2  # Models generating at the same time in comparison mode
+
+# Streaming display settings
+STREAM_UPDATE_INTERVAL = 0.1  # Seconds between re-renders of a streamed answer
+STREAM_MAX_BUFFERED_CHARS = 500  # Re-render early once this many characters are buffered
+
 # Streamlit settings
 DEFAULT_PORT = 8501
@@ -1,14 +1,23 @@
 import streamlit as st
 import ollama
-import csv
 import json
 from datetime import datetime
 import os
 import sys
 
-# Add the config directory to the path
+# Add the config and workspace shared directories to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'config'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
 from settings import *
+from chat_history.store import ChatHistoryStore
+from chat_history.export import ChatExporter
+from stream_renderer import StreamRenderer
+from conversation_memory import ConversationMemory, SUMMARY_SYSTEM_PROMPT
+from model_fanout import ModelFanOut
+from llm import generation
+from llm.generation import active_generations
+from llm.models import get_model_manager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # Configure Streamlit page
 st.set_page_config(
@@ -20,27 +29,74 @@ st.set_page_config(
 st.title(f"{PAGE_ICON} {PAGE_TITLE}")
 st.write("Send prompts to LLM models with custom parameters.")
 
-# Chat history file with proper path
+# Chat history paths
 CHAT_HISTORY_PATH = os.path.join(os.path.dirname(__file__), '..', CHAT_HISTORY_FILE)
+CHAT_HISTORY_DB_PATH = os.path.join(os.path.dirname(__file__), '..', CHAT_HISTORY_DB)
+CSV_EXPORT_PATH = os.path.join(os.path.dirname(__file__), '..', CSV_EXPORT_FILE)
+
+def pair_legacy_messages(messages):
+    """Group the legacy flat message list (newest first) into exchanges"""
+    exchanges = []
+    for idx in range(0, len(messages), 2):
+        pair = messages[idx:idx + 2]
+        exchange = {'user': None, 'assistant': None}
+        for msg in pair:
+            exchange[msg['role']] = msg
+        exchanges.append(exchange)
+    return exchanges
+
+@st.cache_resource
+def get_history_store():
+    """Open the chat history store once per server process"""
+    store = ChatHistoryStore(CHAT_HISTORY_DB_PATH, max_entries_per_user=CHAT_HISTORY_MAX_ENTRIES)
+    store.import_legacy_json(CHAT_HISTORY_PATH, user_id=CHAT_HISTORY_USER, transform=pair_legacy_messages)
+    return store
+
+def get_session_id():
+    """Return the Streamlit session id used to key history entries"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
 
 # Functions to handle persistent chat history
-def save_chat_history(history):
-    """Save chat history to JSON file"""
+def save_chat_exchange(user_msg, assistant_msg, comparison=None):
+    """Append one user/assistant exchange to the history store"""
+    exchange = {'user': user_msg, 'assistant': assistant_msg}
+    if comparison:
+        exchange['comparison'] = comparison
     try:
-        with open(CHAT_HISTORY_PATH, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        get_history_store().append(
+            exchange,
+            user_id=CHAT_HISTORY_USER,
+            session_id=get_session_id()
+        )
     except Exception as e:
         st.error(f"Error saving chat history: {e}")
 
-def load_chat_history():
-    """Load chat history from JSON file"""
+def load_history_page(before_id=None):
+    """Load one page of exchanges (newest first) and whether older ones exist"""
     try:
-        if os.path.exists(CHAT_HISTORY_PATH):
-            with open(CHAT_HISTORY_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        exchanges = get_history_store().page(
+            user_id=CHAT_HISTORY_USER,
+            limit=HISTORY_PAGE_SIZE + 1,
+            before_id=before_id
+        )
+        return exchanges[:HISTORY_PAGE_SIZE], len(exchanges) > HISTORY_PAGE_SIZE
     except Exception as e:
         st.error(f"Error loading chat history: {e}")
-    return []
+    return [], False
+
+def show_history_page(before_id=None):
+    """Replace the rendered history window with the page starting before `before_id`"""
+    exchanges, has_older = load_history_page(before_id)
+    st.session_state['history_page'] = exchanges
+    st.session_state['history_has_older'] = has_older
+
+def clear_chat_history():
+    """Delete this user's chat history from the store"""
+    try:
+        get_history_store().clear(user_id=CHAT_HISTORY_USER)
+    except Exception as e:
+        st.error(f"Error clearing chat history: {e}")
 
 def truncate_timestamp(timestamp_str):
     """Truncate timestamp to YYYY-MM-DDTHH:mm:ss format"""
@@ -51,35 +107,206 @@ def truncate_timestamp(timestamp_str):
     except:
         return timestamp_str
 
-def save_to_csv_file(content, model, temperature, top_p, top_k, max_tokens, response, system_prompt="", seed=None, stop_sequences="", stream=False):
-    """Save chat interaction to CSV file with datetime appended"""
-    now = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    filename = f"ollama_output_{now}.csv"
-    file_exists = os.path.isfile(filename)
+def summarize_conversation(model, previous_summary, turns_text):
+    """Fold new exchanges into the running conversation summary"""
+    prompt = ""
+    if previous_summary:
+        prompt += f"Existing summary:\n{previous_summary}\n\n"
+    prompt += f"New exchanges:\n{turns_text}"
+    response = ollama.chat(
+        model=model,
+        messages=[
+            {'role': 'system', 'content': SUMMARY_SYSTEM_PROMPT},
+            {'role': 'user', 'content': prompt}
+        ],
+        options={'temperature': 0.2, 'num_predict': MEMORY_SUMMARY_MAX_TOKENS}
+    )
+    return response['message']['content']
+
+def build_memory_messages(model, content, system_prompt):
+    """Build a bounded multi-turn prompt for this session's conversation"""
+    store = get_history_store()
+    session_id = get_session_id()
+    summary_key = f"memory_summary:{session_id}"
+
+    cached = store.get_meta(summary_key)
+    summary_state = json.loads(cached) if cached else None
+    # Every exchange the summary does not cover yet, so none drops out unsummarized;
+    # the window keeps this to about MEMORY_MAX_TURNS
+    after_id = summary_state['last_id'] if summary_state else None
+    turns = list(store.iter_entries(session_id=session_id, after_id=after_id))
+
+    memory = ConversationMemory(
+        summarize=lambda previous, turns_text: summarize_conversation(model, previous, turns_text),
+        token_budget=MEMORY_TOKEN_BUDGET,
+        summary_batch_turns=MEMORY_SUMMARY_BATCH_TURNS,
+        max_turns=MEMORY_MAX_TURNS
+    )
+    messages, new_state = memory.build_messages(turns, content, system_prompt, summary_state)
+    if new_state != summary_state and new_state['summary']:
+        store.set_meta(summary_key, json.dumps(new_state, ensure_ascii=False))
+    return messages
+
+def format_metrics(metrics):
+    """Format per-model timing metrics for display"""
+    ttft = metrics.get('ttft_s')
+    speed = metrics.get('tokens_per_s')
+    parts = [
+        f"⏱️ TTFT {ttft:.2f}s" if ttft is not None else "⏱️ TTFT N/A",
+        f"⚡ {speed:.1f} tok/s" if speed else "⚡ N/A",
+        f"🕒 total {metrics.get('total_s', 0):.2f}s"
+    ]
+    return " · ".join(parts)
+
+def build_assistant_msg(content, model, cancelled=False):
+    """Create the assistant history message for a (possibly partial) answer"""
+    assistant_msg = {
+        'role': 'assistant',
+        'content': content,
+        'timestamp': datetime.now().isoformat(),
+        'model': model
+    }
+    if cancelled:
+        assistant_msg['cancelled'] = True
+    return assistant_msg
+
+def run_comparison(models, messages, options, user_msg):
+    """Stream several models side by side and return one assistant message per model"""
+    fan_out = ModelFanOut(models, messages, options, max_concurrency=COMPARISON_MAX_CONCURRENCY,
+                          base_url=OLLAMA_BASE_URL)
+    active_generations.register(get_session_id(), fan_out)
+    results = {}
+    renderers = {}
+    stats_boxes = {}
+
+    st.markdown("**⚖️ Model Comparison:**")
+    for column, model_name in zip(st.columns(len(models)), models):
+        with column:
+            st.markdown(f"**🤖 {model_name}**")
+            renderers[model_name] = StreamRenderer(
+                st.empty(),
+                update_interval=STREAM_UPDATE_INTERVAL,
+                max_buffered_chars=STREAM_MAX_BUFFERED_CHARS
+            )
+            stats_boxes[model_name] = st.empty()
+        results[model_name] = {'role': 'assistant', 'model': model_name, 'content': "", 'metrics': None}
 
     try:
-        with open(filename, mode='a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            if not file_exists:
-                writer.writerow([
-                    'datetime', 'model', 'prompt', 'temperature', 'top_p', 'top_k',
-                    'max_tokens', 'seed', 'stop_sequences', 'system_prompt', 'stream', 'response'
-                ])
-            writer.writerow([
-                datetime.now().isoformat(),
-                model,
-                content,
-                temperature,
-                top_p,
-                top_k,
-                max_tokens,
-                seed or '',
-                stop_sequences,
-                system_prompt,
-                stream,
-                response
-            ])
-        return filename
+        for model_name, kind, payload in fan_out.events():
+            if kind == 'token':
+                renderers[model_name].append(payload)
+            elif kind == 'done':
+                results[model_name]['content'] = renderers[model_name].flush()
+                results[model_name]['metrics'] = payload
+                stats_boxes[model_name].caption(format_metrics(payload))
+            else:
+                results[model_name]['content'] = renderers[model_name].flush()
+                results[model_name]['error'] = payload
+                stats_boxes[model_name].error(f"❌ {payload}")
+    except BaseException:
+        # Cancel clicked (or the run failed): stop every model and keep partial answers
+        fan_out.cancel()
+        partial = []
+        for model_name in models:
+            result = results[model_name]
+            if not result['metrics']:
+                result['content'] = renderers[model_name].text
+                result['cancelled'] = True
+            result['timestamp'] = datetime.now().isoformat()
+            partial.append(result)
+        if any(result['content'] for result in partial):
+            save_chat_exchange(user_msg, None, partial)
+        raise
+    finally:
+        active_generations.unregister(get_session_id(), fan_out)
+
+    timestamp = datetime.now().isoformat()
+    for model_name in models:
+        results[model_name]['timestamp'] = timestamp
+        if fan_out.was_cancelled(model_name):
+            results[model_name]['cancelled'] = True
+    return [results[model_name] for model_name in models]
+
+def render_exchange(exchange):
+    """Render a single user/assistant exchange"""
+    user_msg = exchange.get('user')
+    assistant_msg = exchange.get('assistant')
+
+    with st.container():
+        if user_msg:
+            timestamp = user_msg.get('timestamp', 'Unknown time')
+            params = user_msg.get('parameters', {})
+
+            st.markdown(f"**👤 You** ({truncate_timestamp(timestamp)}):")
+            st.markdown(f"> {user_msg['content']}")
+
+            if params:
+                param_str = f"🔧 **Parameters:** temp={params.get('temperature', 'N/A')}, top_p={params.get('top_p', 'N/A')}, top_k={params.get('top_k', 'N/A')}, max_tokens={params.get('max_tokens', 'N/A')}"
+                if params.get('seed'):
+                    param_str += f", seed={params.get('seed')}"
+                if params.get('system_prompt'):
+                    param_str += f", system_prompt=✓"
+                st.caption(param_str)
+
+        if assistant_msg:
+            timestamp = assistant_msg.get('timestamp', 'Unknown time')
+            model_used = assistant_msg.get('model', 'Unknown model')
+
+            st.markdown(f"**🤖 {model_used}** ({truncate_timestamp(timestamp)}):")
+            st.markdown(assistant_msg['content'])
+            if assistant_msg.get('cancelled'):
+                st.caption("⏹️ Cancelled - partial response")
+
+        if exchange.get('comparison'):
+            columns = st.columns(len(exchange['comparison']))
+            for column, result in zip(columns, exchange['comparison']):
+                with column:
+                    st.markdown(f"**🤖 {result.get('model', 'Unknown model')}**")
+                    if result.get('error'):
+                        st.error(result['error'])
+                    st.markdown(result.get('content', ''))
+                    if result.get('metrics'):
+                        st.caption(format_metrics(result['metrics']))
+                    if result.get('cancelled'):
+                        st.caption("⏹️ Cancelled - partial response")
+
+        # Add visual separation between conversations
+        st.markdown("---")
+
+CSV_EXPORT_COLUMNS = [
+    'datetime', 'model', 'prompt', 'temperature', 'top_p', 'top_k',
+    'max_tokens', 'seed', 'stop_sequences', 'system_prompt', 'stream', 'response'
+]
+
+def exchange_to_csv_row(exchange):
+    """Flatten a stored exchange into a CSV export row"""
+    user_msg = exchange.get('user') or {}
+    assistant_msg = exchange.get('assistant') or {}
+    params = user_msg.get('parameters', {})
+    return {
+        'datetime': user_msg.get('timestamp', ''),
+        'model': assistant_msg.get('model', ''),
+        'prompt': user_msg.get('content', ''),
+        'temperature': params.get('temperature', ''),
+        'top_p': params.get('top_p', ''),
+        'top_k': params.get('top_k', ''),
+        'max_tokens': params.get('max_tokens', ''),
+        'seed': params.get('seed') or '',
+        'stop_sequences': params.get('stop_sequences', ''),
+        'system_prompt': params.get('system_prompt', ''),
+        'stream': params.get('stream', ''),
+        'response': assistant_msg.get('content', '')
+    }
+
+@st.cache_resource
+def get_csv_exporter():
+    """Create the CSV exporter once per server process"""
+    return ChatExporter(get_history_store(), CSV_EXPORT_COLUMNS, exchange_to_csv_row)
+
+def save_to_csv_file(exchange):
+    """Append one exchange to the rolling CSV export file"""
+    try:
+        return get_csv_exporter().append_entry(CSV_EXPORT_PATH, exchange)
     except Exception as e:
         st.error(f"Error saving to CSV: {e}")
         return None
@@ -89,12 +316,34 @@ if 'is_waiting' not in st.session_state:
     st.session_state['is_waiting'] = False
 if 'cancel_requested' not in st.session_state:
     st.session_state['cancel_requested'] = False
-if 'chat_history' not in st.session_state:
-    st.session_state['chat_history'] = load_chat_history()
+if 'history_page' not in st.session_state:
+    # Cursors of the pages stacked above the current one (None = newest page)
+    st.session_state['history_cursors'] = [None]
+    show_history_page()
 
 # Disable input widgets when waiting for response
 input_disabled = st.session_state['is_waiting']
 
+# Model selection (outside the form so a change can warm the model right away)
+model_manager = get_model_manager(OLLAMA_BASE_URL)
+installed_models = model_manager.list_models(fallback=AVAILABLE_MODELS) or AVAILABLE_MODELS
+model_options = installed_models + ["custom"]
+
+col1, col2 = st.columns([2, 1])
+with col1:
+    model_choice = st.selectbox("Model", model_options, disabled=input_disabled)
+    if model_choice == "custom":
+        model = st.text_input("Enter custom model name", "", disabled=input_disabled)
+    else:
+        model = model_choice
+with col2:
+    if model and model.strip() and st.session_state.get('warm_model') != model:
+        # Load the newly selected model in the background before the first request
+        st.session_state['warm_model'] = model
+        model_manager.warm_async(model)
+    if model and model.strip():
+        st.caption(f"📦 {model_manager.describe(model)}")
+
 # Create main input form
 with st.form(key="chat_form", clear_on_submit=False):
     st.subheader("📝 Chat Input")
@@ -108,16 +357,11 @@ with st.form(key="chat_form", clear_on_submit=False):
         help="Enter your prompt here"
     )
 
-    # Model selection
-    col1, col2 = st.columns([2, 1])
-    with col1:
-        model_options = ["llama3.2", "mistral", "codellama", "custom"]
-        model_choice = st.selectbox("Model", model_options, disabled=input_disabled)
-        if model_choice == "custom":
-            model = st.text_input("Enter custom model name", "", disabled=input_disabled)
-        else:
-            model = model_choice
-
+    # Model comparison
+    compare_mode = st.checkbox("⚖️ Compare models", disabled=input_disabled,
+                               help="Send the prompt to several models at once and show the answers side by side")
+    compare_models = st.multiselect("Models to compare", installed_models,
+                                    default=installed_models[:2], disabled=input_disabled)
 
     # Advanced parameters in expandable section
     with st.expander("🔧 Advanced Parameters", expanded=False):
@@ -144,6 +388,8 @@ with st.form(key="chat_form", clear_on_submit=False):
     with col1:
         save_to_csv = st.checkbox("💾 Save output to CSV file", disabled=input_disabled,
                                 help="Saves conversation to CSV with timestamp")
+        use_memory = st.checkbox("🧠 Remember conversation", value=True, disabled=input_disabled,
+                                 help="Send recent turns and a summary of older ones with each prompt")
 
     with col2:
         stream = st.checkbox("Stream response", value=True, disabled=input_disabled)
@@ -159,20 +405,27 @@ with st.form(key="chat_form", clear_on_submit=False):
 # Cancel button (outside form to work immediately)
 if st.session_state['is_waiting']:
     if st.button("❌ Cancel Request", use_container_width=True, type="secondary"):
+        # The interrupted run closes its own request; also cancel anything still registered for this session
+        active_generations.cancel(get_session_id())
         st.session_state['cancel_requested'] = True
         st.session_state['is_waiting'] = False
+        st.session_state['history_cursors'] = [None]
+        show_history_page()
         st.rerun()
 
 # Handle clear history
 if clear_clicked:
-    st.session_state['chat_history'] = []
-    save_chat_history([])
+    clear_chat_history()
+    st.session_state['history_cursors'] = [None]
+    show_history_page()
     st.success("✅ Chat history cleared!")
     st.rerun()
 
 # Handle send request
 if send_clicked and not st.session_state['is_waiting']:
-    if not model or (model_choice == "custom" and not model.strip()):
+    if compare_mode and not compare_models:
+        st.error("❌ Please select at least one model to compare.")
+    elif not compare_mode and (not model or (model_choice == "custom" and not model.strip())):
         st.error("❌ Please select or enter a model name.")
     elif not content.strip():
         st.error("❌ Prompt content cannot be empty.")
@@ -187,11 +440,19 @@ if st.session_state['is_waiting'] and not st.session_state['cancel_requested']:
     with st.spinner("🤖 Generating response... Click 'Cancel Request' to stop."):
         try:
             # Prepare messages
-            messages = []
-            if system_prompt.strip():
+            if use_memory:
+                summary_model = compare_models[0] if compare_mode else model
+                messages = build_memory_messages(summary_model, content, system_prompt)
+            else:
+                messages = []
+                if system_prompt.strip():
+                    messages.append({
+                        'role': 'system',
+                        'content': system_prompt.strip()
+                    })
                 messages.append({
-                    'role': 'system',
-                    'content': system_prompt.strip()
+                    'role': 'user',
+                    'content': content
                 })
 
             # Build options dict
@@ -204,83 +465,79 @@ if st.session_state['is_waiting'] and not st.session_state['cancel_requested']:
             if seed is not None:
                 options['seed'] = seed
 
-            messages.append({
+            timestamp = datetime.now().isoformat()
+            user_msg = {
                 'role': 'user',
-                'content': content
-            })
-
-            # Make API call
-            response = ollama.chat(
-                model=model,
-                messages=messages,
-                stream=stream,
-                options=options
-            )
+                'content': content,
+                'timestamp': timestamp,
+                'parameters': {
+                    'temperature': temperature,
+                    'top_p': top_p,
+                    'top_k': top_k,
+                    'max_tokens': max_tokens,
+                    'seed': seed,
+                    'system_prompt': system_prompt,
+                    'stream': stream
+                }
+            }
+
+            if compare_mode:
+                comparison = run_comparison(compare_models, messages, options, user_msg)
+                final_response = "\n\n".join(result['content'] for result in comparison if result['content'])
+                cancelled = any(result.get('cancelled') for result in comparison)
+            else:
+                comparison = None
+                # Start a cancellable request; Cancel closes its connection so Ollama stops generating
+                model_manager.record_use(model)
+                handle = generation.chat(model, messages, options, base_url=OLLAMA_BASE_URL,
+                                         keep_alive=model_manager.keep_alive_for(model))
+                session_id = get_session_id()
+                active_generations.register(session_id, handle)
 
-            # Handle response
-            if stream:
                 response_container = st.container()
                 with response_container:
                     st.markdown("**🤖 AI Response:**")
                     response_box = st.empty()
-                    full_response = ""
-
-                for chunk in response:
-                    if st.session_state['cancel_requested']:
-                        break
-                    if 'message' in chunk and 'content' in chunk['message']:
-                        full_response += chunk['message']['content']
-                        response_box.markdown(full_response)
-
-                final_response = full_response
-            else:
-                if not st.session_state['cancel_requested']:
-                    final_response = response['message']['content']
-                    st.markdown("**🤖 AI Response:**")
-                    st.markdown(final_response)
-                else:
-                    final_response = ""
-
-            # Save to history and CSV if not cancelled
-            if not st.session_state['cancel_requested'] and final_response:
-                timestamp = datetime.now().isoformat()
-
-                # Add to chat history (newest first)
-                assistant_msg = {
-                    'role': 'assistant',
-                    'content': final_response,
-                    'timestamp': timestamp,
-                    'model': model
-                }
-
-                user_msg = {
-                    'role': 'user',
-                    'content': content,
-                    'timestamp': timestamp,
-                    'parameters': {
-                        'temperature': temperature,
-                        'top_p': top_p,
-                        'top_k': top_k,
-                        'max_tokens': max_tokens,
-                        'seed': seed,
-                        'system_prompt': system_prompt,
-                        'stream': stream
-                    }
-                }
-
-                # Insert at beginning (newest first)
-                st.session_state['chat_history'].insert(0, assistant_msg)
-                st.session_state['chat_history'].insert(0, user_msg)
-
-                # Save to persistent storage
-                save_chat_history(st.session_state['chat_history'])
-
-                # Save to CSV if requested
-                if save_to_csv:
-                    filename = save_to_csv_file(
-                        content, model, temperature, top_p, top_k, max_tokens,
-                        final_response, system_prompt, seed, "", stream
+                    renderer = StreamRenderer(
+                        response_box,
+                        update_interval=STREAM_UPDATE_INTERVAL,
+                        max_buffered_chars=STREAM_MAX_BUFFERED_CHARS,
+                        progress_only=not stream
                     )
+
+                try:
+                    for piece in handle.iter_text():
+                        renderer.append(piece)
+                except Exception:
+                    handle.cancel()
+                    raise
+                except BaseException:
+                    # Streamlit stops this run when Cancel is clicked: abort the
+                    # request and keep what was generated so far
+                    handle.cancel()
+                    if handle.text:
+                        save_chat_exchange(user_msg, build_assistant_msg(handle.text, model, cancelled=True))
+                    raise
+                finally:
+                    active_generations.unregister(session_id, handle)
+
+                # Always render whatever is left in the buffer
+                final_response = renderer.flush()
+                cancelled = handle.cancelled
+                model_manager.record_load(model, handle.final_chunk.get('load_duration'))
+                assistant_msg = build_assistant_msg(final_response, model, cancelled=cancelled)
+
+            # Save to history (partial answers are kept and marked as cancelled)
+            if final_response:
+                # Append to persistent storage and jump back to the newest page
+                save_chat_exchange(user_msg, None if comparison else assistant_msg, comparison)
+                st.session_state['history_cursors'] = [None]
+                show_history_page()
+
+                # Save to CSV if requested (one row per answering model)
+                if save_to_csv and not cancelled:
+                    for answer in (comparison or [assistant_msg]):
+                        filename = save_to_csv_file({'user': user_msg, 'assistant': answer})
                     if filename:
                         st.success(f"💾 Output saved to {filename}")
 
@@ -299,53 +556,24 @@ if st.session_state['is_waiting'] and not st.session_state['cancel_requested']:
 st.markdown("---")
 st.subheader("💬 Chat History")
 
-if st.session_state['chat_history']:
-    # Display newest conversations first
-    current_conversation = []
-
-    for idx, msg in enumerate(st.session_state['chat_history']):
-        current_conversation.append(msg)
-
-        # When we hit an assistant message or it's the last message, display the conversation
-        if msg['role'] == 'assistant' or idx == len(st.session_state['chat_history']) - 1:
-            # Find the user message for this conversation
-            user_msg = None
-            assistant_msg = None
-
-            for conv_msg in reversed(current_conversation):
-                if conv_msg['role'] == 'user' and user_msg is None:
-                    user_msg = conv_msg
-                elif conv_msg['role'] == 'assistant' and assistant_msg is None:
-                    assistant_msg = conv_msg
-
-            # Display the conversation in a container
-            with st.container():
-                if user_msg:
-                    timestamp = user_msg.get('timestamp', 'Unknown time')
-                    params = user_msg.get('parameters', {})
-
-                    st.markdown(f"**👤 You** ({truncate_timestamp(timestamp)}):")
-                    st.markdown(f"> {user_msg['content']}")
-
-                    if params:
-                        param_str = f"🔧 **Parameters:** temp={params.get('temperature', 'N/A')}, top_p={params.get('top_p', 'N/A')}, top_k={params.get('top_k', 'N/A')}, max_tokens={params.get('max_tokens', 'N/A')}"
-                        if params.get('seed'):
-                            param_str += f", seed={params.get('seed')}"
-                        if params.get('system_prompt'):
-                            param_str += f", system_prompt=✓"
-                        st.caption(param_str)
-
-                if assistant_msg:
-                    timestamp = assistant_msg.get('timestamp', 'Unknown time')
-                    model_used = assistant_msg.get('model', 'Unknown model')
-
-                    st.markdown(f"**🤖 {model_used}** ({truncate_timestamp(timestamp)}):")
-                    st.markdown(assistant_msg['content'])
-
-                # Add visual separation between conversations
-                st.markdown("---")
-
-            current_conversation = []
+if st.session_state['history_page']:
+    # Only the current window of at most HISTORY_PAGE_SIZE exchanges is rendered
+    for exchange in st.session_state['history_page']:
+        render_exchange(exchange)
+
+    cursors = st.session_state['history_cursors']
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(cursors) > 1 and st.button("⬆️ Newer conversations", use_container_width=True):
+            cursors.pop()
+            show_history_page(cursors[-1])
+            st.rerun()
+    with col2:
+        if st.session_state['history_has_older'] and st.button("⬇️ Load older conversations", use_container_width=True):
+            oldest_id = st.session_state['history_page'][-1]['_id']
+            cursors.append(oldest_id)
+            show_history_page(oldest_id)
+            st.rerun()
 else:
     st.info("📝 No chat history yet. Start a conversation above!")
 
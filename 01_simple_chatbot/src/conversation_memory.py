@@ -0,0 +1,109 @@
+import math
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Merge the existing summary with the new exchanges into one concise summary. "
+    "Keep facts, names, decisions and open questions; drop small talk. "
+    "Reply with the summary only."
+)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
+
+
+def format_turns(turns):
+    """Render exchanges as plain text for the summarizer."""
+    lines = []
+    for turn in turns:
+        lines.append(f"User: {turn['user']['content']}")
+        lines.append(f"Assistant: {turn['assistant']['content']}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """Token-budgeted multi-turn memory with rolling summarization.
+
+    The most recent turns are sent verbatim as long as they fit in
+    ``token_budget`` (and, with ``max_turns``, up to that many); the latest
+    exchange is always sent verbatim. Older turns are folded into a running
+    summary, which is extended rather than recomputed: a summary state
+    ``{'last_id', 'summary'}`` records the newest exchange it covers and is
+    reused until the window slides past it. When it does, the summary is
+    rolled forward over ``summary_batch_turns`` extra turns at a time so the
+    summarizer is not called on every message.
+    """
+
+    def __init__(self, summarize, token_budget=2048, summary_batch_turns=4, count_tokens=estimate_tokens,
+                 max_turns=None):
+        """``summarize(previous_summary, turns_text)`` returns the new summary text."""
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.summary_batch_turns = summary_batch_turns
+        self.count_tokens = count_tokens
+
+    def _turn_tokens(self, turn):
+        return self.count_tokens(turn['user']['content']) + self.count_tokens(turn['assistant']['content'])
+
+    def _window_start(self, turns, budget):
+        """Index of the oldest turn that still fits in ``budget`` when walking back from the newest."""
+        used = 0
+        start = len(turns)
+        for idx in range(len(turns) - 1, -1, -1):
+            used += self._turn_tokens(turns[idx])
+            if used > budget:
+                break
+            start = idx
+        return start
+
+    def build_messages(self, turns, user_content, system_prompt="", summary_state=None):
+        """Build the chat messages for the next request.
+
+        ``turns`` are this conversation's previous exchanges, oldest first, each a
+        dict with ``_id``, ``user`` and ``assistant`` messages. They must include
+        every exchange newer than the summary state's ``last_id``, or the ones
+        left out are never summarized. Returns the
+        message list and the (possibly updated) summary state to persist.
+        """
+        turns = [t for t in turns if t.get('user') and t.get('assistant')]
+        summary_state = summary_state or {'last_id': 0, 'summary': ""}
+
+        fixed_tokens = self.count_tokens(system_prompt) + self.count_tokens(user_content)
+        # Turns already covered by the cached summary never need to be sent again
+        covered = sum(1 for t in turns if t['_id'] <= summary_state['last_id'])
+
+        while True:
+            budget = max(self.token_budget - fixed_tokens - self.count_tokens(summary_state['summary']), 0)
+            start = self._window_start(turns, budget)
+            if self.max_turns is not None:
+                start = max(start, len(turns) - self.max_turns)
+            if start <= covered:
+                start = covered
+                break
+            # Roll the summary forward, a few turns past what is strictly needed,
+            # but never over the latest exchange
+            end = min(start + self.summary_batch_turns - 1, len(turns) - 1)
+            if end <= covered:
+                start = covered
+                break
+            new_summary = self.summarize(summary_state['summary'], format_turns(turns[covered:end]))
+            summary_state = {'last_id': turns[end - 1]['_id'], 'summary': new_summary.strip()}
+            covered = end
+
+        messages = []
+        if system_prompt.strip():
+            messages.append({'role': 'system', 'content': system_prompt.strip()})
+        if summary_state['summary']:
+            messages.append({
+                'role': 'system',
+                'content': f"Summary of the earlier conversation:\n{summary_state['summary']}"
+            })
+        for turn in turns[start:]:
+            messages.append({'role': 'user', 'content': turn['user']['content']})
+            messages.append({'role': 'assistant', 'content': turn['assistant']['content']})
+        messages.append({'role': 'user', 'content': user_content})
+        return messages, summary_state
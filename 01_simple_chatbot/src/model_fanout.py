@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm import generation
+from llm.models import get_model_manager
+
+
+class ModelFanOut:
+    """Send one prompt to several models concurrently and stream their outputs.
+
+    Each model runs in a worker thread (at most ``max_concurrency`` at once)
+    and pushes events onto a queue, so the Streamlit script thread can render
+    every model's output side by side without touching Streamlit from worker
+    threads. Events are ``(model, kind, payload)`` tuples where ``kind`` is
+    ``'token'``, ``'done'`` (payload: metrics dict) or ``'error'``.
+    """
+
+    def __init__(self, models, messages, options, max_concurrency=2, base_url=None):
+        self.models = list(models)
+        self.messages = messages
+        self.options = options
+        self.max_concurrency = max(1, max_concurrency)
+        self.base_url = base_url
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Stop all models, closing their in-flight requests."""
+        self._stop.set()
+        with self._lock:
+            handles = list(self._handles.values())
+        for handle in handles:
+            handle.cancel()
+
+    def was_cancelled(self, model):
+        handle = self._handles.get(model)
+        return bool(handle and handle.cancelled)
+
+    def _run_model(self, model):
+        start = time.perf_counter()
+        first_token_at = None
+        token_chunks = 0
+        final_chunk = {}
+        if self._stop.is_set():
+            self._events.put((model, 'error', "Cancelled before start"))
+            return
+        model_manager = get_model_manager(self.base_url)
+        model_manager.record_use(model)
+        handle = generation.chat(model, self.messages, self.options, base_url=self.base_url,
+                                 keep_alive=model_manager.keep_alive_for(model))
+        with self._lock:
+            self._handles[model] = handle
+        if self._stop.is_set():
+            handle.cancel()
+        try:
+            for chunk in handle:
+                content = chunk.get('message', {}).get('content', '')
+                if content:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    token_chunks += 1
+                    self._events.put((model, 'token', content))
+                if chunk.get('done'):
+                    final_chunk = chunk
+                    model_manager.record_load(model, chunk.get('load_duration'))
+        except Exception as e:
+            self._events.put((model, 'error', str(e)))
+            return
+
+        end = time.perf_counter()
+        self._events.put((model, 'done', self._metrics(start, first_token_at, end, token_chunks, final_chunk)))
+
+    @staticmethod
+    def _metrics(start, first_token_at, end, token_chunks, final_chunk):
+        """Time-to-first-token and generation speed, preferring Ollama's own counters."""
+        eval_count = final_chunk.get('eval_count')
+        eval_duration = final_chunk.get('eval_duration')  # nanoseconds
+        if eval_count and eval_duration:
+            tokens_per_s = eval_count / (eval_duration / 1e9)
+        elif first_token_at is not None and end > first_token_at:
+            tokens_per_s = token_chunks / (end - first_token_at)
+        else:
+            tokens_per_s = None
+        return {
+            'ttft_s': round(first_token_at - start, 3) if first_token_at is not None else None,
+            'total_s': round(end - start, 3),
+            'tokens': eval_count or token_chunks,
+            'tokens_per_s': round(tokens_per_s, 2) if tokens_per_s else None
+        }
+
+    def events(self, poll_interval=0.05):
+        """Yield events until every model has finished or failed."""
+        pending = set(self.models)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for model in self.models:
+                executor.submit(self._run_model, model)
+            try:
+                while pending:
+                    try:
+                        event = self._events.get(timeout=poll_interval)
+                    except queue.Empty:
+                        continue
+                    if event[1] in ('done', 'error'):
+                        pending.discard(event[0])
+                    yield event
+            finally:
+                # Stop workers early if the caller abandons the iteration
+                if pending:
+                    self.cancel()
@@ -0,0 +1,57 @@
+import time
+
+
+class StreamRenderer:
+    """Coalesce streamed tokens into throttled updates of a Streamlit placeholder.
+
+    Re-rendering the whole growing answer for every token is quadratic in the
+    answer length, so tokens are buffered and the placeholder is only updated
+    once ``update_interval`` seconds have passed or ``max_buffered_chars``
+    characters are waiting. Call ``flush()`` at the end to render the final text.
+
+    With ``progress_only`` the placeholder shows a progress line instead of the
+    partial text, which keeps regular Streamlit calls (and therefore Cancel
+    handling) for non-streamed answers.
+    """
+
+    def __init__(self, placeholder, update_interval=0.1, max_buffered_chars=500, cursor="▌", progress_only=False):
+        self.placeholder = placeholder
+        self.update_interval = update_interval
+        self.max_buffered_chars = max_buffered_chars
+        self.cursor = cursor
+        self.progress_only = progress_only
+        self._parts = []
+        self._buffered_chars = 0
+        self._last_render = 0.0
+        self.render_count = 0
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def append(self, token):
+        """Add a token and re-render only if the time or size threshold is reached."""
+        if not token:
+            return
+        self._parts.append(token)
+        self._buffered_chars += len(token)
+
+        now = time.monotonic()
+        if (now - self._last_render >= self.update_interval
+                or self._buffered_chars >= self.max_buffered_chars):
+            if self.progress_only:
+                self._render(f"⏳ Generating... {len(self.text)} characters received", now)
+            else:
+                self._render(self.text + self.cursor, now)
+
+    def flush(self):
+        """Render the complete text without the cursor and return it."""
+        final_text = self.text
+        self._render(final_text, time.monotonic())
+        return final_text
+
+    def _render(self, content, now):
+        self.placeholder.markdown(content)
+        self._buffered_chars = 0
+        self._last_render = now
+        self.render_count += 1
@@ -2,60 +2,114 @@ import chainlit as cl
 import os
 import sys
 import asyncio
+import io
 from datetime import datetime
-import json
-import pandas as pd
 
-# Add the shared directory to the path
+# Add the project and workspace shared directories to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from rag.pdf_chatbot import PDFRAGChatbot
-
-# Global storage for chat history
-CHAT_HISTORY_FILE = "pdf_chat_history.json"
-
-def save_chat_history(history):
-    """Save chat history to JSON file"""
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+from rag.session_manager import SessionManager
+from rag.client import RemoteRAGChatbot
+from rag.dedup import page_label
+from rag.uploads import MAX_UPLOAD_MB
+from chat_history.store import ChatHistoryStore
+from chat_history.export import ChatExporter
+from llm.models import get_model_manager
+
+# Used when the installed models cannot be fetched from Ollama
+DEFAULT_MODELS = ["llama3.2", "llama3.1", "mistral", "codellama"]
+
+# Chat history store shared with the Streamlit app, keyed by user and session
+CHAT_HISTORY_DB = os.path.join(os.path.dirname(__file__), '..', 'data', 'pdf_chat_history.db')
+LEGACY_CHAT_HISTORY_FILE = "pdf_chat_history.json"
+ANONYMOUS_USER = "default"
+HISTORY_PAGE_SIZE = 20  # Conversations loaded at a time; older ones on request
+
+history_store = ChatHistoryStore(CHAT_HISTORY_DB)
+history_store.import_legacy_json(LEGACY_CHAT_HISTORY_FILE, user_id=ANONYMOUS_USER)
+
+# Uploads are indexed once per content hash and shared by sessions; idle sessions release their memory.
+# With RAG_SERVICE_URL set, documents are indexed and queried by a running rag.service
+session_manager = SessionManager(background_ingest=True,
+                                 chatbot_factory=RemoteRAGChatbot if os.environ.get("RAG_SERVICE_URL") else None)
+
+def get_chatbot():
+    """Return this session's chatbot, reloading it from the index if it was evicted"""
+    return session_manager.get(cl.user_session.get("id"))
+
+def get_history_keys():
+    """Return the (user_id, session_id) pair for the current Chainlit session"""
+    user = cl.user_session.get("user")
+    user_id = getattr(user, "identifier", None) or ANONYMOUS_USER
+    session_id = cl.user_session.get("id") or "default"
+    return user_id, session_id
+
+def save_chat_entry(chat_entry):
+    """Append a single chat entry to the history store"""
+    user_id, session_id = get_history_keys()
     try:
-        with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        history_store.append(chat_entry, user_id=user_id, session_id=session_id)
     except Exception as e:
         print(f"Error saving chat history: {e}")
 
-def load_chat_history():
-    """Load chat history from JSON file"""
+def load_chat_history(before_id=None):
+    """Load one page of the current user's chat history (newest first) and whether older entries exist"""
+    user_id, _ = get_history_keys()
     try:
-        if os.path.exists(CHAT_HISTORY_FILE):
-            with open(CHAT_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        entries = history_store.page(user_id=user_id, limit=HISTORY_PAGE_SIZE + 1, before_id=before_id)
+        return entries[:HISTORY_PAGE_SIZE], len(entries) > HISTORY_PAGE_SIZE
     except Exception as e:
         print(f"Error loading chat history: {e}")
-    return []
+    return [], False
 
-def save_to_csv_file(chat_history):
-    """Save chat history to CSV with timestamp"""
-    if not chat_history:
+def clear_chat_history():
+    """Delete the current user's chat history from the store"""
+    user_id, _ = get_history_keys()
+    try:
+        history_store.clear(user_id=user_id)
+    except Exception as e:
+        print(f"Error clearing chat history: {e}")
+
+EXPORT_COLUMNS = ['timestamp', 'query', 'response', 'model', 'temperature', 'top_p', 'top_k']
+AUTO_SAVE_CSV_FILE = "pdf_chat_history.csv"  # Rolling file used by auto-save
+
+def entry_to_export_row(entry):
+    """Map a stored chat entry to an export row"""
+    return {
+        'timestamp': entry['timestamp'],
+        'query': entry['query'],
+        'response': entry['response'],
+        'model': entry.get('model', 'N/A'),
+        'temperature': entry.get('temperature', 'N/A'),
+        'top_p': entry.get('top_p', 'N/A'),
+        'top_k': entry.get('top_k', 'N/A')
+    }
+
+exporter = ChatExporter(history_store, EXPORT_COLUMNS, entry_to_export_row)
+
+def auto_save_to_csv():
+    """Append only the entries added since the last auto-save to the rolling CSV"""
+    user_id, _ = get_history_keys()
+    try:
+        exporter.append_new(AUTO_SAVE_CSV_FILE, user_id=user_id)
+        return AUTO_SAVE_CSV_FILE
+    except Exception as e:
+        print(f"Error saving to CSV: {e}")
         return None
 
+def export_chat_history(file_format="csv"):
+    """Stream the user's full chat history into a new timestamped CSV or Parquet file"""
+    user_id, _ = get_history_keys()
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    filename = f"pdf_chat_history_{timestamp}.{file_format}"
     try:
-        csv_data = []
-        for entry in chat_history:
-            csv_data.append({
-                'timestamp': entry['timestamp'],
-                'query': entry['query'],
-                'response': entry['response'],
-                'model': entry.get('model', 'N/A'),
-                'temperature': entry.get('temperature', 'N/A'),
-                'top_p': entry.get('top_p', 'N/A'),
-                'top_k': entry.get('top_k', 'N/A')
-            })
-
-        df = pd.DataFrame(csv_data)
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"pdf_chat_history_{timestamp}.csv"
-        df.to_csv(filename, index=False)
+        if file_format == "parquet":
+            exporter.export_parquet(filename, user_id=user_id)
+        else:
+            exporter.export_csv(filename, user_id=user_id)
         return filename
     except Exception as e:
-        print(f"Error saving to CSV: {e}")
+        print(f"Error exporting chat history: {e}")
         return None
 
 @cl.on_chat_start
@@ -70,7 +124,7 @@ async def start():
         cl.input_widget.Select(
             id="model",
             label="Model",
-            values=["llama3.2", "llama3.1", "mistral", "codellama"],
+            values=get_model_manager().list_models(fallback=DEFAULT_MODELS) or DEFAULT_MODELS,
             initial_index=0,
         ),
         cl.input_widget.Slider(
@@ -118,11 +172,20 @@ async def start():
             label="Auto-save to CSV",
             initial=False,
         ),
+        cl.input_widget.Switch(
+            id="extractive",
+            label="Extractive fast path (answer lookups without the LLM)",
+            initial=False,
+        ),
     ]).send()
 
+    # Start loading the initial model while the PDF is being prepared
+    get_model_manager().warm_async(settings.get("model", "llama3.2"))
+
     # Initialize session variables
-    cl.user_session.set("chatbot", None)
-    cl.user_session.set("chat_history", load_chat_history())
+    chat_history, has_older = load_chat_history()
+    cl.user_session.set("chat_history", chat_history)
+    cl.user_session.set("history_has_older", has_older)
     cl.user_session.set("pdf_loaded", False)
 
     # Try to initialize with existing test.pdf
@@ -133,7 +196,9 @@ async def start():
         cl.Action(name="upload_pdf", value="upload", description="📁 Upload PDF", payload={"action": "upload_pdf"}),
         cl.Action(name="show_summary", value="summary", description="📋 Generate document summary", payload={"action": "show_summary"}),
         cl.Action(name="export_csv", value="export", description="💾 Export chat to CSV", payload={"action": "export_csv"}),
+        cl.Action(name="export_parquet", value="export_parquet", description="📦 Export chat to Parquet", payload={"action": "export_parquet"}),
         cl.Action(name="clear_history", value="clear", description="🗑️ Clear chat history", payload={"action": "clear_history"}),
+        cl.Action(name="show_older_history", value="older", description="🕘 Show older conversations", payload={"action": "show_older_history"}),
         cl.Action(name="reload_pdf", value="reload", description="🔄 Reload PDF", payload={"action": "reload_pdf"}),
     ]
 
@@ -143,6 +208,46 @@ async def start():
         author="System"
     ).send()
 
+async def track_ingestion(chatbot, name):
+    """Show background indexing progress in one message, updated until the job ends"""
+    progress_msg = cl.Message(content=f"⏳ Indexing `{name}`...", author="System")
+    await progress_msg.send()
+    progress = await cl.make_async(chatbot.ingestion_progress)()
+    while progress is not None and progress['status'] in ('pending', 'running'):
+        total = progress['total_pages'] or '?'
+        chunks = progress['chunks_indexed'] or 0
+        progress_msg.content = (
+            f"⏳ Indexing `{name}`: page {progress['pages_done']}/{total} "
+            f"({chunks} chunks). You can already ask questions about the indexed pages."
+        )
+        await progress_msg.update()
+        await asyncio.sleep(1)
+        progress = await cl.make_async(chatbot.ingestion_progress)()
+
+    if progress is None:
+        return
+    if progress['status'] == 'done' and progress['chunks_indexed'] is None:
+        # Indexed by another rag.service worker that did not record the details
+        progress_msg.content = f"✅ `{name}` fully indexed: {progress['total_pages']} pages"
+    elif progress['status'] == 'done':
+        progress_msg.content = (
+            f"✅ `{name}` fully indexed: {progress['total_pages']} pages, "
+            f"{progress['chunks_indexed']} chunks in {progress['elapsed_s']}s"
+        )
+    elif progress['status'] == 'failed':
+        progress_msg.content = f"❌ Indexing `{name}` failed after {progress['pages_done']} pages: {progress['error']}"
+    else:
+        progress_msg.content = f"⚠️ Indexing `{name}` stopped at page {progress['pages_done']}/{progress['total_pages']}"
+    await progress_msg.update()
+
+def partial_coverage_note(result):
+    """Warning line for answers produced while the document was still being indexed"""
+    coverage = result.get('coverage') if isinstance(result, dict) else None
+    if not coverage or not coverage.get('partial'):
+        return ""
+    return (f"\n\n⚠️ *Partial coverage: answered from {coverage['pages_indexed']} of "
+            f"{coverage['total_pages'] or '?'} pages indexed so far*")
+
 async def initialize_default_pdf():
     """Try to initialize with existing test.pdf"""
     try:
@@ -151,15 +256,18 @@ async def initialize_default_pdf():
             settings = cl.user_session.get("settings", {})
             model_name = settings.get("model", "llama3.2")
 
-            chatbot = PDFRAGChatbot(pdf_file_path=test_pdf_path, model_name=model_name)
-            cl.user_session.set("chatbot", chatbot)
+            chatbot = session_manager.open(cl.user_session.get("id"), test_pdf_path, model_name,
+                                           shared_collection=True)
             cl.user_session.set("pdf_loaded", True)
 
-            chunk_count = chatbot.collection.count() if hasattr(chatbot, 'collection') else 0
-            await cl.Message(
-                content=f"✅ **Automatically loaded existing PDF:** `test.pdf`\n📄 Document contains {chunk_count} text chunks",
-                author="System"
-            ).send()
+            if chatbot.coverage()['partial']:
+                asyncio.create_task(track_ingestion(chatbot, "test.pdf"))
+            else:
+                chunk_count = chatbot.chunk_count()
+                await cl.Message(
+                    content=f"✅ **Automatically loaded existing PDF:** `test.pdf`\n📄 Document contains {chunk_count} text chunks",
+                    author="System"
+                ).send()
         else:
             await cl.Message(
                 content="ℹ️ No existing PDF found. Please upload a PDF file using the 'Upload PDF' action button.",
@@ -174,17 +282,65 @@ async def initialize_default_pdf():
 @cl.on_settings_update
 async def setup_agent(settings):
     """Handle settings updates"""
+    previous_model = cl.user_session.get("settings", {}).get("model")
     cl.user_session.set("settings", settings)
+    model_name = settings.get("model", "llama3.2")
 
     # If model changed and chatbot exists, update it
-    chatbot = cl.user_session.get("chatbot")
+    chatbot = session_manager.peek(cl.user_session.get("id"))
+    if chatbot:
+        chatbot.model_name = model_name
+    session_manager.update(cl.user_session.get("id"), model_name=model_name)
+
+    if model_name != previous_model:
+        # Warm the new model now instead of inside the next question
+        try:
+            load_time = await asyncio.wrap_future(get_model_manager().warm_async(model_name))
+            await cl.Message(
+                content=f"📦 Model `{model_name}` ready (loaded in {load_time:.2f}s)",
+                author="System"
+            ).send()
+        except Exception as e:
+            await cl.Message(
+                content=f"⚠️ Could not preload `{model_name}`: {str(e)}",
+                author="System"
+            ).send()
+
+def record_chat_entry(query, response_text, model_used, temperature, top_p, top_k, cancelled=False):
+    """Add a chat entry to the session history and the history store"""
+    chat_entry = {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'query': query,
+        'response': response_text,
+        'model': model_used,
+        'temperature': temperature,
+        'top_p': top_p,
+        'top_k': top_k
+    }
+    if cancelled:
+        chat_entry['cancelled'] = True
+
+    chat_history = cl.user_session.get("chat_history", [])
+    chat_history.insert(0, chat_entry)
+    cl.user_session.set("chat_history", chat_history)
+    save_chat_entry(chat_entry)
+
+@cl.on_chat_end
+async def on_chat_end():
+    """Release the session's in-memory working set; it reloads from the index if the user returns"""
+    session_manager.evict(cl.user_session.get("id"))
+
+@cl.on_stop
+async def on_stop():
+    """Abort the running generation when the user presses Stop"""
+    chatbot = session_manager.peek(cl.user_session.get("id"))
     if chatbot:
-        chatbot.model_name = settings.get("model", "llama3.2")
+        chatbot.cancel_generation()
 
 @cl.on_message
 async def main(message: cl.Message):
     """Handle incoming messages"""
-    chatbot = cl.user_session.get("chatbot")
+    chatbot = get_chatbot()
 
     if not chatbot:
         await cl.Message(
@@ -200,6 +356,7 @@ async def main(message: cl.Message):
     top_p = settings.get("top_p", 0.9)
     top_k = settings.get("top_k", 40)
     save_to_csv = settings.get("save_to_csv", False)
+    extractive = settings.get("extractive", False)
 
     user_content = message.content
 
@@ -211,13 +368,22 @@ async def main(message: cl.Message):
         # Show thinking indicator
         await response_msg.stream_token("🤔 Searching PDF and generating response...")
 
-        # Generate response
-        result = chatbot.generate_response(
-            user_content,
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k
-        )
+        # Generate response in a worker thread so the Stop button can cancel it
+        try:
+            result = await cl.make_async(chatbot.generate_response)(
+                user_content,
+                temperature=temperature,
+                top_p=top_p,
+                top_k=top_k,
+                extractive=extractive
+            )
+        except asyncio.CancelledError:
+            # Stop pressed: close the Ollama stream and keep the partial answer
+            partial = chatbot.cancel_generation()
+            if partial:
+                record_chat_entry(user_content, partial, settings.get('model', 'llama3.2'),
+                                  temperature, top_p, top_k, cancelled=True)
+            raise
 
         # Clear the thinking message and show actual response
         response_msg.content = ""
@@ -232,12 +398,21 @@ async def main(message: cl.Message):
                 await asyncio.sleep(0.01)  # Small delay for streaming effect
 
             # Show context information if available
+            if result.get('answer_path') == 'extractive':
+                await response_msg.stream_token(
+                    f"\n\n⚡ *Extractive answer (retrieval score {result['extractive']['retrieval_score']:.2f}, "
+                    f"{result['latency_ms']} ms) - turn off the extractive fast path for a generated answer*"
+                )
+
+            coverage_note = partial_coverage_note(result)
+            if coverage_note:
+                await response_msg.stream_token(coverage_note)
+
             if 'context_used' in result:
                 context_info = f"\n\n📖 **Context:** Used {len(result['context_used'])} relevant chunks"
                 for i, ctx in enumerate(result['context_used'][:3]):  # Show first 3 contexts
-                    page = ctx['metadata']['page']
                     relevance = ctx['relevance_score']
-                    context_info += f"\n- Page {page} (relevance: {relevance:.2f})"
+                    context_info += f"\n- {page_label(ctx['metadata'])} (relevance: {relevance:.2f})"
 
                 await response_msg.stream_token(context_info)
 
@@ -246,28 +421,18 @@ async def main(message: cl.Message):
             model_used = settings.get('model', 'llama3.2')
             await response_msg.stream_token(response_text)
 
+        cancelled = isinstance(result, dict) and result.get('cancelled', False)
+        if cancelled:
+            await response_msg.stream_token("\n\n⏹️ *Generation stopped - partial response*")
+
         await response_msg.update()
 
         # Save to chat history
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        chat_entry = {
-            'timestamp': timestamp,
-            'query': user_content,
-            'response': response_text,
-            'model': model_used,
-            'temperature': temperature,
-            'top_p': top_p,
-            'top_k': top_k
-        }
-
-        chat_history = cl.user_session.get("chat_history", [])
-        chat_history.insert(0, chat_entry)
-        cl.user_session.set("chat_history", chat_history)
-        save_chat_history(chat_history)
+        record_chat_entry(user_content, response_text, model_used, temperature, top_p, top_k, cancelled)
 
         # Auto-save to CSV if enabled
         if save_to_csv:
-            filename = save_to_csv_file(chat_history)
+            filename = auto_save_to_csv()
             if filename:
                 await cl.Message(
                     content=f"💾 Chat history auto-saved to `{filename}`",
@@ -293,7 +458,7 @@ async def handle_file_upload(action):
     files = await cl.AskFileMessage(
         content="Please upload a PDF file:",
         accept=["application/pdf"],
-        max_size_mb=10
+        max_size_mb=MAX_UPLOAD_MB
     ).send()
 
     if not files:
@@ -302,13 +467,6 @@ async def handle_file_upload(action):
     file = files[0]
 
     try:
-        # Save uploaded file
-        temp_path = os.path.join(os.path.dirname(__file__), "..", "data", "temp_uploaded.pdf")
-        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-
-        with open(temp_path, "wb") as f:
-            f.write(file.content)
-
         # Initialize chatbot with uploaded file
         settings = cl.user_session.get("settings", {})
         model_name = settings.get("model", "llama3.2")
@@ -318,18 +476,28 @@ async def handle_file_upload(action):
             author="System"
         ).send()
 
-        chatbot = PDFRAGChatbot(pdf_file_path=temp_path, model_name=model_name)
-        reload_message = chatbot.force_reload_pdf(temp_path)
+        # Chainlit stores uploads on disk; stream from there into a content-addressed
+        # file instead of holding the whole PDF in memory. Pages are indexed in the
+        # background so questions can be asked right away.
+        source = getattr(file, "path", None) or io.BytesIO(file.content)
+        chatbot, upload = await cl.make_async(session_manager.open_upload)(
+            cl.user_session.get("id"), source, file.name, model_name
+        )
 
-        cl.user_session.set("chatbot", chatbot)
         cl.user_session.set("pdf_loaded", True)
 
-        chunk_count = chatbot.collection.count() if hasattr(chatbot, 'collection') else 0
-
-        await cl.Message(
-            content=f"✅ **PDF uploaded successfully!**\n📄 `{file.name}` loaded with {chunk_count} text chunks\n\nYou can now ask questions about the document!",
-            author="System"
-        ).send()
+        size_mb = upload['size'] / (1024 * 1024)
+        if upload['reused']:
+            await cl.Message(
+                content=f"✅ **PDF already indexed!**\n📄 `{file.name}` ({size_mb:.1f} MB) reuses its existing embeddings\n\nYou can now ask questions about the document!",
+                author="System"
+            ).send()
+        else:
+            await cl.Message(
+                content=f"✅ **PDF uploaded successfully!**\n📄 `{file.name}` ({size_mb:.1f} MB) is being indexed\n\nYou can now ask questions about the document!",
+                author="System"
+            ).send()
+            asyncio.create_task(track_ingestion(chatbot, file.name))
 
     except Exception as e:
         await cl.Message(
@@ -337,9 +505,8 @@ async def handle_file_upload(action):
             author="System"
         ).send()
 
-@cl.action_callback("export_csv")
-async def on_export_csv(action):
-    """Export chat history to CSV"""
+async def export_history(file_format):
+    """Export chat history in the given format and report the result"""
     chat_history = cl.user_session.get("chat_history", [])
 
     if not chat_history:
@@ -349,7 +516,7 @@ async def on_export_csv(action):
         ).send()
         return
 
-    filename = save_to_csv_file(chat_history)
+    filename = export_chat_history(file_format)
     if filename:
         await cl.Message(
             content=f"✅ Chat history exported to `{filename}`",
@@ -361,20 +528,50 @@ async def on_export_csv(action):
             author="System"
         ).send()
 
+@cl.action_callback("export_csv")
+async def on_export_csv(action):
+    """Export chat history to CSV"""
+    await export_history("csv")
+
+@cl.action_callback("export_parquet")
+async def on_export_parquet(action):
+    """Export chat history to compressed Parquet"""
+    await export_history("parquet")
+
 @cl.action_callback("clear_history")
 async def on_clear_history(action):
     """Clear chat history"""
     cl.user_session.set("chat_history", [])
-    save_chat_history([])
+    cl.user_session.set("history_has_older", False)
+    clear_chat_history()
     await cl.Message(
         content="✅ Chat history cleared!",
         author="System"
     ).send()
 
+@cl.action_callback("show_older_history")
+async def on_show_older_history(action):
+    """Load the next older page of chat history and list it"""
+    chat_history = cl.user_session.get("chat_history", [])
+    stored = [entry for entry in chat_history if '_id' in entry]
+    if not stored or not cl.user_session.get("history_has_older"):
+        await cl.Message(content="📝 No older conversations.", author="System").send()
+        return
+
+    entries, has_older = await cl.make_async(load_chat_history)(stored[-1]['_id'])
+    chat_history.extend(entries)
+    cl.user_session.set("chat_history", chat_history)
+    cl.user_session.set("history_has_older", has_older)
+
+    lines = [f"- 🕒 {entry['timestamp']} - {entry['query'][:80]}" for entry in entries]
+    if has_older:
+        lines.append("\n*Use the action again for older conversations.*")
+    await cl.Message(content="🕘 **Older conversations:**\n" + "\n".join(lines), author="System").send()
+
 @cl.action_callback("show_summary")
 async def on_show_summary(action):
     """Generate document summary"""
-    chatbot = cl.user_session.get("chatbot")
+    chatbot = get_chatbot()
 
     if not chatbot:
         await cl.Message(
@@ -391,7 +588,7 @@ async def on_show_summary(action):
     ).send()
 
     try:
-        result = chatbot.generate_summary(
+        result = await cl.make_async(chatbot.generate_summary)(
             temperature=settings.get("temperature", 0.2),
             top_p=settings.get("top_p", 0.9),
             top_k=settings.get("top_k", 40)
@@ -403,6 +600,7 @@ async def on_show_summary(action):
             summary_content += f"- Content chunks analyzed: {result.get('content_analyzed', 'N/A')}\n"
             summary_content += f"- Pages covered: {result.get('pages_covered', 'N/A')}\n"
             summary_content += f"- Model used: {result.get('model', 'N/A')}"
+            summary_content += partial_coverage_note(result)
         else:
             summary_content = f"## 📋 Document Summary\n\n{result}"
 
@@ -420,7 +618,7 @@ async def on_show_summary(action):
 @cl.action_callback("reload_pdf")
 async def on_reload_pdf(action):
     """Reload current PDF"""
-    chatbot = cl.user_session.get("chatbot")
+    chatbot = get_chatbot()
 
     if not chatbot:
         await cl.Message(
@@ -431,12 +629,19 @@ async def on_reload_pdf(action):
 
     try:
         reload_message = chatbot.force_reload_pdf()
-        chunk_count = chatbot.collection.count() if hasattr(chatbot, 'collection') else 0
 
-        await cl.Message(
-            content=f"🔄 **PDF reloaded successfully!**\n{reload_message}\n📄 Document contains {chunk_count} text chunks",
-            author="System"
-        ).send()
+        if chatbot.coverage()['partial']:
+            await cl.Message(
+                content=f"🔄 **PDF reload started!**\n{reload_message}",
+                author="System"
+            ).send()
+            asyncio.create_task(track_ingestion(chatbot, os.path.basename(chatbot.pdf_file_path)))
+        else:
+            chunk_count = chatbot.chunk_count()
+            await cl.Message(
+                content=f"🔄 **PDF reloaded successfully!**\n{reload_message}\n📄 Document contains {chunk_count} text chunks",
+                author="System"
+            ).send()
     except Exception as e:
         await cl.Message(
             content=f"❌ Error reloading PDF: {str(e)}",
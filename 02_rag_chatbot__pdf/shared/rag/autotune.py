@@ -0,0 +1,259 @@
+"""Per-document tuning of chunk size, overlap and top-k.
+
+Builds an in-memory index of one PDF for every chunk size / overlap pair,
+runs a question set against it for every top-k and measures the retrieval
+hit rate, the prompt tokens the retrieved context costs and the search
+latency. The Pareto-best configuration is written next to the collection
+(``<collection>_retrieval.json`` in the Chroma directory), where
+``PDFRAGChatbot`` picks it up on its next start; a changed chunking
+re-indexes the collection.
+
+Questions are either supplied as JSON lines with ``question`` and an
+``answer`` (text that must appear in a retrieved chunk) and/or ``page``,
+or generated from the document: sentences with every third word left out,
+answered by retrieving the chunk that contains the sentence.
+
+Usage (from the shared/ directory):
+    python -m rag.autotune ../data/test.pdf --collection pdf_knowledge_base
+    python -m rag.autotune ../data/test.pdf --questions questions.jsonl --top-k 3 5 8 --dry-run
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from rag.embedding_storage import top_k
+from rag.extractive import split_sentences
+from rag.pdf_chatbot import (
+    CHROMA_DB_PATH, DEFAULT_RETRIEVAL_CONFIG, get_embedding_model, retrieval_config_path, split_into_chunks
+)
+from rag.pdf_extract import TextExtractor
+from rag.request_sizing import CHUNK_PROMPT_OVERHEAD_TOKENS, count_tokens
+
+DEFAULT_CHUNK_SIZES = [250, 500, 750, 1000]
+DEFAULT_OVERLAPS = [0, 50, 100, 200]
+DEFAULT_TOP_K = [3, 5, 8]
+DEFAULT_NUM_QUESTIONS = 50
+
+# Configurations whose hit rate is this close to the best count as equally good
+HIT_RATE_TOLERANCE = 0.02
+
+# Characters of context a summary should see (the untuned 10 chunks of 500)
+SUMMARY_CONTEXT_CHARS = DEFAULT_RETRIEVAL_CONFIG['summary_n_results'] * DEFAULT_RETRIEVAL_CONFIG['chunk_size']
+
+# Longest central part of an answer that must be found in a single chunk
+ANSWER_CORE_CHARS = 100
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def load_pages(pdf_path, max_pages=None):
+    """``[(page_number, text)]`` of the pages with text."""
+    pages = []
+    with TextExtractor().open(pdf_path) as pdf:
+        for i in range(min(pdf.page_count, max_pages or pdf.page_count)):
+            text = pdf.page_text(i)
+            if text and text.strip():
+                pages.append((i + 1, text))
+    return pages
+
+
+def load_questions(path):
+    """Read ``{"question": ..., "answer": ..., "page": ...}`` lines; answer or page is required."""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if 'question' not in item or not (item.get('answer') or item.get('page')):
+                raise SystemExit(f"{path}:{line_number}: needs 'question' and 'answer' or 'page'")
+            questions.append(item)
+    return questions
+
+
+def generate_questions(pages, num_questions, seed=0):
+    """Questions made of document sentences with every third word dropped."""
+    candidates = [
+        (page_number, sentence)
+        for page_number, text in pages
+        for sentence in split_sentences(text)
+        if 60 <= len(sentence) <= 300
+    ]
+    rng = random.Random(seed)
+    questions = []
+    for page_number, sentence in rng.sample(candidates, min(num_questions, len(candidates))):
+        words = sentence.split()
+        question = " ".join(word for i, word in enumerate(words) if i % 3 != 2)
+        questions.append({'question': question, 'answer': sentence, 'page': page_number})
+    return questions
+
+
+def answer_core(answer):
+    """Central part of the answer, so a sentence cut by a chunk boundary can still match."""
+    text = normalize(answer)
+    core = min(int(len(text) * 0.6), ANSWER_CORE_CHARS)
+    start = (len(text) - core) // 2
+    return text[start:start + core]
+
+
+def is_hit(question, retrieved):
+    """True if a retrieved ``(page, text)`` chunk holds the answer (or, without one, is on its page)."""
+    if question.get('answer'):
+        core = answer_core(question['answer'])
+        return any(core in normalize(text) for _, text in retrieved)
+    return any(page == question['page'] for page, _ in retrieved)
+
+
+def build_chunks(pages, chunk_size, overlap):
+    """``[(page, text)]`` chunked the way ``page_chunks`` does at ingest."""
+    return [
+        (page_number, chunk)
+        for page_number, text in pages
+        for chunk in split_into_chunks(text, chunk_size, overlap)
+        if chunk.strip()
+    ]
+
+
+def evaluate(chunks, embeddings, questions, question_embeddings, k):
+    """Hit rate, mean context tokens and search latency of one configuration."""
+    hits = 0
+    tokens = []
+    latencies = []
+    for question, query_embedding in zip(questions, question_embeddings):
+        start = time.perf_counter()
+        scores = embeddings @ query_embedding
+        indices, _ = top_k(scores.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        retrieved = [chunks[i] for i in indices[0]]
+        hits += is_hit(question, retrieved)
+        tokens.append(sum(count_tokens(text) + CHUNK_PROMPT_OVERHEAD_TOKENS for _, text in retrieved))
+    return {
+        'hit_rate': hits / len(questions),
+        'prompt_tokens': sum(tokens) / len(tokens),
+        'search_ms': sum(latencies) / len(latencies)
+    }
+
+
+def sweep(pages, questions, chunk_sizes, overlaps, top_ks, encode):
+    """Evaluate every combination; returns one result dict per configuration."""
+    question_embeddings = np.asarray(encode([q['question'] for q in questions]), dtype=np.float32)
+    results = []
+    for chunk_size, overlap in itertools.product(chunk_sizes, overlaps):
+        if overlap >= chunk_size:
+            continue
+        chunks = build_chunks(pages, chunk_size, overlap)
+        start = time.perf_counter()
+        embeddings = np.asarray(encode([text for _, text in chunks]), dtype=np.float32)
+        embed_s = time.perf_counter() - start
+        for k in top_ks:
+            row = {'chunk_size': chunk_size, 'chunk_overlap': overlap, 'n_results': k,
+                   'chunks': len(chunks), 'embed_s': round(embed_s, 2)}
+            row.update(evaluate(chunks, embeddings, questions, question_embeddings, k))
+            results.append(row)
+            print(f"{chunk_size:>6}{overlap:>8}{k:>4}{len(chunks):>8}{row['hit_rate']:>9.3f}"
+                  f"{row['prompt_tokens']:>9.0f}{row['search_ms']:>10.3f}")
+    return results
+
+
+def dominates(a, b):
+    """``a`` is at least as good as ``b`` on every metric and better on one."""
+    at_least = (a['hit_rate'] >= b['hit_rate'] and a['prompt_tokens'] <= b['prompt_tokens']
+                and a['search_ms'] <= b['search_ms'])
+    better = (a['hit_rate'] > b['hit_rate'] or a['prompt_tokens'] < b['prompt_tokens']
+              or a['search_ms'] < b['search_ms'])
+    return at_least and better
+
+
+def pareto_front(results):
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+
+def choose(front):
+    """Among the Pareto front, the cheapest prompt whose hit rate is within tolerance of the best."""
+    best_hit_rate = max(r['hit_rate'] for r in front)
+    good = [r for r in front if r['hit_rate'] >= best_hit_rate - HIT_RATE_TOLERANCE]
+    return min(good, key=lambda r: (r['prompt_tokens'], r['search_ms']))
+
+
+def retrieval_config(best):
+    """Settings to store: the tuned ones plus a summary top-k that keeps the summary context size."""
+    return {
+        'chunk_size': best['chunk_size'],
+        'chunk_overlap': best['chunk_overlap'],
+        'n_results': best['n_results'],
+        'summary_n_results': max(best['n_results'], round(SUMMARY_CONTEXT_CHARS / best['chunk_size']))
+    }
+
+
+def save_config(collection_name, source, config, best, num_questions, db_path=CHROMA_DB_PATH):
+    os.makedirs(db_path, exist_ok=True)
+    path = retrieval_config_path(collection_name, db_path)
+    stored = dict(config, source=source, tuned_at=time.strftime("%Y-%m-%d %H:%M:%S"), questions=num_questions,
+                  metrics={key: round(best[key], 4) for key in ('hit_rate', 'prompt_tokens', 'search_ms')})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stored, f, indent=2)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune chunk size, overlap and top-k for one document")
+    parser.add_argument("pdf", help="PDF to tune for (the path the chatbot indexes it under)")
+    parser.add_argument("--collection", default="pdf_knowledge_base", help="Collection the settings are stored for")
+    parser.add_argument("--questions", help="JSON lines with question and answer and/or page "
+                                            "(default: generated from the document)")
+    parser.add_argument("--num-questions", type=int, default=DEFAULT_NUM_QUESTIONS)
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=DEFAULT_CHUNK_SIZES)
+    parser.add_argument("--overlaps", nargs="+", type=int, default=DEFAULT_OVERLAPS)
+    parser.add_argument("--top-k", nargs="+", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--max-pages", type=int, help="Only use the first N pages")
+    parser.add_argument("--dry-run", action="store_true", help="Report the best settings without storing them")
+    parser.add_argument("--json", help="Also write all results to this JSON file")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pdf, args.max_pages)
+    if not pages:
+        raise SystemExit(f"No text found in {args.pdf}")
+    questions = load_questions(args.questions) if args.questions else generate_questions(pages, args.num_questions)
+    if not questions:
+        raise SystemExit("No questions to tune with")
+
+    model = get_embedding_model()
+
+    def encode(texts):
+        return model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+    print(f"Document: {len(pages)} pages, {len(questions)} questions")
+    print(f"{'size':>6}{'overlap':>8}{'k':>4}{'chunks':>8}{'hit rate':>9}{'tokens':>9}{'search ms':>10}")
+    results = sweep(pages, questions, args.chunk_sizes, args.overlaps, args.top_k, encode)
+    if not results:
+        raise SystemExit("No valid configuration (every overlap is at least the chunk size)")
+
+    front = pareto_front(results)
+    print("\nPareto front:")
+    for row in sorted(front, key=lambda r: -r['hit_rate']):
+        print(f"  chunk_size={row['chunk_size']} overlap={row['chunk_overlap']} k={row['n_results']}: "
+              f"hit rate {row['hit_rate']:.3f}, {row['prompt_tokens']:.0f} tokens, {row['search_ms']:.3f} ms")
+
+    best = choose(front)
+    config = retrieval_config(best)
+    print(f"\nBest: {config} (hit rate {best['hit_rate']:.3f}, {best['prompt_tokens']:.0f} prompt tokens)")
+    if args.dry_run:
+        print("Dry run: settings not stored")
+    else:
+        path = save_config(args.collection, args.pdf, config, best, len(questions))
+        print(f"Stored in {path}; the chatbot uses them (and re-indexes if the chunking changed) on its next start")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'results': results, 'pareto_front': front, 'best': config}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Bulk-index a corpus of PDFs into one Chroma collection.
+
+Worker processes extract, chunk and embed whole files in parallel; the main
+process is the only writer to Chroma (which does not support concurrent
+writers) and appends one line per finished file to a JSONL checkpoint. An
+interrupted run started again with the same checkpoint skips every file that
+was already indexed and has not changed since.
+
+Usage (from the shared/ directory):
+    python -m rag.bulk_ingest ../data/papers --workers 4
+    python -m rag.bulk_ingest --manifest pdfs.txt --collection papers
+
+Query the result with ``PDFRAGChatbot(pdf_file_path=None, collection_name=...)``.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chromadb
+
+from rag.pdf_chatbot import CHROMA_DB_PATH, page_chunks
+from rag.pdf_extract import TextExtractor
+from rag.vector_store import DEFAULT_INDEX_CONFIG, ChromaVectorStore, index_metadata
+
+DEFAULT_COLLECTION = "pdf_corpus"
+
+# Per-process state of the worker pool
+_worker = {}
+
+
+def find_pdfs(root=None, manifest=None):
+    """PDF paths from a directory tree and/or a manifest with one path per line."""
+    paths = []
+    if root:
+        for dirpath, _, filenames in os.walk(root):
+            paths.extend(os.path.join(dirpath, name) for name in filenames if name.lower().endswith('.pdf'))
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+    # Stable order and no duplicates
+    return sorted({os.path.abspath(path) for path in paths})
+
+
+def file_fingerprint(path):
+    """Cheap change detector: size and modification time."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def file_id(path):
+    """Short stable id used to prefix a file's chunk ids."""
+    return hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+
+
+class Checkpoint:
+    """Append-only JSONL record of finished files; the last line per path wins."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut off by an interruption
+                    self.done[record['path']] = record
+
+    def is_done(self, path, fingerprint):
+        record = self.done.get(path)
+        return bool(record and record['fingerprint'] == fingerprint)
+
+    def was_indexed(self, path):
+        return path in self.done
+
+    def record(self, path, fingerprint, pages, chunks):
+        record = {'path': path, 'fingerprint': fingerprint, 'pages': pages, 'chunks': chunks,
+                  'finished_at': time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done[path] = record
+
+
+def _init_worker(pdf_backend, torch_threads):
+    """Load the embedding model once per worker process."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(torch_threads)
+    _worker['model'] = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+    _worker['extractor'] = TextExtractor(pdf_backend)
+
+
+def _process_file(path, embed_batch_size):
+    """Extract, chunk and embed one PDF in a worker process."""
+    start = time.perf_counter()
+    prefix = file_id(path)
+    ids, chunks, metadatas = [], [], []
+    with _worker['extractor'].open(path) as pdf:
+        pages = pdf.page_count
+        for i in range(pages):
+            page_ids, page_texts, page_metadatas = page_chunks(path, i + 1, pdf.page_text(i), id_prefix=prefix)
+            ids.extend(page_ids)
+            chunks.extend(page_texts)
+            metadatas.extend(page_metadatas)
+
+    embeddings = None
+    if chunks:
+        embeddings = _worker['model'].encode(
+            chunks, batch_size=embed_batch_size, normalize_embeddings=True, convert_to_numpy=True
+        )
+    return {
+        'path': path,
+        'pages': pages,
+        'ids': ids,
+        'chunks': chunks,
+        'metadatas': metadatas,
+        'embeddings': embeddings,
+        'bytes': os.path.getsize(path),
+        'seconds': time.perf_counter() - start
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a corpus of PDFs into a Chroma collection")
+    parser.add_argument("root", nargs="?", help="Directory searched recursively for PDFs")
+    parser.add_argument("--manifest", help="Text file listing PDF paths, one per line")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--db-path", default=CHROMA_DB_PATH)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <db-path>/<collection>_bulk.jsonl)")
+    parser.add_argument("--pdf-backend", default='auto')
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    if not args.root and not args.manifest:
+        parser.error("give a directory and/or --manifest")
+
+    pdfs = find_pdfs(args.root, args.manifest)
+    os.makedirs(args.db_path, exist_ok=True)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.db_path, f"{args.collection}_bulk.jsonl"))
+    todo = [path for path in pdfs if not checkpoint.is_done(path, file_fingerprint(path))]
+    print(f"{len(pdfs)} PDFs found, {len(pdfs) - len(todo)} already indexed, {len(todo)} to process "
+          f"with {args.workers} worker(s)")
+    if not todo:
+        return
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_or_create_collection(name=args.collection, metadata=index_metadata(DEFAULT_INDEX_CONFIG))
+    store = ChromaVectorStore(collection)
+
+    torch_threads = max(1, (os.cpu_count() or 1) // args.workers)
+    totals = {'files': 0, 'pages': 0, 'chunks': 0, 'bytes': 0}
+    errors = []
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.pdf_backend, torch_threads)) as executor:
+        pending = {}
+        queue = list(reversed(todo))
+        try:
+            while queue or pending:
+                # Keep a bounded number of files in flight so results don't pile up in memory
+                while queue and len(pending) < args.workers * 2:
+                    path = queue.pop()
+                    pending[executor.submit(_process_file, path, args.embed_batch_size)] = path
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = pending.pop(future)
+                    try:
+                        result = future.result()
+                        if checkpoint.was_indexed(path):
+                            # The file changed since it was indexed; drop its old chunks
+                            collection.delete(where={'source': path})
+                        if result['chunks']:
+                            store.add(result['ids'], result['embeddings'], result['chunks'], result['metadatas'])
+                        checkpoint.record(path, file_fingerprint(path), result['pages'], len(result['chunks']))
+                    except Exception as e:
+                        errors.append((path, f"{type(e).__name__}: {e}"))
+                        print(f"  ✗ {path}: {e}", file=sys.stderr)
+                        continue
+
+                    totals['files'] += 1
+                    totals['pages'] += result['pages']
+                    totals['chunks'] += len(result['chunks'])
+                    totals['bytes'] += result['bytes']
+                    elapsed = time.perf_counter() - start
+                    print(f"  ✓ [{totals['files'] + len(errors)}/{len(todo)}] {os.path.basename(path)}: "
+                          f"{result['pages']} pages, {len(result['chunks'])} chunks "
+                          f"({totals['pages'] / elapsed:.1f} pages/s overall)")
+        except KeyboardInterrupt:
+            print("Interrupted; finished files are checkpointed, run the same command again to resume")
+            for future in pending:
+                future.cancel()
+            raise SystemExit(130)
+
+    elapsed = time.perf_counter() - start
+    print(f"\nIndexed {totals['files']} files, {totals['pages']} pages, {totals['chunks']} chunks "
+          f"into '{args.collection}' in {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"Throughput: {totals['files'] / elapsed:.2f} files/s, {totals['pages'] / elapsed:.1f} pages/s, "
+              f"{totals['chunks'] / elapsed:.1f} chunks/s, {totals['bytes'] / 1e6 / elapsed:.2f} MB/s")
+    if errors:
+        print(f"{len(errors)} file(s) failed:")
+        for path, error in errors:
+            print(f"  {path}: {error}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Thin client for ``rag.service``.
+
+``RAGServiceClient`` wraps the HTTP endpoints. ``RemoteRAGChatbot`` offers
+the part of the ``PDFRAGChatbot`` interface the UIs use, so they can work
+against a running service with ``SessionManager(chatbot_factory=RemoteRAGChatbot)``;
+both apps do this when ``RAG_SERVICE_URL`` is set. Only httpx is needed,
+none of the embedding or vector store stack is imported.
+"""
+import os
+import sys
+
+import httpx
+
+# Workspace-level shared modules (generation handles)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'shared'))
+from llm.generation import GenerationHandle
+
+DEFAULT_SERVICE_URL = "http://127.0.0.1:8800"
+
+
+def service_url(base_url=None):
+    """Resolve the service URL from the argument, ``RAG_SERVICE_URL`` or the default."""
+    return (base_url or os.environ.get("RAG_SERVICE_URL") or DEFAULT_SERVICE_URL).rstrip("/")
+
+
+class ServiceError(RuntimeError):
+    """The service answered with an error status."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"RAG service error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class RAGServiceClient:
+    def __init__(self, base_url=None, timeout=60.0):
+        self.base_url = service_url(base_url)
+        self._http = httpx.Client(base_url=self.base_url, timeout=timeout)
+
+    def _request(self, method, path, **kwargs):
+        response = self._http.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('detail')
+            except ValueError:
+                detail = response.text
+            raise ServiceError(response.status_code, detail)
+        return response.json()
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def upload(self, pdf_path, filename=None):
+        """Upload a PDF (streamed from disk); returns the document status with its ``doc_id``."""
+        with open(pdf_path, "rb") as f:
+            files = {'file': (filename or os.path.basename(pdf_path), f, "application/pdf")}
+            return self._request("POST", "/documents", files=files, timeout=None)
+
+    def status(self, doc_id):
+        return self._request("GET", f"/documents/{doc_id}")
+
+    def pages(self, doc_id, first_page=None, last_page=None):
+        """Page texts of a range (inclusive) as ``[{'page': ..., 'text': ...}]``, in page order."""
+        params = {key: value for key, value in (('first_page', first_page), ('last_page', last_page))
+                  if value is not None}
+        return self._request("GET", f"/documents/{doc_id}/pages", params=params)['pages']
+
+    def sections(self, doc_id):
+        return self._request("GET", f"/documents/{doc_id}/sections")['sections']
+
+    def search(self, doc_id, query, n_results=None):
+        return self._request("POST", f"/documents/{doc_id}/search", json={'query': query, 'n_results': n_results})
+
+    def answer(self, doc_id, query="", mode="answer", **params):
+        """Blocking answer; returns the result dict (or message string) of the chatbot."""
+        payload = dict(params, query=query, mode=mode)
+        return self._request("POST", f"/documents/{doc_id}/answer", json=payload, timeout=None)['result']
+
+    def stream_answer(self, doc_id, query="", mode="answer", **params):
+        """Start a streaming answer; iterate and cancel it like an Ollama ``GenerationHandle``.
+
+        The chatbot's result is in ``handle.final_chunk['result']`` once done.
+        """
+        payload = dict(params, query=query, mode=mode)
+        return GenerationHandle(f"/documents/{doc_id}/answer/stream", payload, base_url=self.base_url)
+
+
+class RemoteRAGChatbot:
+    """``PDFRAGChatbot`` stand-in that forwards to ``rag.service``.
+
+    The PDF is uploaded on construction (the service deduplicates by
+    content, so reopening a document does not index it again) and indexed
+    there in the background. Options that only concern a local index are
+    accepted and ignored.
+    """
+
+    def __init__(self, pdf_file_path="test.pdf", model_name="llama3.2", extractive_mode=False,
+                 service_url=None, **local_options):
+        if pdf_file_path is None:
+            raise ValueError("RemoteRAGChatbot needs a PDF file to upload")
+        self.pdf_file_path = pdf_file_path
+        self.model_name = model_name
+        self.extractive_mode = extractive_mode
+        self.service = RAGServiceClient(service_url)
+        # Ingests run in the service
+        self.ingestion_job = None
+        self.active_generation = None
+        self._status = self.service.upload(pdf_file_path)
+        self.doc_id = self._status['doc_id']
+
+    def status(self):
+        """Latest document status from the service (the last known one if it is unreachable)."""
+        try:
+            self._status = self.service.status(self.doc_id)
+        except (ServiceError, httpx.HTTPError) as e:
+            print(f"Could not fetch document status: {e}")
+        return self._status
+
+    def ingestion_progress(self):
+        return self.status()['progress']
+
+    def coverage(self):
+        return self.status()['coverage']
+
+    def chunk_count(self):
+        return self.status()['chunks'] or 0
+
+    def memory_usage(self):
+        return 0
+
+    def is_busy(self):
+        return self.active_generation is not None
+
+    def release_memory(self):
+        pass
+
+    def force_reload_pdf(self, new_pdf_path=None):
+        """Upload a new file; re-indexing an unchanged file is left to the service."""
+        if new_pdf_path:
+            self.pdf_file_path = new_pdf_path
+            self._status = self.service.upload(new_pdf_path)
+            self.doc_id = self._status['doc_id']
+        return f"Document {os.path.basename(self.pdf_file_path)} is indexed by the RAG service at {self.service.base_url}"
+
+    def read_pages(self, first_page=None, last_page=None):
+        return [(page['page'], page['text']) for page in self.service.pages(self.doc_id, first_page, last_page)]
+
+    def sections(self):
+        return self.service.sections(self.doc_id)
+
+    def search_context(self, query, n_results=None):
+        try:
+            return self.service.search(self.doc_id, query, n_results)['results']
+        except Exception as e:
+            print(f"Error searching context: {e}")
+            return []
+
+    def cancel_generation(self):
+        """Abort the running generation, if any. Returns its partial text."""
+        handle = self.active_generation
+        if handle is None:
+            return None
+        handle.cancel()
+        return handle.text
+
+    def _stream(self, mode, query, on_token, model, **params):
+        model = model or self.model_name
+        handle = self.service.stream_answer(self.doc_id, query, mode, model=model, **params)
+        self.active_generation = handle
+        try:
+            for piece in handle.iter_text():
+                if on_token:
+                    on_token(piece)
+        except BaseException:
+            handle.cancel()
+            raise
+        finally:
+            if self.active_generation is handle:
+                self.active_generation = None
+        if handle.cancelled:
+            return {'response': handle.text, 'context_used': [], 'model': model, 'cancelled': True,
+                    'coverage': self._status['coverage'], 'answer_path': 'llm'}
+        return handle.final_chunk.get('result', handle.text)
+
+    def generate_summary(self, temperature=0.2, top_p=0.9, top_k=40, on_token=None, model=None):
+        try:
+            return self._stream('summary', "", on_token, model, temperature=temperature, top_p=top_p, top_k=top_k)
+        except Exception as e:
+            return f"Error generating summary: {e}"
+
+    def generate_response(self, query, temperature=0.2, top_p=0.9, top_k=40, on_token=None, extractive=None,
+                          model=None):
+        try:
+            return self._stream('answer', query, on_token, model, temperature=temperature, top_p=top_p,
+                                top_k=top_k, extractive=self.extractive_mode if extractive is None else extractive)
+        except Exception as e:
+            return f"Error generating response: {e}"
+
+    def summarize_pages(self, first_page=None, last_page=None, section=None, temperature=0.2, top_p=0.9, top_k=40,
+                        on_token=None, model=None):
+        try:
+            return self._stream('summary', "", on_token, model, first_page=first_page, last_page=last_page,
+                                section=section, temperature=temperature, top_p=top_p, top_k=top_k)
+        except Exception as e:
+            return f"Error generating summary: {e}"
+
+    def answer_from_pages(self, query, first_page=None, last_page=None, section=None, temperature=0.2, top_p=0.9,
+                          top_k=40, on_token=None, model=None):
+        try:
+            return self._stream('answer', query, on_token, model, first_page=first_page, last_page=last_page,
+                                section=section, temperature=temperature, top_p=top_p, top_k=top_k)
+        except Exception as e:
+            return f"Error generating response: {e}"
@@ -0,0 +1,207 @@
+"""Near-duplicate elimination at ingest.
+
+Running headers and footers, legal boilerplate and repeated tables would
+otherwise be embedded once per page, inflating the index and crowding out
+useful chunks in search results. Two steps remove them:
+
+* Page furniture: lines at the top or bottom of a page that recur on many
+  pages are learned from a sample of pages and stripped before chunking.
+  Only the page number is ignored, so "Page 3 of 40" matches "Page 4 of
+  40", but "Invoice INV-1003" does not match "Invoice INV-1004". A page is
+  never stripped down to nothing.
+* Duplicate chunks: every chunk gets a MinHash signature over word
+  shingles, and LSH banding finds earlier chunks whose estimated Jaccard
+  similarity reaches the threshold. A duplicate is not embedded; the kept
+  chunk's ``pages`` metadata lists every page its text appears on, and
+  ``last_page`` holds the highest of them for page-range filters.
+"""
+import hashlib
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+# Lines at each end of a page that may be furniture, at most this share of its lines
+# (so short, form-like pages keep their content)
+EDGE_LINES = 3
+EDGE_MAX_FRACTION = 0.25
+# A line is furniture if it recurs at page edges on this share of the sampled pages (and at least 3)
+FURNITURE_MIN_FRACTION = 0.3
+FURNITURE_MIN_PAGES = 3
+# Longer lines are body text, however often they recur
+FURNITURE_MAX_CHARS = 200
+# Pages read up front, spread over the document, to learn the furniture from
+FURNITURE_SAMPLE_PAGES = 40
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: pairs from about 0.5 Jaccard similarity up become candidates
+LSH_BANDS = 16
+DUPLICATE_THRESHOLD = 0.85
+
+_PRIME = (1 << 31) - 1
+_DIGITS = re.compile(r"\d+")
+# A line that is only a page number: "12", "- 12 -", "Page 12", "Page 12 of 40", "12/40"
+_PAGE_NUMBER_LINE = re.compile(r"^\W*(page\s*)?\d+(\s*(of|/)\s*\d+)?\W*$")
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def normalize_line(line, page_number=None):
+    """Normalized line with its page number replaced by ``#``; other numbers must match exactly.
+
+    The first number of a line that is only a page number also becomes
+    ``#``, which covers printed page labels offset from the PDF's pages.
+    """
+    text = normalize(line)
+    if _PAGE_NUMBER_LINE.match(text):
+        return _DIGITS.sub("#", text, count=1)
+    if page_number is not None:
+        return re.sub(rf"(?<!\d){page_number}(?!\d)", "#", text)
+    return text
+
+
+def chunk_pages(metadata):
+    """Pages a chunk's text appears on: its ``pages`` list if ingest found it repeated, else its page."""
+    return [int(page) for page in str(metadata.get('pages', metadata['page'])).split(",")]
+
+
+def page_label(metadata):
+    """``Page 3``, or ``Pages 3, 7, 12`` for a chunk that ingest found repeated on several pages."""
+    pages = metadata.get('pages')
+    return f"Pages {pages.replace(',', ', ')}" if pages else f"Page {metadata['page']}"
+
+
+def _edge_indices(lines):
+    """Indices of the first and last non-empty lines (``EDGE_LINES`` at most, fewer on short pages)."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    edge = min(EDGE_LINES, int(len(filled) * EDGE_MAX_FRACTION))
+    if not edge:
+        return set()
+    return set(filled[:edge] + filled[-edge:])
+
+
+def sample_pages(page_count, max_pages=FURNITURE_SAMPLE_PAGES):
+    """Page indices spread evenly over the document."""
+    if page_count <= max_pages:
+        return list(range(page_count))
+    step = page_count / max_pages
+    return sorted({int(i * step) for i in range(max_pages)})
+
+
+def learn_furniture(pages):
+    """Normalized lines that recur at the edges of many of ``pages`` (``[(page_number, text)]``)."""
+    if len(pages) < FURNITURE_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for page_number, text in pages:
+        lines = (text or "").splitlines()
+        counts.update({normalize_line(lines[i], page_number) for i in _edge_indices(lines)})
+    needed = max(FURNITURE_MIN_PAGES, FURNITURE_MIN_FRACTION * len(pages))
+    return {line for line, pages in counts.items() if 0 < len(line) <= FURNITURE_MAX_CHARS and pages >= needed}
+
+
+def strip_furniture(text, furniture, page_number=None):
+    """Remove furniture lines from the edges of a page; returns ``(text, lines_removed)``."""
+    if not furniture or not text:
+        return text, 0
+    lines = text.splitlines()
+    remove = {i for i in _edge_indices(lines) if normalize_line(lines[i], page_number) in furniture}
+    # A page made only of "furniture" is content after all
+    if not remove or all(i in remove for i, line in enumerate(lines) if line.strip()):
+        return text, 0
+    return "\n".join(line for i, line in enumerate(lines) if i not in remove), len(remove)
+
+
+class ChunkDeduplicator:
+    """Remember the chunks of one document and recognise repeats of them.
+
+    ``check`` registers a chunk and returns the id of an earlier chunk it
+    duplicates (exactly or nearly), recording the new page on that chunk's
+    metadata; the ids whose metadata changed are collected in ``updated``.
+    """
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD, num_permutations=NUM_PERMUTATIONS, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_permutations // bands
+        # Fixed seed, so signatures stay comparable between runs
+        rng = np.random.default_rng(0)
+        self._a = rng.integers(1, _PRIME, num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_permutations, dtype=np.uint64)
+        self._exact = {}
+        self._buckets = {}
+        self._signatures = {}
+        self._metadatas = {}
+        self.updated = set()
+        self.chunks_seen = 0
+        self.duplicates = 0
+        self.chars_avoided = 0
+
+    def signature(self, text):
+        words = normalize(text).split()
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64,
+                             count=len(shingles))
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _find(self, digest, signature):
+        if digest in self._exact:
+            return self._exact[digest]
+        for key in self._band_keys(signature):
+            for candidate in self._buckets.get(key, ()):
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+        return None
+
+    def add(self, chunk_id, text, metadata):
+        """Register a chunk as kept without checking it (e.g. one indexed by an earlier run)."""
+        digest = hashlib.sha1(normalize(text).encode("utf-8")).digest()
+        self._remember(chunk_id, digest, self.signature(text), metadata)
+
+    def _remember(self, chunk_id, digest, signature, metadata):
+        self._exact.setdefault(digest, chunk_id)
+        self._signatures[chunk_id] = signature
+        self._metadatas[chunk_id] = metadata
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(chunk_id)
+
+    def check(self, chunk_id, text, metadata):
+        """Return the id of the kept chunk ``text`` duplicates, or None after registering it as new."""
+        self.chunks_seen += 1
+        digest = hashlib.sha1(normalize(text).encode("utf-8")).digest()
+        signature = self.signature(text)
+        original = self._find(digest, signature)
+        if original is None:
+            self._remember(chunk_id, digest, signature, metadata)
+            return None
+
+        self.duplicates += 1
+        self.chars_avoided += len(text)
+        kept = self._metadatas[original]
+        pages = chunk_pages(kept)
+        if metadata['page'] not in pages:
+            kept['pages'] = ",".join(str(page) for page in pages + [metadata['page']])
+            kept['last_page'] = max(pages + [metadata['page']])
+            self.updated.add(original)
+        return original
+
+    def take_updates(self):
+        """``(ids, metadatas)`` of kept chunks that gained pages since the last call."""
+        ids = sorted(self.updated)
+        self.updated = set()
+        return ids, [self._metadatas[chunk_id] for chunk_id in ids]
+
+    def stats(self):
+        return {
+            'chunks_seen': self.chunks_seen,
+            'duplicates': self.duplicates,
+            'embeddings_avoided': round(self.duplicates / self.chunks_seen, 3) if self.chunks_seen else 0.0,
+            'chars_avoided': self.chars_avoided
+        }
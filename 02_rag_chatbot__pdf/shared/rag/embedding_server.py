@@ -0,0 +1,356 @@
+"""Shared sentence embedding with dynamic micro-batching.
+
+Most encode calls embed a single short query, and on CPU a batch of one
+leaves most of the model's throughput unused. A ``MicroBatcher`` wraps the
+model behind the same ``encode()`` call: concurrent requests are queued and
+one thread encodes them together, collecting until ``max_batch_size`` texts
+are waiting or the oldest request has waited ``max_wait_ms``. Requests that
+are already a full batch (ingest commits) are encoded directly.
+
+``get_embedding_model()`` in rag.pdf_chatbot returns a process-wide batcher,
+so every ``PDFRAGChatbot`` in the process shares it. To share one model
+between processes (e.g. rag.service workers), run the server on a Unix
+socket and set ``RAG_EMBEDDING_SOCKET``; ``EmbeddingClient`` then sends the
+requests there, where requests from all processes are batched together.
+
+Usage (from the shared/ directory):
+    python -m rag.embedding_server --socket /tmp/rag-embed.sock --max-batch-size 32 --max-wait-ms 5
+    RAG_EMBEDDING_SOCKET=/tmp/rag-embed.sock python -m rag.service --workers 4
+
+Both ``MicroBatcher.stats()`` and ``EmbeddingClient.stats()`` report
+histograms of batch sizes and queue delays.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("RAG_EMBED_MAX_BATCH", "32"))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("RAG_EMBED_MAX_WAIT_MS", "5"))
+DEFAULT_SOCKET_PATH = "/tmp/rag-embed.sock"
+
+# Histogram bucket upper bounds
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_DELAY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250)
+
+_LENGTH = struct.Struct(">I")
+
+
+class Histogram:
+    """Thread-safe counts of observations per bucket (upper bounds, plus overflow)."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+            return {
+                'count': self.count,
+                'mean': round(self.total / self.count, 2) if self.count else 0.0,
+                'max': round(self.max, 2),
+                'buckets': dict(zip(labels, self.counts))
+            }
+
+
+class _Request:
+    __slots__ = ('texts', 'normalize', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, texts, normalize):
+        self.texts = texts
+        self.normalize = normalize
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Batch concurrent ``encode()`` calls on one SentenceTransformer model.
+
+    ``encode()`` takes a string or a list of strings and returns float32
+    NumPy embeddings; only ``normalize_embeddings`` is honoured among the
+    SentenceTransformer keyword arguments.
+    """
+
+    def __init__(self, model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_delays_ms = Histogram(QUEUE_DELAY_BUCKETS_MS)
+        self.requests = 0
+        self._queue = deque()
+        self._queued_texts = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def _encode(self, texts, normalize):
+        embeddings = self.model.encode(texts, batch_size=self.max_batch_size, normalize_embeddings=normalize,
+                                       convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        with self._cond:
+            self.requests += 1
+        if len(texts) >= self.max_batch_size:
+            # Already a full batch: waiting for others would only delay it
+            self.batch_sizes.observe(len(texts))
+            self.queue_delays_ms.observe(0.0)
+            embeddings = self._encode(texts, normalize_embeddings)
+        else:
+            request = _Request(texts, normalize_embeddings)
+            with self._cond:
+                self._queue.append(request)
+                self._queued_texts += len(texts)
+                self._cond.notify()
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+            embeddings = request.result
+        return embeddings[0] if single else embeddings
+
+    def _next_batch(self):
+        """Wait for requests and take the next batch (all with the same ``normalize`` flag)."""
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            # Collect until the batch is full or the oldest request has waited long enough
+            deadline = self._queue[0].enqueued + self.max_wait
+            while self._queued_texts < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = [self._queue.popleft()]
+            size = len(batch[0].texts)
+            while (self._queue and self._queue[0].normalize == batch[0].normalize
+                   and size + len(self._queue[0].texts) <= self.max_batch_size):
+                request = self._queue.popleft()
+                batch.append(request)
+                size += len(request.texts)
+            self._queued_texts -= size
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            for request in batch:
+                self.queue_delays_ms.observe((started - request.enqueued) * 1000)
+            texts = [text for request in batch for text in request.texts]
+            self.batch_sizes.observe(len(texts))
+            try:
+                embeddings = self._encode(texts, batch[0].normalize)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            offset = 0
+            for request in batch:
+                request.result = embeddings[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.done.set()
+
+    def stats(self):
+        return {
+            'mode': 'in-process',
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'requests': self.requests,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_delay_ms': self.queue_delays_ms.snapshot()
+        }
+
+
+def _send(stream, header, payload=b""):
+    data = json.dumps(header).encode("utf-8")
+    stream.write(_LENGTH.pack(len(data)) + data + payload)
+    stream.flush()
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise ConnectionError("embedding server connection closed")
+    return data
+
+
+def _receive(stream):
+    """Read one length-prefixed JSON header; None at a clean end of stream."""
+    prefix = stream.read(_LENGTH.size)
+    if not prefix:
+        return None
+    if len(prefix) < _LENGTH.size:
+        raise ConnectionError("embedding server connection closed")
+    return json.loads(_read_exact(stream, _LENGTH.unpack(prefix)[0]))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        batcher = self.server.batcher
+        while True:
+            try:
+                message = _receive(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if message is None:
+                return
+            try:
+                if message.get('op') == 'stats':
+                    _send(self.wfile, dict(batcher.stats(), mode='server'))
+                    continue
+                embeddings = batcher.encode(message['texts'], normalize_embeddings=message.get('normalize', False))
+                data = np.ascontiguousarray(embeddings, dtype=np.float32).tobytes()
+                _send(self.wfile, {'shape': list(embeddings.shape), 'nbytes': len(data)}, data)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                _send(self.wfile, {'error': f"{type(e).__name__}: {e}"})
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """Serve a ``MicroBatcher`` on a Unix socket, one thread per connection."""
+
+    daemon_threads = True
+    # Every client thread keeps its own connection
+    request_queue_size = 128
+
+    def __init__(self, socket_path, batcher):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Left behind by a server that did not shut down cleanly
+        self.batcher = batcher
+        super().__init__(socket_path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class EmbeddingClient:
+    """``encode()``-compatible client of an ``EmbeddingServer``; one connection per thread."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            sock.settimeout(self.timeout)
+            conn = self._local.conn = (sock, sock.makefile('rwb'))
+        return conn
+
+    def _call(self, message):
+        # Retry once on a fresh connection, e.g. after the server restarted
+        for attempt in range(2):
+            sock, stream = self._connection()
+            try:
+                _send(stream, message)
+                header = _receive(stream)
+                if header is None:
+                    raise ConnectionError("embedding server connection closed")
+                payload = _read_exact(stream, header['nbytes']) if 'nbytes' in header else None
+                break
+            except (ConnectionError, OSError):
+                stream.close()
+                sock.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if 'error' in header:
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        return header, payload
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        header, payload = self._call({'op': 'encode', 'texts': texts, 'normalize': normalize_embeddings})
+        embeddings = np.frombuffer(payload, dtype=np.float32).reshape(header['shape'])
+        return embeddings[0] if single else embeddings
+
+    def stats(self):
+        return self._call({'op': 'stats'})[0]
+
+
+def print_stats(stats):
+    print(f"{stats['requests']} requests; batch size mean {stats['batch_size']['mean']} "
+          f"(max {stats['batch_size']['max']}); queue delay mean {stats['queue_delay_ms']['mean']} ms "
+          f"(max {stats['queue_delay_ms']['max']} ms)")
+    for name in ('batch_size', 'queue_delay_ms'):
+        buckets = ", ".join(f"{label}: {count}" for label, count in stats[name]['buckets'].items() if count)
+        print(f"  {name}: {buckets or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve micro-batched sentence embeddings on a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--stats-interval", type=float, default=60.0,
+                        help="Seconds between statistics printouts (0 disables them)")
+    parser.add_argument("--stats", action="store_true", help="Print the statistics of a running server and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        print_stats(EmbeddingClient(args.socket).stats())
+        return
+
+    from sentence_transformers import SentenceTransformer
+
+    batcher = MicroBatcher(SentenceTransformer('all-MiniLM-L6-v2', device='cpu'),
+                           args.max_batch_size, args.max_wait_ms)
+    server = EmbeddingServer(args.socket, batcher)
+    # SIGTERM stops the server like Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+    if args.stats_interval > 0:
+        def report():
+            while True:
+                time.sleep(args.stats_interval)
+                print_stats(batcher.stats())
+        threading.Thread(target=report, daemon=True).start()
+
+    print(f"Embedding server on {args.socket} (batches of up to {args.max_batch_size}, "
+          f"waiting at most {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print_stats(batcher.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Compact, memory-mapped embedding storage.
+
+Embeddings are stored as raw row-major files next to a small JSON header:
+
+    <path>.vec    codes: float32, float16 or int8, ``count x dim``
+    <path>.scale  int8 only: one float32 scale per vector
+    <path>.json   dtype, dim, count, ids and the recall measured against float32
+
+Readers open the files with ``np.memmap`` in read-only mode, so any number of
+worker processes share one copy through the OS page cache. Scoring runs on
+the stored codes block by block (``codes @ q * scale`` for int8) and never
+materializes a full float32 copy. float16 halves and int8 quarters the size
+of float32; the recall of both against exact float32 search is measured when
+a file is built (or, for a file filled during ingest, when the ingest
+completes) and kept in its header.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+# Rows scored per block, bounding the float32 temporaries of a query
+SCORE_BLOCK_ROWS = 16384
+
+
+def top_k(scores, k):
+    """Indices and scores of the ``k`` best columns of each row, best first."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), (scores.shape[0], scores.shape[1]))
+    # argpartition leaves the top k unordered; sort just those
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def quantize(embeddings, dtype):
+    """Encode float32 embeddings as ``(codes, scales)``; scales is None unless int8.
+
+    int8 uses a symmetric per-vector scale so that ``codes * scale`` approximates
+    the original vector.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown storage dtype '{dtype}', expected one of {STORAGE_DTYPES}")
+    if not embeddings.size:
+        return embeddings.astype(dtype), np.empty(0, dtype=np.float32) if dtype == 'int8' else None
+    if dtype == 'float32':
+        return embeddings, None
+    if dtype == 'float16':
+        return embeddings.astype(np.float16), None
+    # int8
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class EmbeddingFile:
+    """Append-only embedding file, memory-mapped for scoring."""
+
+    def __init__(self, path, dtype='float16', dim=None):
+        self.path = path
+        header = self._read_header()
+        if header:
+            self.dtype = header['dtype']
+            # Files built from an empty matrix recorded a dim of 0
+            self.dim = header['dim'] or None
+            self.count = header['count']
+            self.ids = header.get('ids', [])
+            self.info = header.get('info', {})
+        else:
+            if dtype not in STORAGE_DTYPES:
+                raise ValueError(f"Unknown storage dtype '{dtype}', expected one of {STORAGE_DTYPES}")
+            self.dtype = dtype
+            self.dim = dim
+            self.count = 0
+            self.ids = []
+            self.info = {}
+        self._codes = None
+        self._scales = None
+
+    @classmethod
+    def create(cls, path, dtype='float16', dim=None):
+        """Start a new, empty file at ``path`` (replacing an existing one)."""
+        for suffix in ('.vec', '.scale', '.json'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        embedding_file = cls(path, dtype=dtype, dim=dim)
+        embedding_file._write_header()
+        return embedding_file
+
+    def exists(self):
+        """True if a header was written at ``path`` and the vectors it counts are on disk."""
+        header_written = os.path.exists(self.path + '.json')
+        return header_written and (self.count == 0 or os.path.exists(self.path + '.vec'))
+
+    def _read_header(self):
+        try:
+            with open(self.path + '.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_header(self):
+        header = {'dtype': self.dtype, 'dim': self.dim, 'count': self.count, 'ids': self.ids, 'info': self.info}
+        tmp_path = self.path + '.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self.path + '.json')
+
+    @property
+    def nbytes(self):
+        itemsize = np.dtype(self.dtype).itemsize
+        return self.count * self.dim * itemsize + (self.count * 4 if self.dtype == 'int8' else 0) if self.dim else 0
+
+    def append(self, ids, embeddings):
+        """Quantize and append vectors; the header is rewritten last so readers never see partial rows."""
+        if not len(ids):
+            return
+        codes, scales = quantize(embeddings, self.dtype)
+        if self.dim is None:
+            self.dim = codes.shape[1]
+        elif codes.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim embeddings, got {codes.shape[1]}")
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.vec', 'ab') as f:
+            f.write(np.ascontiguousarray(codes).tobytes())
+        if scales is not None:
+            with open(self.path + '.scale', 'ab') as f:
+                f.write(scales.tobytes())
+        self.count += len(codes)
+        self.ids.extend(ids)
+        self._write_header()
+        self._codes = self._scales = None
+
+    def _mapped(self):
+        """Memory-map the codes (and scales) lazily, remapping after appends."""
+        if self._codes is None and self.count:
+            self._codes = np.memmap(self.path + '.vec', dtype=self.dtype, mode='r', shape=(self.count, self.dim))
+            if self.dtype == 'int8':
+                self._scales = np.memmap(self.path + '.scale', dtype=np.float32, mode='r', shape=(self.count,))
+        return self._codes, self._scales
+
+    def scores(self, queries):
+        """Similarity of each query to every stored vector, computed on the stored codes."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        out = np.empty((len(queries), self.count), dtype=np.float32)
+        codes, scales = self._mapped()
+        for start in range(0, self.count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, self.count)
+            block = np.asarray(codes[start:end], dtype=np.float32)
+            out[:, start:end] = queries @ block.T
+            if scales is not None:
+                out[:, start:end] *= scales[start:end]
+        return out
+
+    def search(self, queries, k=5):
+        """Return ``(indices, scores)`` of the top ``k`` vectors for each query."""
+        if not self.count:
+            queries = np.atleast_2d(queries)
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        return top_k(self.scores(queries), k)
+
+    def dequantize(self):
+        """Return all vectors as float32 (for checks; this does copy)."""
+        codes, scales = self._mapped()
+        if codes is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        matrix = np.asarray(codes, dtype=np.float32)
+        return matrix * scales[:, None] if scales is not None else matrix
+
+    def close(self):
+        self._codes = self._scales = None
+
+
+def measure_recall(reference, embedding_file, queries, k=10):
+    """Recall@k of searching ``embedding_file`` against exact float32 search over ``reference``."""
+    reference = np.asarray(reference, dtype=np.float32)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    k = min(k, len(reference))
+    expected, _ = top_k(queries @ reference.T, k)
+    found, _ = embedding_file.search(queries, k)
+    hits = sum(len(set(e.tolist()) & set(f.tolist())) for e, f in zip(expected, found))
+    return hits / (len(queries) * k)
+
+
+def sample_queries(embeddings, num_queries=100, seed=0):
+    """Stored vectors used as queries when no real query set is available."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)
+    return embeddings[picks]
+
+
+def record_recall(embedding_file, reference, k=10):
+    """Measure recall@k of ``embedding_file`` against its float32 ``reference`` and keep it in the header."""
+    reference = np.asarray(reference, dtype=np.float32)
+    if not len(reference):
+        return
+    recall = measure_recall(reference, embedding_file, sample_queries(reference), k)
+    embedding_file.info = {'recall_at_k': round(recall, 4), 'k': min(k, len(reference))}
+    embedding_file._write_header()
+
+
+def build_embedding_file(path, ids, embeddings, dtype='float16', k=10):
+    """Write ``embeddings`` to ``path`` and record recall@k against float32 in its header."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    dim = embeddings.shape[1] if embeddings.ndim == 2 and len(embeddings) else None
+    embedding_file = EmbeddingFile.create(path, dtype=dtype, dim=dim)
+    embedding_file.append(ids, embeddings)
+    record_recall(embedding_file, embeddings, k)
+    return embedding_file
+
+
+class QuantizedVectorStore:
+    """Vector store backend that searches a memory-mapped ``EmbeddingFile``.
+
+    Same interface as the other backends in ``rag.vector_store``; documents
+    and metadata stay in memory, only the vectors live in the file.
+    """
+
+    def __init__(self, embedding_file):
+        self.file = embedding_file
+        self.name = f"numpy-{embedding_file.dtype}"
+        self.documents = []
+        self.metadatas = []
+
+    @classmethod
+    def from_store(cls, store, path, dtype='float16', batch_size=5000):
+        """Build (or reuse) the embedding file for every vector of another backend.
+
+        An existing file holding the store's vectors is shared as is; only
+        the documents and metadata are read from the store then.
+        """
+        existing = EmbeddingFile(path)
+        if existing.exists() and existing.dtype == dtype and existing.count == store.count():
+            ids, documents, metadatas = [], [], []
+            for batch_ids, _, batch_documents, batch_metadatas in store.iter_batches(batch_size, embeddings=False):
+                ids.extend(batch_ids)
+                documents.extend(batch_documents)
+                metadatas.extend(batch_metadatas)
+            if set(existing.ids) == set(ids):
+                # Another process already wrote this collection; share its file
+                position = {id_: i for i, id_ in enumerate(ids)}
+                quantized_store = cls(existing)
+                quantized_store.documents = [documents[position[id_]] for id_ in existing.ids]
+                quantized_store.metadatas = [metadatas[position[id_]] for id_ in existing.ids]
+                return quantized_store
+
+        ids, embeddings, documents, metadatas = [], [], [], []
+        for batch_ids, batch_embeddings, batch_documents, batch_metadatas in store.iter_batches(batch_size):
+            ids.extend(batch_ids)
+            documents.extend(batch_documents)
+            metadatas.extend(batch_metadatas)
+            embeddings.append(np.asarray(batch_embeddings, dtype=np.float32))
+        matrix = np.concatenate(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+        quantized_store = cls(build_embedding_file(path, ids, matrix, dtype=dtype))
+        quantized_store.documents = documents
+        quantized_store.metadatas = metadatas
+        quantized_store.report_recall()
+        return quantized_store
+
+    def check_recall(self, store, batch_size=5000):
+        """Measure recall against the float32 vectors of ``store`` (e.g. once an ingest completes)."""
+        position = {id_: i for i, id_ in enumerate(self.file.ids)}
+        reference = np.empty((self.file.count, self.file.dim or 0), dtype=np.float32)
+        found = 0
+        for batch_ids, batch_embeddings, _, _ in store.iter_batches(batch_size):
+            for id_, embedding in zip(batch_ids, batch_embeddings):
+                if id_ in position:
+                    reference[position[id_]] = embedding
+                    found += 1
+        if found == self.file.count:
+            record_recall(self.file, reference)
+            self.report_recall()
+
+    def report_recall(self):
+        if self.file.info:
+            print(f"{self.file.dtype} embeddings: recall@{self.file.info['k']} vs float32 "
+                  f"{self.file.info['recall_at_k']:.3f}, {self.file.nbytes / 1e6:.1f} MB")
+
+    @property
+    def ids(self):
+        return self.file.ids
+
+    def count(self):
+        return self.file.count
+
+    def memory_bytes(self):
+        """Document text only; the mapped vectors live in the shared page cache."""
+        return sum(len(doc) for doc in self.documents)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.file.append(list(ids), embeddings)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+
+    def update_metadatas(self, ids, metadatas):
+        position = {id_: i for i, id_ in enumerate(self.file.ids)}
+        for id_, metadata in zip(ids, metadatas):
+            self.metadatas[position[id_]] = metadata
+
+    def query(self, query_embeddings, n_results=5):
+        top, top_scores = self.file.search(query_embeddings, n_results)
+        return [
+            [
+                {
+                    'id': self.file.ids[i],
+                    'content': self.documents[i],
+                    'metadata': self.metadatas[i],
+                    'relevance_score': float(score)
+                }
+                for i, score in zip(row.tolist(), row_scores.tolist())
+            ]
+            for row, row_scores in zip(top, top_scores)
+        ]
+
+    def get(self):
+        return {'ids': list(self.file.ids), 'documents': list(self.documents), 'metadatas': list(self.metadatas)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding storage formats against float32")
+    parser.add_argument("embeddings", help=".npy file of float32 embeddings (one row per vector)")
+    parser.add_argument("--queries", help=".npy file of query embeddings (default: sampled rows)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--out", default="embedding_check", help="Base path for the files written")
+    args = parser.parse_args()
+
+    embeddings = np.load(args.embeddings).astype(np.float32)
+    queries = np.load(args.queries).astype(np.float32) if args.queries else sample_queries(embeddings)
+    ids = [str(i) for i in range(len(embeddings))]
+
+    print(f"{len(embeddings)} vectors x {embeddings.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    for dtype in STORAGE_DTYPES:
+        embedding_file = build_embedding_file(f"{args.out}.{dtype}", ids, embeddings, dtype=dtype, k=args.k)
+        recall = measure_recall(embeddings, embedding_file, queries, args.k)
+        print(f"{dtype:<8} {embedding_file.nbytes / 1e6:>8.2f} MB  recall@{args.k} {recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
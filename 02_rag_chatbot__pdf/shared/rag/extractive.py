@@ -0,0 +1,59 @@
+"""Extractive answers for lookup questions.
+
+When retrieval is decisive (the best chunk scores high and clearly beats the
+runner-up) the answer is usually a sentence of that chunk, so it can be
+returned directly with its page citation instead of waiting for the LLM.
+"""
+import re
+
+import numpy as np
+
+# Defaults for when retrieval counts as decisive (cosine similarities)
+EXTRACTIVE_MIN_SCORE = 0.6
+EXTRACTIVE_MIN_MARGIN = 0.05
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n{2,}')
+
+
+def split_sentences(text, min_length=20):
+    """Split a chunk into sentences, merging fragments shorter than ``min_length``."""
+    sentences = []
+    for part in _SENTENCE_END.split(text):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        if sentences and len(sentences[-1]) < min_length:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def retrieval_margin(context_docs):
+    """Score of the best chunk and its lead over the second best."""
+    if not context_docs:
+        return None, None
+    top = context_docs[0]['relevance_score']
+    runner_up = context_docs[1]['relevance_score'] if len(context_docs) > 1 else -1.0
+    return top, top - runner_up
+
+
+def is_decisive(context_docs, min_score=EXTRACTIVE_MIN_SCORE, min_margin=EXTRACTIVE_MIN_MARGIN):
+    top, margin = retrieval_margin(context_docs)
+    return top is not None and top >= min_score and margin >= min_margin
+
+
+def best_sentence(query_embedding, text, encode):
+    """Return ``(sentence, score)`` for the sentence of ``text`` closest to the query.
+
+    ``encode`` embeds a list of strings into normalized vectors.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return text.strip(), None
+    if len(sentences) == 1:
+        return sentences[0], None
+    sentence_embeddings = np.asarray(encode(sentences), dtype=np.float32)
+    scores = sentence_embeddings @ np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    best = int(np.argmax(scores))
+    return sentences[best], float(scores[best])
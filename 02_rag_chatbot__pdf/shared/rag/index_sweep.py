@@ -0,0 +1,139 @@
+"""Recall-vs-latency sweep over vector index settings.
+
+Embeds the chunks of one PDF once, computes exact top-k neighbours with a
+brute-force dot product as ground truth, then builds an in-memory Chroma
+collection for every combination of HNSW settings and measures recall@k,
+query latency and build time.
+
+Usage (from the shared/ directory):
+    python -m rag.index_sweep ../data/test.pdf --k 5 --M 8 16 32 --search-ef 10 50 100
+"""
+import argparse
+import itertools
+import json
+import random
+import time
+
+import chromadb
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from rag.pdf_chatbot import split_into_chunks
+from rag.pdf_extract import TextExtractor
+from rag.vector_store import DEFAULT_INDEX_CONFIG, index_metadata
+
+
+def load_chunks(pdf_path):
+    chunks = []
+    with TextExtractor().open(pdf_path) as pdf:
+        for i in range(pdf.page_count):
+            text = pdf.page_text(i)
+            if text:
+                chunks.extend(chunk.strip() for chunk in split_into_chunks(text) if chunk.strip())
+    return chunks
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_config(client, config, embeddings, ids, query_embeddings, truth, k):
+    """Build one collection with ``config`` and measure recall@k and latency."""
+    name = f"sweep_{config['space']}_{config['M']}_{config['construction_ef']}_{config['search_ef']}"
+    collection = client.create_collection(name=name, metadata=index_metadata(config))
+    try:
+        start = time.perf_counter()
+        batch = 5000
+        for offset in range(0, len(ids), batch):
+            collection.add(
+                embeddings=embeddings[offset:offset + batch].tolist(),
+                ids=ids[offset:offset + batch]
+            )
+        build_s = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        for query_embedding, expected in zip(query_embeddings, truth):
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=[query_embedding.tolist()], n_results=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found = {int(i) for i in result['ids'][0]}
+            hits += len(found & expected)
+    finally:
+        client.delete_collection(name=name)
+
+    return {
+        **config,
+        'recall': hits / (len(truth) * k),
+        'mean_ms': sum(latencies) / len(latencies),
+        'p95_ms': percentile(latencies, 95),
+        'build_s': build_s
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep vector index settings for recall vs latency")
+    parser.add_argument("pdf", help="PDF whose chunks form the corpus")
+    parser.add_argument("--queries", help="Text file with one query per line (default: sampled chunks)")
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--space", nargs="+", default=[DEFAULT_INDEX_CONFIG['space']])
+    parser.add_argument("--M", nargs="+", type=int, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", nargs="+", type=int, default=[100, 200])
+    parser.add_argument("--search-ef", nargs="+", type=int, default=[10, 25, 50, 100])
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.pdf)
+    if len(chunks) <= args.k:
+        raise SystemExit(f"Need more than {args.k} chunks, found {len(chunks)}")
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        # Use the opening of random chunks as self-retrieval queries
+        rng = random.Random(0)
+        queries = [chunk[:200] for chunk in rng.sample(chunks, min(args.num_queries, len(chunks)))]
+
+    model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+    embeddings = model.encode(chunks, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+    query_embeddings = model.encode(queries, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+    ids = [str(i) for i in range(len(chunks))]
+
+    # Exact neighbours by cosine similarity (embeddings are normalized)
+    scores = query_embeddings @ embeddings.T
+    top = np.argpartition(-scores, args.k, axis=1)[:, :args.k]
+    truth = [set(row.tolist()) for row in top]
+
+    print(f"Corpus: {len(chunks)} chunks, {len(queries)} queries, k={args.k}")
+    print(f"{'space':<7}{'M':>4}{'c_ef':>6}{'s_ef':>6}{'recall':>9}{'mean ms':>10}{'p95 ms':>9}{'build s':>9}")
+
+    client = chromadb.EphemeralClient()
+    results = []
+    for space, m, construction_ef, search_ef in itertools.product(
+            args.space, args.M, args.construction_ef, args.search_ef):
+        config = {'space': space, 'construction_ef': construction_ef, 'search_ef': search_ef, 'M': m}
+        row = run_config(client, config, embeddings, ids, query_embeddings, truth, args.k)
+        results.append(row)
+        print(f"{space:<7}{m:>4}{construction_ef:>6}{search_ef:>6}{row['recall']:>9.3f}"
+              f"{row['mean_ms']:>10.2f}{row['p95_ms']:>9.2f}{row['build_s']:>9.2f}")
+
+    # Report the fastest settings at a few recall targets
+    for target in (0.9, 0.95, 0.99):
+        candidates = [r for r in results if r['recall'] >= target]
+        if candidates:
+            best = min(candidates, key=lambda r: r['p95_ms'])
+            print(f"Fastest with recall >= {target}: space={best['space']} M={best['M']} "
+                  f"construction_ef={best['construction_ef']} search_ef={best['search_ef']} "
+                  f"(p95 {best['p95_ms']:.2f} ms)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Page-by-page PDF ingestion that can run in the background.
+
+An ``IngestionJob`` extracts, chunks and embeds a PDF in page order and
+commits each small batch of pages to the chatbot's index (and the page texts
+to its page store) as soon as it is embedded, so ``search_context`` can
+answer from the pages indexed so far. Progress is exposed through
+``progress()`` (and an optional callback) and is checkpointed to a small JSON
+state file, which lets an interrupted ingest resume from the last committed
+page instead of starting over. With ``dedup`` repeated page headers and
+footers are stripped and duplicate chunks are embedded only once (see
+rag.dedup).
+"""
+import json
+import os
+import threading
+import time
+
+from rag.dedup import ChunkDeduplicator, learn_furniture, sample_pages, strip_furniture
+from rag.pdf_extract import TextExtractor
+from rag.profiling import profile_request
+
+# Pages embedded and committed together
+PAGES_PER_BATCH = 8
+
+
+def read_ingest_state(state_path):
+    """Return the saved ingest state (``source``, ``pages_done``, ``total_pages``, ``complete``,
+    ``chunk_size``, ``chunk_overlap``) or None."""
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class IngestionJob:
+    """Ingest one PDF into a ``PDFRAGChatbot``, page batch by page batch.
+
+    Call ``run()`` to ingest in the current thread or ``start()`` to ingest
+    in a daemon thread. ``status`` is one of ``'pending'``, ``'running'``,
+    ``'done'``, ``'failed'`` or ``'cancelled'``. With ``profile`` the run is
+    saved as a ``load_and_embed_pdf`` profile (see rag.profiling).
+    """
+
+    def __init__(self, chatbot, pdf_path, state_path=None, start_page=0,
+                 pages_per_batch=PAGES_PER_BATCH, on_progress=None, extractor=None, profile=False, dedup=False):
+        self.chatbot = chatbot
+        self.pdf_path = pdf_path
+        self.extractor = extractor or TextExtractor()
+        self.state_path = state_path
+        self.start_page = start_page
+        self.pages_per_batch = max(1, pages_per_batch)
+        self.on_progress = on_progress
+        self.profile = profile
+        self.dedup = ChunkDeduplicator() if dedup else None
+        self.furniture = set()
+        self.furniture_removed = 0
+
+        self.status = 'pending'
+        self.error = None
+        self.total_pages = None
+        self.pages_done = start_page
+        self.chunks_indexed = 0
+        self.pages_by_backend = {}
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self.status in ('pending', 'running')
+
+    @property
+    def complete(self):
+        return self.status == 'done'
+
+    def start(self):
+        """Run the job in a background thread and return immediately."""
+        self._thread = threading.Thread(target=self._run_safely, name="pdf-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run_safely(self):
+        try:
+            self.run()
+        except Exception as e:
+            print(f"Error loading PDF: {e}")
+
+    def cancel(self, wait=True):
+        """Stop after the current batch; committed pages stay indexed."""
+        self._cancel.set()
+        if wait:
+            self.wait()
+
+    def wait(self, timeout=None):
+        """Block until a background job has finished."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def progress(self):
+        """Snapshot of the job's progress for display."""
+        total = self.total_pages or 0
+        end = self.finished_at or time.time()
+        return {
+            'status': self.status,
+            'pages_done': self.pages_done,
+            'total_pages': total,
+            'chunks_indexed': self.chunks_indexed,
+            'fraction': self.pages_done / total if total else 0.0,
+            'elapsed_s': round(end - self.started_at, 1) if self.started_at else 0.0,
+            'pages_by_backend': dict(self.pages_by_backend),
+            'dedup': self.dedup_stats(),
+            'error': self.error
+        }
+
+    def dedup_stats(self):
+        """Duplicate chunks skipped and furniture lines stripped, or None without dedup."""
+        if self.dedup is None:
+            return None
+        return dict(self.dedup.stats(), furniture_lines=len(self.furniture),
+                    furniture_removed=self.furniture_removed)
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        chunk_size, chunk_overlap = self.chatbot.chunking()
+        state = {
+            'source': self.pdf_path,
+            'pages_done': self.pages_done,
+            'total_pages': self.total_pages,
+            'complete': self.complete,
+            'chunk_size': chunk_size,
+            'chunk_overlap': chunk_overlap,
+            'dedup': self.dedup_stats(),
+            # So other processes (rag.service workers) can report them too
+            'chunks_indexed': self.chunks_indexed,
+            'elapsed_s': self.progress()['elapsed_s']
+        }
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _report(self):
+        if self.on_progress:
+            try:
+                self.on_progress(self.progress())
+            except Exception as e:
+                print(f"Ingest progress callback failed: {e}")
+
+    def _commit(self, ids, chunks, metadatas, pages, pages_done):
+        if pages:
+            self.chatbot._store_pages(pages)
+        if chunks:
+            embeddings = self.chatbot.embedding_model.encode(
+                chunks, normalize_embeddings=True, convert_to_numpy=True
+            )
+            self.chatbot._add_to_index(ids, embeddings, chunks, metadatas)
+            self.chunks_indexed += len(chunks)
+        if self.dedup is not None:
+            # Kept chunks that turned up again on later pages
+            updated_ids, updated_metadatas = self.dedup.take_updates()
+            if updated_ids:
+                self.chatbot._update_index_metadata(updated_ids, updated_metadatas)
+        self.pages_done = pages_done
+        self._save_state()
+        self._report()
+
+    def _prepare_dedup(self, pdf):
+        """Learn the page furniture from a sample of pages and, when resuming, the chunks indexed so far.
+
+        Returns the sampled page texts by index, so they are not extracted twice.
+        """
+        sampled = {i: pdf.page_text(i) for i in sample_pages(self.total_pages)}
+        self.furniture = learn_furniture([(i + 1, text) for i, text in sampled.items()])
+        if self.furniture:
+            print(f"Stripping {len(self.furniture)} repeated header/footer line(s) from {self.pdf_path}")
+        if self.start_page:
+            indexed = self.chatbot.chroma_store.get()
+            for chunk_id, chunk, metadata in zip(indexed['ids'], indexed['documents'], indexed['metadatas']):
+                self.dedup.add(chunk_id, chunk, metadata)
+        return {i: text for i, text in sampled.items() if i >= self.start_page}
+
+    def run(self):
+        """Ingest the remaining pages in order. Raises on failure."""
+        details = {'source': self.pdf_path, 'start_page': self.start_page}
+        with profile_request('load_and_embed_pdf', enabled=self.profile, details=details):
+            self._ingest()
+
+    def _ingest(self):
+        self.status = 'running'
+        self.started_at = time.time()
+        try:
+            if not os.path.exists(self.pdf_path):
+                raise FileNotFoundError(f"PDF file not found: {self.pdf_path}")
+
+            with self.extractor.open(self.pdf_path) as pdf:
+                self.pages_by_backend = pdf.pages_by_backend
+                self.total_pages = pdf.page_count
+                self._save_state()
+                self._report()
+                self.chatbot._store_sections(pdf.outline(), self.total_pages)
+                sampled = self._prepare_dedup(pdf) if self.dedup is not None else {}
+
+                ids, chunks, metadatas, pages = [], [], [], []
+                for i in range(self.start_page, self.total_pages):
+                    if self._cancel.is_set():
+                        break
+                    text = sampled.pop(i) if i in sampled else pdf.page_text(i)
+                    if self.dedup is not None:
+                        text, removed = strip_furniture(text, self.furniture, i + 1)
+                        self.furniture_removed += removed
+                    if text and text.strip():
+                        pages.append((i + 1, text))
+                    page_ids, page_chunks, page_metadatas = self.chatbot._page_chunks(i + 1, text)
+                    for chunk_id, chunk, metadata in zip(page_ids, page_chunks, page_metadatas):
+                        if self.dedup is None or self.dedup.check(chunk_id, chunk, metadata) is None:
+                            ids.append(chunk_id)
+                            chunks.append(chunk)
+                            metadatas.append(metadata)
+                    if (i + 1 - self.start_page) % self.pages_per_batch == 0:
+                        self._commit(ids, chunks, metadatas, pages, i + 1)
+                        ids, chunks, metadatas, pages = [], [], [], []
+                else:
+                    self._commit(ids, chunks, metadatas, pages, self.total_pages)
+
+            self.status = 'cancelled' if self._cancel.is_set() else 'done'
+            if self.complete:
+                self.chatbot._index_complete()
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+            raise
+        finally:
+            self.finished_at = time.time()
+            self._save_state()
+            self._report()
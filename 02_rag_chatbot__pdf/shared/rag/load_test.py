@@ -0,0 +1,403 @@
+"""Load test: how many concurrent chat sessions one host handles.
+
+Simulated sessions drive the same path as the UIs: a ``SessionManager``
+opens an upload (background ingest, waited for), asks questions through
+``generate_response`` and requests a summary through ``generate_summary``,
+with a random think time between steps. Every session uploads its own copy
+of the PDF, so each one is really ingested. Generation goes to a local stub
+Ollama server that reproduces Ollama's streaming protocol and timing (time
+to first token, growing with the prompt length, then a steady token rate and
+a limited number of parallel slots), so the measurement covers the
+application's own cost and queueing rather than a real model's.
+
+The test runs one stage per concurrency level and reports throughput,
+latency percentiles per operation and the error rate, plus the saturation
+point: the first level where throughput stops growing or the p95 question
+latency exceeds twice its single-session value.
+
+Usage (from the shared/ directory):
+    python -m rag.load_test --pdf ../data/test.pdf --levels 1,2,4,8,16 --duration 60
+    python -m rag.load_test --service-url http://127.0.0.1:8800    (through rag.service)
+    python -m rag.load_test --stub-only --stub-port 11500          (just the stub, e.g. for the UIs)
+"""
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+STUB_MODEL = "stub-llm"
+STUB_CONTEXT_LENGTH = 8192
+DEFAULT_QUESTIONS = [
+    "What is the main purpose of this document?",
+    "Which methods are described?",
+    "What are the key results?",
+    "Who is the intended audience?",
+    "What limitations are mentioned?",
+]
+_STUB_WORDS = ("the document describes a method for processing data and reports results that "
+               "depend on the configuration used in each experiment").split()
+
+# Saturation: throughput gains below this fraction, or p95 above this multiple of the 1-session p95
+SATURATION_MIN_GAIN = 0.10
+SATURATION_LATENCY_FACTOR = 2.0
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    """Minimal Ollama API (``/api/generate``, ``/api/chat``, ``/api/tags``, ``/api/ps``, ``/api/show``)
+    with realistic timing.
+
+    At most ``parallel`` requests generate at once, the rest wait for a slot
+    as with ``OLLAMA_NUM_PARALLEL``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, first_token_ms=150, prompt_ms_per_1k_chars=20, tokens_per_second=40,
+                 response_tokens=120, parallel=4):
+        self.first_token_ms = first_token_ms
+        self.prompt_ms_per_1k_chars = prompt_ms_per_1k_chars
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.slots = threading.Semaphore(parallel)
+        self.parallel = parallel
+        super().__init__(("127.0.0.1", port), _StubHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="stub-ollama", daemon=True).start()
+        return self
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({'models': [{'name': STUB_MODEL, 'model': STUB_MODEL, 'size': 0}]})
+        elif self.path == "/api/ps":
+            self._send_json({'models': []})
+        else:
+            self._send_json({'error': "not found"}, 404)
+
+    def do_POST(self):
+        if self.path not in ("/api/generate", "/api/chat", "/api/show"):
+            self._send_json({'error': "not found"}, 404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/show":
+            self._send_json({'model_info': {'llama.context_length': STUB_CONTEXT_LENGTH}})
+            return
+        prompt = request.get('prompt') or "".join(m.get('content', "") for m in request.get('messages', []))
+        if not prompt:
+            # Preload / unload request
+            self._send_json({'model': request.get('model'), 'response': "", 'done': True, 'load_duration': 0})
+            return
+
+        server = self.server
+        num_predict = (request.get('options') or {}).get('num_predict')
+        tokens = server.response_tokens
+        if num_predict and num_predict > 0:
+            tokens = min(num_predict, tokens)
+        chat = self.path == "/api/chat"
+        started = time.perf_counter()
+        with server.slots:
+            time.sleep((server.first_token_ms + server.prompt_ms_per_1k_chars * len(prompt) / 1000) / 1000)
+            if not request.get('stream', True):
+                time.sleep(tokens / server.tokens_per_second)
+                text = " ".join(_STUB_WORDS[i % len(_STUB_WORDS)] for i in range(tokens))
+                self._send_json(self._chunk(request, text, chat, done=True, started=started, tokens=tokens,
+                                            prompt_tokens=len(prompt) // 4))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i in range(tokens):
+                    word = _STUB_WORDS[i % len(_STUB_WORDS)]
+                    self._write_chunk(self._chunk(request, (" " if i else "") + word, chat))
+                    time.sleep(1 / server.tokens_per_second)
+                self._write_chunk(self._chunk(request, "", chat, done=True, started=started, tokens=tokens,
+                                              prompt_tokens=len(prompt) // 4))
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client cancelled; stop generating like Ollama does
+                self.close_connection = True
+
+    @staticmethod
+    def _chunk(request, text, chat, done=False, started=None, tokens=0, prompt_tokens=0):
+        chunk = {'model': request.get('model'), 'done': done}
+        if chat:
+            chunk['message'] = {'role': 'assistant', 'content': text}
+        else:
+            chunk['response'] = text
+        if done:
+            chunk.update(load_duration=0, eval_count=tokens, prompt_eval_count=prompt_tokens,
+                         total_duration=int((time.perf_counter() - started) * 1e9))
+        return chunk
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class LoadTest:
+    """Run simulated sessions at one concurrency level after another and collect per-operation samples."""
+
+    def __init__(self, manager, pdf_path, questions, questions_per_session=3, think_time=2.0,
+                 model=STUB_MODEL, ingest_timeout=600):
+        self.manager = manager
+        self.pdf_path = pdf_path
+        self.questions = questions
+        self.questions_per_session = questions_per_session
+        self.think_time = think_time
+        self.model = model
+        self.ingest_timeout = ingest_timeout
+        self._lock = threading.Lock()
+        self._samples = []
+        self._session_ids = []
+
+    def _think(self, rng):
+        if self.think_time > 0:
+            time.sleep(rng.expovariate(1 / self.think_time))
+
+    def _record(self, level, op, started, ok, ttft=None, error=None):
+        with self._lock:
+            self._samples.append({'level': level, 'op': op, 'latency_s': time.perf_counter() - started,
+                                  'ttft_s': ttft, 'ok': ok, 'error': error})
+
+    def _timed(self, level, op, call):
+        """Run one chatbot call, recording latency, time to first token and failure."""
+        started = time.perf_counter()
+        first_token = []
+
+        def on_token(piece):
+            if not first_token:
+                first_token.append(time.perf_counter() - started)
+
+        try:
+            result = call(on_token)
+        except Exception as e:
+            self._record(level, op, started, False, error=f"{type(e).__name__}: {e}")
+            return
+        # The chatbots report failures as "Error ..." strings
+        failed = isinstance(result, str) and result.startswith("Error")
+        self._record(level, op, started, not failed, first_token[0] if first_token else None,
+                     result if failed else None)
+
+    def _upload(self, session_id):
+        """The PDF with a per-session comment appended after ``%%EOF``.
+
+        Uploads are keyed by content, so identical copies would only be
+        ingested by the first session and reused by the others.
+        """
+        with open(self.pdf_path, "rb") as f:
+            data = f.read()
+        return io.BytesIO(data + f"\n%load-test {session_id}\n".encode("ascii"))
+
+    def _session(self, level, session_id, deadline, rng):
+        with self._lock:
+            self._session_ids.append(session_id)
+        started = time.perf_counter()
+        try:
+            chatbot, _ = self.manager.open_upload(session_id, self._upload(session_id),
+                                                  os.path.basename(self.pdf_path), self.model)
+            # Wait for the background ingest, as a user waiting for "fully indexed" would
+            wait_until = time.monotonic() + self.ingest_timeout
+            while chatbot.coverage()['partial'] and time.monotonic() < wait_until:
+                time.sleep(0.2)
+            self._record(level, 'upload', started, not chatbot.coverage()['partial'],
+                         error=None if not chatbot.coverage()['partial'] else "ingest timed out")
+        except Exception as e:
+            self._record(level, 'upload', started, False, error=f"{type(e).__name__}: {e}")
+            return
+
+        for _ in range(self.questions_per_session):
+            if time.monotonic() >= deadline:
+                return
+            self._think(rng)
+            question = rng.choice(self.questions)
+            self._timed(level, 'question', lambda on_token: chatbot.generate_response(question, on_token=on_token))
+        if time.monotonic() < deadline:
+            self._think(rng)
+            self._timed(level, 'summary', lambda on_token: chatbot.generate_summary(on_token=on_token))
+
+    def _user(self, level, user, deadline):
+        rng = random.Random(f"{level}-{user}")
+        run = 0
+        while time.monotonic() < deadline:
+            self._session(level, f"load-{level}-{user}-{run}", deadline, rng)
+            run += 1
+
+    def run_level(self, level, duration):
+        """Run ``level`` concurrent users for ``duration`` seconds; returns the stage report."""
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        users = [threading.Thread(target=self._user, args=(level, user, deadline), daemon=True)
+                 for user in range(level)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        wall_s = time.perf_counter() - started
+        # Closed once all have finished, so the stage's sessions count against the memory budget together
+        with self._lock:
+            session_ids, self._session_ids = self._session_ids, []
+        for session_id in session_ids:
+            self.manager.close(session_id)
+        return summarize(level, [s for s in self._samples if s['level'] == level], wall_s)
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3)}
+
+
+def summarize(level, samples, wall_s):
+    """Throughput, percentiles and error rate of one stage."""
+    report = {'sessions': level, 'wall_s': round(wall_s, 1), 'ops': {}}
+    for op in ('upload', 'question', 'summary'):
+        op_samples = [s for s in samples if s['op'] == op]
+        ok = [s for s in op_samples if s['ok']]
+        report['ops'][op] = dict(
+            count=len(op_samples),
+            errors=len(op_samples) - len(ok),
+            per_s=round(len(ok) / wall_s, 3) if wall_s else 0.0,
+            latency_s=percentiles([s['latency_s'] for s in ok]),
+            ttft_s=percentiles([s['ttft_s'] for s in ok if s['ttft_s'] is not None])
+        )
+    report['error_rate'] = round(sum(1 for s in samples if not s['ok']) / len(samples), 4) if samples else 0.0
+    report['errors'] = sorted({s['error'] for s in samples if s['error']})[:5]
+    return report
+
+
+def saturation_point(reports):
+    """First concurrency level where question throughput stops growing or p95 latency doubles."""
+    baseline = reports[0]['ops']['question']['latency_s']['p95'] if reports else None
+    for previous, report in zip(reports, reports[1:]):
+        before = previous['ops']['question']['per_s']
+        after = report['ops']['question']['per_s']
+        p95 = report['ops']['question']['latency_s']['p95']
+        if before and after < before * (1 + SATURATION_MIN_GAIN):
+            return report['sessions'], f"question throughput grew only {after / before - 1:.0%}"
+        if baseline and p95 and p95 > baseline * SATURATION_LATENCY_FACTOR:
+            return report['sessions'], f"p95 question latency {p95:.2f}s vs {baseline:.2f}s with one session"
+    return None, "not reached at the tested levels"
+
+
+def print_report(report):
+    print(f"\n== {report['sessions']} concurrent session(s), {report['wall_s']}s, "
+          f"error rate {report['error_rate']:.1%}")
+    for op, stats in report['ops'].items():
+        if not stats['count']:
+            continue
+        latency, ttft = stats['latency_s'], stats['ttft_s']
+        line = (f"  {op:<9} {stats['count']:>5} done, {stats['errors']} errors, {stats['per_s']:.2f}/s  "
+                f"latency p50 {latency['p50']}s p95 {latency['p95']}s p99 {latency['p99']}s")
+        if ttft['p50'] is not None:
+            line += f"  first token p50 {ttft['p50']}s p95 {ttft['p95']}s"
+        print(line)
+    for error in report['errors']:
+        print(f"  error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the PDF chatbot against a stub Ollama server")
+    parser.add_argument("--pdf", default="../data/test.pdf")
+    parser.add_argument("--levels", default="1,2,4,8", help="Comma-separated numbers of concurrent sessions")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per level")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean seconds between a session's steps")
+    parser.add_argument("--questions-per-session", type=int, default=3)
+    parser.add_argument("--questions", help="Text file with one question per line")
+    parser.add_argument("--service-url", help="Drive a running rag.service instead of in-process chatbots")
+    parser.add_argument("--ollama-url", help="Use this Ollama server instead of the stub")
+    parser.add_argument("--model", default=STUB_MODEL)
+    parser.add_argument("--output", help="Write the stage reports as JSON")
+    stub = parser.add_argument_group("stub Ollama server")
+    stub.add_argument("--stub-only", action="store_true", help="Only run the stub server until interrupted")
+    stub.add_argument("--stub-port", type=int, default=0)
+    stub.add_argument("--first-token-ms", type=float, default=150)
+    stub.add_argument("--prompt-ms-per-1k-chars", type=float, default=20)
+    stub.add_argument("--tokens-per-second", type=float, default=40)
+    stub.add_argument("--response-tokens", type=int, default=120)
+    stub.add_argument("--parallel", type=int, default=4, help="Requests the stub generates at once")
+    args = parser.parse_args()
+
+    server = None
+    if not args.ollama_url:
+        server = StubOllamaServer(args.stub_port, args.first_token_ms, args.prompt_ms_per_1k_chars,
+                                  args.tokens_per_second, args.response_tokens, args.parallel).start()
+        print(f"Stub Ollama server on {server.url} ({args.parallel} parallel, "
+              f"{args.tokens_per_second} tokens/s, {args.first_token_ms} ms to first token)")
+        if args.stub_only:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return
+    # Read by llm.generation and llm.models for every request
+    os.environ["OLLAMA_HOST"] = args.ollama_url or server.url
+
+    from rag.session_manager import SessionManager
+
+    factory = None
+    if args.service_url:
+        from rag.client import RemoteRAGChatbot
+        os.environ["RAG_SERVICE_URL"] = args.service_url
+        factory = RemoteRAGChatbot
+        if server is not None:
+            print("Note: the service generates through its own OLLAMA_HOST; point it at the stub URL above")
+    manager = SessionManager(background_ingest=True, chatbot_factory=factory)
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    test = LoadTest(manager, os.path.abspath(args.pdf), questions, args.questions_per_session,
+                    args.think_time, args.model)
+    reports = []
+    try:
+        for level in [int(level) for level in args.levels.split(",")]:
+            print(f"\nRunning {level} concurrent session(s) for {args.duration:.0f}s...")
+            reports.append(test.run_level(level, args.duration))
+            print_report(reports[-1])
+    except KeyboardInterrupt:
+        print("Interrupted; reporting the finished levels")
+
+    level, reason = saturation_point(reports)
+    print(f"\nSaturation point: {level if level else '-'} concurrent sessions ({reason})")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'levels': reports, 'saturation': {'sessions': level, 'reason': reason}}, f, indent=2)
+        print(f"Report written to {args.output}")
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
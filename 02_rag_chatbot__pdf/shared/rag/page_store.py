@@ -0,0 +1,156 @@
+"""Ordered, page-indexed text store kept alongside the vector index.
+
+The vector index holds overlapping chunks in no useful order, so reading a
+whole document (or pages 40-60 of it) from Chroma means fetching every chunk
+and sorting in Python. The ingest job also writes each page's text here, in
+a SQLite table keyed by collection and page number, so page ranges are read
+in order with one range scan of the primary key. The PDF's outline is
+stored as sections with their page ranges, so a section can be read by
+title.
+"""
+import os
+import sqlite3
+import threading
+
+PAGE_STORE_FILE = "page_store.db"
+
+
+def section_ranges(outline, page_count):
+    """Turn ``[(level, title, start_page)]`` outline entries into sections with an ``end_page``.
+
+    A section runs until the page before the next entry at the same or a
+    higher level (but at least its start page), or to the end of the document.
+    """
+    sections = []
+    for i, (level, title, start_page) in enumerate(outline):
+        end_page = page_count
+        for next_level, _, next_start in outline[i + 1:]:
+            if next_level <= level:
+                end_page = max(start_page, next_start - 1)
+                break
+        sections.append({'level': level, 'title': title, 'start_page': start_page, 'end_page': end_page})
+    return sections
+
+
+class PageStore:
+    def __init__(self, db_path):
+        """Open (or create) the page database at ``db_path``."""
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        # Autocommit mode; batches of pages are written in explicit transactions
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    collection TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (collection, page)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sections (
+                    collection TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    level INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    start_page INTEGER NOT NULL,
+                    end_page INTEGER NOT NULL,
+                    PRIMARY KEY (collection, position)
+                ) WITHOUT ROWID
+            """)
+
+    def put_pages(self, collection, pages):
+        """Store ``[(page_number, text)]``, replacing pages stored before."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO pages (collection, page, text) VALUES (?, ?, ?)",
+                    [(collection, page, text) for page, text in pages]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def set_sections(self, collection, outline, page_count):
+        """Replace the collection's sections with those of ``[(level, title, start_page)]``."""
+        sections = section_ranges(outline, page_count)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM sections WHERE collection = ?", (collection,))
+                self._conn.executemany(
+                    "INSERT INTO sections (collection, position, level, title, start_page, end_page) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(collection, i, s['level'], s['title'], s['start_page'], s['end_page'])
+                     for i, s in enumerate(sections)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def read(self, collection, first_page=None, last_page=None):
+        """``[(page_number, text)]`` of the stored pages in the range (inclusive), in page order."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT page, text FROM pages WHERE collection = ? AND page BETWEEN ? AND ? ORDER BY page",
+                (collection, first_page or 1, last_page if last_page is not None else 2 ** 62)
+            ).fetchall()
+
+    def has_pages(self, collection):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM pages WHERE collection = ? LIMIT 1", (collection,)).fetchone()
+        return row is not None
+
+    def sections(self, collection):
+        """The collection's sections in outline order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT level, title, start_page, end_page FROM sections WHERE collection = ? ORDER BY position",
+                (collection,)
+            ).fetchall()
+        return [{'level': level, 'title': title, 'start_page': start, 'end_page': end}
+                for level, title, start, end in rows]
+
+    def find_section(self, collection, title):
+        """The section whose title matches ``title`` (case-insensitively), else the first containing it."""
+        wanted = title.strip().lower()
+        sections = self.sections(collection)
+        for section in sections:
+            if section['title'].strip().lower() == wanted:
+                return section
+        return next((section for section in sections if wanted in section['title'].lower()), None)
+
+    def delete(self, collection):
+        """Drop the collection's pages and sections."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM sections WHERE collection = ?", (collection,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_page_store(db_dir):
+    """Return the process-wide PageStore kept in the Chroma directory ``db_dir``."""
+    with _stores_lock:
+        if db_dir not in _stores:
+            _stores[db_dir] = PageStore(os.path.join(db_dir, PAGE_STORE_FILE))
+        return _stores[db_dir]
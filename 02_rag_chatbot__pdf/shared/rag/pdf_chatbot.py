@@ -1,34 +1,297 @@
-import pdfplumber
 from sentence_transformers import SentenceTransformer
 import chromadb
-import ollama
+import json
+import numpy as np
 import os
+import sys
+import threading
+import time
 import torch
 
+# Workspace-level shared modules (generation handles, model manager)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'shared'))
+from llm import generation
+from llm.models import get_model_manager
+
+# Sibling modules (vector store backends)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from rag.vector_store import (
+    DEFAULT_INDEX_CONFIG, BRUTE_FORCE_MAX_VECTORS, ChromaVectorStore, index_metadata, select_vector_store
+)
+from rag.dedup import chunk_pages, page_label
+from rag.embedding_storage import QuantizedVectorStore
+from rag.ingestion import IngestionJob, read_ingest_state
+from rag.pdf_extract import TextExtractor
+from rag.embedding_server import EmbeddingClient, MicroBatcher
+from rag.extractive import EXTRACTIVE_MIN_MARGIN, EXTRACTIVE_MIN_SCORE, best_sentence, is_decisive, retrieval_margin
+from rag.profiling import profiled, profiling_enabled
+from rag.request_sizing import CHUNK_PROMPT_OVERHEAD_TOKENS, get_request_sizer
+from rag.page_store import get_page_store
+
+CHROMA_DB_PATH = "../data/chroma_db_pdf"
+
+# Memory-mapped float16/int8 embedding files (shared by worker processes)
+EMBEDDING_STORAGE_DIR = "../data/embeddings"
+
+# Text chunking defaults
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+
+# Retrieval settings; rag.autotune stores tuned values per collection
+DEFAULT_RETRIEVAL_CONFIG = {
+    'chunk_size': CHUNK_SIZE,
+    'chunk_overlap': CHUNK_OVERLAP,
+    'n_results': 5,            # Chunks retrieved for a question
+    'summary_n_results': 10    # Chunks retrieved for summary-style questions
+}
+
+
+# One embedding model and one Chroma client per process, shared by every chatbot
+_shared_lock = threading.Lock()
+_embedding_model = None
+_chroma_clients = {}
+
+
+def get_embedding_model():
+    """Return the process-wide sentence encoder.
+
+    Concurrent ``encode`` calls from all chatbots are micro-batched (see
+    rag.embedding_server). With ``RAG_EMBEDDING_SOCKET`` set they are sent to
+    a shared embedding server instead of a model loaded in this process.
+    """
+    global _embedding_model
+    with _shared_lock:
+        if _embedding_model is None:
+            socket_path = os.environ.get("RAG_EMBEDDING_SOCKET")
+            if socket_path:
+                _embedding_model = EmbeddingClient(socket_path)
+            else:
+                _embedding_model = MicroBatcher(SentenceTransformer('all-MiniLM-L6-v2', device='cpu'))
+        return _embedding_model
+
+
+def embedding_stats():
+    """Batch-size and queue-delay histograms of the encoder, or None before it is loaded."""
+    return _embedding_model.stats() if _embedding_model is not None else None
+
+
+def get_chroma_client(path=CHROMA_DB_PATH):
+    """Open one persistent Chroma client per database path."""
+    with _shared_lock:
+        if path not in _chroma_clients:
+            _chroma_clients[path] = chromadb.PersistentClient(path=path)
+        return _chroma_clients[path]
+
+
+def split_into_chunks(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split text into fixed-size character windows that overlap by ``overlap``."""
+    step = max(chunk_size - overlap, 1)
+    return [text[k:k + chunk_size] for k in range(0, len(text), step)]
+
+
+def retrieval_config_path(collection_name, db_path=CHROMA_DB_PATH):
+    return os.path.join(db_path, f"{collection_name}_retrieval.json")
+
+
+def ingest_state_path(collection_name, db_path=CHROMA_DB_PATH):
+    return os.path.join(db_path, f"{collection_name}_ingest.json")
+
+
+def delete_collection_data(collection_name, db_path=CHROMA_DB_PATH, storage_dir=EMBEDDING_STORAGE_DIR):
+    """Delete a collection and everything kept beside it.
+
+    That is its page store rows, ingest state, tuned retrieval settings and
+    quantized embedding files.
+    """
+    try:
+        get_chroma_client(db_path).delete_collection(name=collection_name)
+    except Exception as e:
+        print(f"Could not delete collection {collection_name}: {e}")
+    get_page_store(db_path).delete(collection_name)
+    storage_path = os.path.join(storage_dir, collection_name)
+    for path in (ingest_state_path(collection_name, db_path), retrieval_config_path(collection_name, db_path),
+                 storage_path + '.vec', storage_path + '.scale', storage_path + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_retrieval_config(collection_name, source=None, db_path=CHROMA_DB_PATH):
+    """Retrieval settings stored for a collection (see rag.autotune) over the defaults.
+
+    Settings tuned for another document than ``source`` are ignored.
+    """
+    config = dict(DEFAULT_RETRIEVAL_CONFIG)
+    try:
+        with open(retrieval_config_path(collection_name, db_path), encoding='utf-8') as f:
+            stored = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return config
+    if source is not None and stored.get('source') not in (None, source):
+        print(f"Ignoring retrieval settings tuned for {stored['source']}")
+        return config
+    config.update({key: stored[key] for key in DEFAULT_RETRIEVAL_CONFIG if key in stored})
+    return config
+
+
+def page_chunks(source, page_number, text, id_prefix="pdf", chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split one page's text into chunk ids, texts and metadata."""
+    ids, chunks, metadatas = [], [], []
+    if text:
+        # Split text into smaller chunks for better embedding
+        for j, chunk in enumerate(split_into_chunks(text, chunk_size, overlap)):
+            if chunk.strip():  # Only add non-empty chunks
+                chunks.append(chunk.strip())
+                metadatas.append({
+                    "page": page_number,
+                    "chunk": j+1,
+                    "source": source
+                })
+                ids.append(f"{id_prefix}_{page_number}_{j+1}")
+    return ids, chunks, metadatas
+
+
 class PDFRAGChatbot:
-    def __init__(self, pdf_file_path="test.pdf", model_name="llama3.2"):
+    def __init__(self, pdf_file_path="test.pdf", model_name="llama3.2", index_config=None,
+                 vector_backend='auto', embedding_dtype='float32', background_ingest=False,
+                 pdf_backend='auto', collection_name="pdf_knowledge_base",
+                 extractive_mode=False, extractive_min_score=EXTRACTIVE_MIN_SCORE,
+                 extractive_min_margin=EXTRACTIVE_MIN_MARGIN, profile=None, retrieval_config=None, dedup=True):
         self.pdf_file_path = pdf_file_path
         self.model_name = model_name
+        self.index_config = dict(DEFAULT_INDEX_CONFIG, **(index_config or {}))
+        self.vector_backend = vector_backend
+        self.embedding_dtype = embedding_dtype
+        self.background_ingest = background_ingest
+        self.ingestion_job = None
+        # Fastest installed PDF text backend, with pdfplumber for pages it handles poorly
+        self.text_extractor = TextExtractor(pdf_backend)
+        self._index_lock = threading.RLock()
+        # Answer lookup questions straight from the best chunk when retrieval is decisive
+        self.extractive_mode = extractive_mode
+        self.extractive_min_score = extractive_min_score
+        self.extractive_min_margin = extractive_min_margin
+        # Save per-call cProfile/tracemalloc files (defaults to the RAG_PROFILE variable)
+        self.profile = profiling_enabled(profile)
+        # Strip repeated page headers/footers and embed duplicate chunks once (see rag.dedup)
+        self.dedup = dedup
+        self.vector_store = None
 
         # Force CPU usage to avoid CUDA compatibility issues
         os.environ['CUDA_VISIBLE_DEVICES'] = ''
         torch.cuda.is_available = lambda: False
 
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+        self.embedding_model = get_embedding_model()
         # Updated path for new directory structure
-        self.client = chromadb.PersistentClient(path="../data/chroma_db_pdf")
-        self.collection_name = "pdf_knowledge_base"
+        self.client = get_chroma_client(CHROMA_DB_PATH)
+        # Page texts in page order, for summaries and page-range reads
+        self.page_store = get_page_store(CHROMA_DB_PATH)
+        self.collection_name = collection_name
+        self.ingest_state_path = ingest_state_path(self.collection_name)
+        # Tuned settings stored with the collection, overridden by explicit ones
+        self.retrieval_config = dict(read_retrieval_config(collection_name, pdf_file_path),
+                                     **(retrieval_config or {}))
+        self.active_generation = None
 
         # Check if we need to reload the PDF (different file or collection doesn't exist)
         self._check_and_load_pdf()
+        if self.vector_store is None:
+            self._select_vector_store()
+
+    def _create_collection(self):
+        """Create the collection with the configured index settings stored as its metadata."""
+        # Pages stored for an earlier build of the collection
+        self.page_store.delete(self.collection_name)
+        return self.client.create_collection(
+            name=self.collection_name,
+            metadata=index_metadata(self.index_config)
+        )
+
+    def _select_vector_store(self):
+        """Choose the query backend for the current collection (see rag.vector_store)."""
+        self.chroma_store = ChromaVectorStore(self.collection, self.index_config['space'])
+        self.vector_store = select_vector_store(
+            self.chroma_store, self.vector_backend,
+            embedding_dtype=self.embedding_dtype,
+            storage_path=os.path.join(EMBEDDING_STORAGE_DIR, self.collection_name)
+        )
+        print(f"Vector backend: {self.vector_store.name} ({self.vector_store.count()} vectors)")
+
+    def _add_to_index(self, ids, embeddings, documents, metadatas):
+        """Persist vectors in Chroma and keep the in-memory backend in sync."""
+        with self._index_lock:
+            self.chroma_store.add(ids, embeddings, documents, metadatas)
+            if self.vector_store is not self.chroma_store:
+                self.vector_store.add(ids, embeddings, documents, metadatas)
+                # Switch to the HNSW index once the collection outgrows brute force
+                if self.vector_backend == 'auto' and self.vector_store.count() > BRUTE_FORCE_MAX_VECTORS:
+                    self.vector_store = self.chroma_store
+
+    def _store_pages(self, pages):
+        self.page_store.put_pages(self.collection_name, pages)
+
+    def _store_sections(self, outline, page_count):
+        self.page_store.set_sections(self.collection_name, outline, page_count)
+
+    def _index_complete(self):
+        """Called by the ingest job once the whole PDF is indexed: measure a quantized mirror's recall."""
+        store = self.vector_store
+        if isinstance(store, QuantizedVectorStore):
+            try:
+                store.check_recall(self.chroma_store)
+            except Exception as e:
+                print(f"Error measuring embedding recall: {e}")
+
+    def _update_index_metadata(self, ids, metadatas):
+        """Replace the metadata of indexed chunks in Chroma and the in-memory backend."""
+        with self._index_lock:
+            self.chroma_store.update_metadatas(ids, metadatas)
+            if self.vector_store is not self.chroma_store:
+                self.vector_store.update_metadatas(ids, metadatas)
+
+    def memory_usage(self):
+        """Approximate bytes this document's in-memory working set holds."""
+        store = self.vector_store
+        return store.memory_bytes() if store is not None else 0
+
+    def is_busy(self):
+        """True while an ingest or a generation is running."""
+        job = self.ingestion_job
+        return (job is not None and job.running) or self.active_generation is not None
+
+    def release_memory(self):
+        """Drop the in-memory vector mirror; queries fall back to the persistent Chroma index."""
+        with self._index_lock:
+            if self.vector_store is not None and self.vector_store is not getattr(self, 'chroma_store', None):
+                self.vector_store = self.chroma_store
+
+    def get_index_config(self):
+        """Return the index settings stored with the current collection."""
+        metadata = self.collection.metadata or {}
+        return {
+            'space': metadata.get('hnsw:space', 'l2'),
+            'construction_ef': metadata.get('hnsw:construction_ef'),
+            'search_ef': metadata.get('hnsw:search_ef'),
+            'M': metadata.get('hnsw:M')
+        }
 
     def _check_and_load_pdf(self):
         """Check if we need to reload the PDF based on file changes."""
+        if self.pdf_file_path is None:
+            # Query an existing multi-document collection (e.g. built by rag.bulk_ingest) as is
+            self.collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata=index_metadata(self.index_config)
+            )
+            return
         try:
             self.collection = self.client.get_collection(name=self.collection_name)
 
+            # Index settings can only be applied when the collection is built
+            if self.get_index_config() != self.index_config:
+                print(f"Index settings changed to {self.index_config}. Rebuilding collection.")
+                self._clear_and_reload()
             # Check if the collection has any data and if it's from the same file
-            if self.collection.count() > 0:
+            elif self.collection.count() > 0:
                 # Get metadata from existing collection to check source file
                 existing_data = self.collection.get(limit=1)
                 if existing_data['metadatas'] and len(existing_data['metadatas']) > 0:
@@ -38,29 +301,44 @@ class PDFRAGChatbot:
                     if existing_source != self.pdf_file_path or not os.path.exists(self.pdf_file_path):
                         print(f"Different PDF detected. Clearing database and loading new file: {self.pdf_file_path}")
                         self._clear_and_reload()
+                    elif self._chunking_changed(read_ingest_state(self.ingest_state_path)):
+                        print(f"Chunking changed to {self.chunking()}. Rebuilding collection.")
+                        self._clear_and_reload()
                     else:
                         print(f"Using existing embeddings for: {self.pdf_file_path}")
+                        # Resume an ingest that was interrupted part-way through
+                        state = read_ingest_state(self.ingest_state_path)
+                        if state and state.get('source') == self.pdf_file_path and not state.get('complete'):
+                            print(f"Resuming ingest from page {state['pages_done'] + 1}")
+                            self._select_vector_store()
+                            self.load_and_embed_pdf(start_page=state['pages_done'])
                 else:
                     # No metadata found, reload
                     self._clear_and_reload()
             else:
                 # Empty collection, load PDF if it exists
+                self._select_vector_store()
                 if os.path.exists(self.pdf_file_path):
                     self.load_and_embed_pdf()
 
         except Exception:
             # Collection doesn't exist, create it
-            self.collection = self.client.create_collection(name=self.collection_name)
+            self.collection = self._create_collection()
+            self._select_vector_store()
             if os.path.exists(self.pdf_file_path):
                 self.load_and_embed_pdf()
 
     def _clear_and_reload(self):
         """Clear the existing collection and reload with new PDF."""
         try:
+            # Stop a running ingest before its collection is deleted
+            if self.ingestion_job is not None and self.ingestion_job.running:
+                self.ingestion_job.cancel()
             # Delete existing collection
             self.client.delete_collection(name=self.collection_name)
             # Create new collection
-            self.collection = self.client.create_collection(name=self.collection_name)
+            self.collection = self._create_collection()
+            self._select_vector_store()
             # Load new PDF
             if os.path.exists(self.pdf_file_path):
                 self.load_and_embed_pdf()
@@ -72,50 +350,86 @@ class PDFRAGChatbot:
         if new_pdf_path:
             self.pdf_file_path = new_pdf_path
 
+        if self.pdf_file_path is None:
+            return "No PDF file to reload (collection is managed by rag.bulk_ingest)"
+
         print(f"Force reloading PDF: {self.pdf_file_path}")
         self._clear_and_reload()
         return f"Successfully reloaded PDF: {self.pdf_file_path}"
 
-    def load_and_embed_pdf(self):
+    def chunking(self):
+        """``(chunk_size, chunk_overlap)`` used when indexing."""
+        return self.retrieval_config['chunk_size'], self.retrieval_config['chunk_overlap']
+
+    def _chunking_changed(self, state):
+        """True if the collection was indexed with other chunk settings than the current ones."""
+        if not state:
+            return False
+        return (state.get('chunk_size', CHUNK_SIZE), state.get('chunk_overlap', CHUNK_OVERLAP)) != self.chunking()
+
+    def _page_chunks(self, page_number, text):
+        """Split one page's text into chunk ids, texts and metadata."""
+        chunk_size, overlap = self.chunking()
+        return page_chunks(self.pdf_file_path, page_number, text, chunk_size=chunk_size, overlap=overlap)
+
+    def load_and_embed_pdf(self, background=None, start_page=0, on_progress=None):
+        """Index the PDF page by page, committing pages in order as they are embedded.
+
+        With ``background`` (defaults to the ``background_ingest`` setting) the
+        job runs in a thread and is returned at once; searches meanwhile use
+        the pages indexed so far. Otherwise this blocks until the PDF is indexed.
+        """
+        if background is None:
+            background = self.background_ingest
+        job = IngestionJob(self, self.pdf_file_path, state_path=self.ingest_state_path,
+                           start_page=start_page, on_progress=on_progress, extractor=self.text_extractor,
+                           profile=self.profile, dedup=self.dedup)
+        self.ingestion_job = job
+        if background:
+            return job.start()
+
         try:
-            if not os.path.exists(self.pdf_file_path):
-                raise FileNotFoundError(f"PDF file not found: {self.pdf_file_path}")
-
-            with pdfplumber.open(self.pdf_file_path) as pdf:
-                text_chunks = []
-                metadatas = []
-                ids = []
-                for i, page in enumerate(pdf.pages):
-                    text = page.extract_text()
-                    if text:
-                        # Split text into smaller chunks for better embedding
-                        for j, chunk in enumerate([text[k:k+500] for k in range(0, len(text), 400)]):
-                            if chunk.strip():  # Only add non-empty chunks
-                                text_chunks.append(chunk.strip())
-                                metadatas.append({
-                                    "page": i+1,
-                                    "chunk": j+1,
-                                    "source": self.pdf_file_path
-                                })
-                                ids.append(f"pdf_{i+1}_{j+1}")
-
-                if text_chunks:
-                    embeddings = self.embedding_model.encode(text_chunks).tolist()
-                    self.collection.add(
-                        embeddings=embeddings,
-                        documents=text_chunks,
-                        metadatas=metadatas,
-                        ids=ids
-                    )
-                    print(f"Loaded {len(text_chunks)} PDF chunks into vector database")
-                else:
-                    print("No text content found in PDF")
+            job.run()
         except Exception as e:
             print(f"Error loading PDF: {e}")
             raise
+        if job.chunks_indexed:
+            print(f"Loaded {job.chunks_indexed} PDF chunks into vector database "
+                  f"(pages by extractor: {dict(job.pages_by_backend)})")
+            stats = job.dedup_stats()
+            if stats and (stats['duplicates'] or stats['furniture_removed']):
+                print(f"Skipped {stats['duplicates']} duplicate chunk(s) ({stats['embeddings_avoided']:.0%} of "
+                      f"embeddings) and {stats['furniture_removed']} repeated header/footer line(s)")
+        else:
+            print("No text content found in PDF")
+        return job
+
+    def ingestion_progress(self):
+        """Progress of the current or last ingest job, or None if nothing was ingested."""
+        return self.ingestion_job.progress() if self.ingestion_job else None
+
+    def coverage(self):
+        """How much of the document answers can draw on.
+
+        ``partial`` is True while an ingest is still running (or stopped early),
+        in which case answers only reflect the first ``pages_indexed`` pages.
+        """
+        job = self.ingestion_job
+        if job is None or job.complete:
+            return {'partial': False, 'pages_indexed': job.pages_done if job else None,
+                    'total_pages': job.total_pages if job else None}
+        return {'partial': True, 'pages_indexed': job.pages_done, 'total_pages': job.total_pages}
+
+    def chunk_count(self):
+        """Number of chunks stored in the collection."""
+        return self.collection.count()
 
     def get_all_content(self):
-        """Get all PDF content for comprehensive analysis."""
+        """Get every chunk of the collection, sorted by page and chunk.
+
+        This scans the whole collection; page-ordered reads go through
+        ``read_pages`` instead.
+        """
         try:
             if self.collection.count() == 0:
                 return []
@@ -140,60 +454,188 @@ class PDFRAGChatbot:
             print(f"Error getting all content: {e}")
             return []
 
-    def search_context(self, query, n_results=5):  # Increased default results
+    def read_pages(self, first_page=None, last_page=None):
+        """``[(page_number, text)]`` of a page range (inclusive, default all) in page order."""
+        if self.pdf_file_path is None:
+            # A multi-document collection has no page store; rebuild pages from its chunks
+            return self._pages_from_chunks(first_page, last_page)
+        if not self.page_store.has_pages(self.collection_name) and self.collection.count() > 0:
+            # Indexed before the page store existed: fill it once from the chunks
+            self.page_store.put_pages(self.collection_name, self._pages_from_chunks())
+        return self.page_store.read(self.collection_name, first_page, last_page)
+
+    def _pages_from_chunks(self, first_page=None, last_page=None):
+        pages = {}
+        for doc in self.get_all_content():
+            # A deduplicated chunk belongs to every page it was found on
+            for page in chunk_pages(doc['metadata']):
+                if (first_page is None or page >= first_page) and (last_page is None or page <= last_page):
+                    pages.setdefault(page, []).append(doc['content'])
+        return [(page, " ".join(chunks)) for page, chunks in sorted(pages.items())]
+
+    def sections(self):
+        """Sections of the PDF's outline with their page ranges (empty if it has no bookmarks)."""
+        return self.page_store.sections(self.collection_name)
+
+    def _resolve_range(self, first_page=None, last_page=None, section=None):
+        """``(first_page, last_page, description)`` of a page range or of the outline section titled ``section``."""
+        if section:
+            match = self.page_store.find_section(self.collection_name, section)
+            if match is None:
+                raise ValueError(f"No section titled '{section}' in the PDF outline")
+            first_page, last_page = match['start_page'], match['end_page']
+            return first_page, last_page, f"section \"{match['title']}\" (pages {first_page}-{last_page})"
+        if first_page and last_page and first_page > last_page:
+            raise ValueError(f"First page {first_page} is after last page {last_page}")
+        if first_page and first_page == last_page:
+            return first_page, last_page, f"page {first_page}"
+        return first_page, last_page, f"pages {first_page or 1}-{last_page or 'end'}"
+
+    def _encode_query(self, query):
+        return self.embedding_model.encode([query], normalize_embeddings=True, convert_to_numpy=True)
+
+    @profiled('search_context')
+    def search_context(self, query, n_results=None, query_embedding=None):
+        """Retrieve the chunks closest to ``query``.
+
+        ``n_results`` defaults to the collection's retrieval config, which
+        also sets the larger number used for summary-style questions.
+        """
         try:
             if self.collection.count() == 0:
                 return []
 
             # For summarization queries, get more comprehensive results
             if any(word in query.lower() for word in ['summarize', 'summary', 'overview', 'main topic', 'about']):
-                n_results = min(10, self.collection.count())  # Get up to 10 chunks for summaries
-
-            query_embedding = self.embedding_model.encode([query]).tolist()
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=n_results
-            )
-            context_docs = []
-            for i in range(len(results['documents'][0])):
-                doc = results['documents'][0][i]
-                metadata = results['metadatas'][0][i]
-                distance = results['distances'][0][i]
-                context_docs.append({
-                    'content': doc,
-                    'metadata': metadata,
-                    'relevance_score': 1 - distance
-                })
+                n_results = min(self.retrieval_config['summary_n_results'], self.collection.count())
+            elif n_results is None:
+                n_results = self.retrieval_config['n_results']
+
+            if query_embedding is None:
+                query_embedding = self._encode_query(query)
+            with self._index_lock:
+                context_docs = self.vector_store.query(query_embedding, n_results=n_results)[0]
             return context_docs
         except Exception as e:
             print(f"Error searching context: {e}")
             return []
 
-    def generate_summary(self, temperature=0.2, top_p=0.9, top_k=40):
+    def _generate(self, prompt, options, on_token=None, model=None, sizing=None):
+        """Stream a completion through a cancellable handle.
+
+        ``on_token`` is called with every text piece as it arrives. Returns the
+        generated text and whether it was cancelled. If the caller is
+        interrupted (e.g. a Streamlit rerun raised from ``on_token``) the
+        request is aborted before the exception propagates. ``model``
+        overrides ``model_name`` for this request only. ``sizing`` is a
+        ``RequestSizer.plan`` whose ``num_ctx`` and ``num_predict`` are sent.
+        """
+        model = model or self.model_name
+        model_manager = get_model_manager()
+        model_manager.record_use(model)
+        if sizing:
+            options = dict(options, num_ctx=sizing['num_ctx'], num_predict=sizing['num_predict'])
+        handle = generation.generate(model, prompt, options,
+                                     keep_alive=model_manager.keep_alive_for(model))
+        self.active_generation = handle
+        try:
+            for piece in handle.iter_text():
+                if on_token:
+                    on_token(piece)
+        except BaseException:
+            handle.cancel()
+            raise
+        finally:
+            if self.active_generation is handle:
+                self.active_generation = None
+        model_manager.record_load(model, handle.final_chunk.get('load_duration'))
+        if sizing:
+            get_request_sizer().record(model, sizing, handle.final_chunk.get('prompt_eval_count'))
+        return handle.text, handle.cancelled
+
+    def cancel_generation(self):
+        """Abort the running generation, if any. Returns its partial text."""
+        handle = self.active_generation
+        if handle is None:
+            return None
+        handle.cancel()
+        return handle.text
+
+    @profiled('generate_summary')
+    def generate_summary(self, temperature=0.2, top_p=0.9, top_k=40, on_token=None, model=None):
         """Generate a comprehensive summary of the entire PDF."""
         try:
-            # Get all content for comprehensive summary
-            all_docs = self.get_all_content()
-            if not all_docs:
+            # Get all content for comprehensive summary, in page order
+            pages = self.read_pages()
+            if not pages:
                 return "No content available to summarize."
 
-            # Combine content from all pages
-            full_content = ""
-            page_contents = {}
+            result = self._summarize(pages, "PDF document", temperature, top_p, top_k, on_token, model)
+            return dict(result, content_analyzed=self.chunk_count(), type='comprehensive_summary')
 
-            for doc in all_docs:
-                page_num = doc['metadata']['page']
-                if page_num not in page_contents:
-                    page_contents[page_num] = []
-                page_contents[page_num].append(doc['content'])
+        except Exception as e:
+            return f"Error generating summary: {e}"
+
+    @profiled('summarize_pages')
+    def summarize_pages(self, first_page=None, last_page=None, section=None, temperature=0.2, top_p=0.9, top_k=40,
+                        on_token=None, model=None):
+        """Summarize a page range (inclusive) or the section of the PDF's outline titled ``section``."""
+        try:
+            first_page, last_page, scope = self._resolve_range(first_page, last_page, section)
+            pages = self.read_pages(first_page, last_page)
+            if not pages:
+                return f"No content available for {scope}."
 
-            # Create structured content by page
-            for page_num in sorted(page_contents.keys()):
-                page_text = " ".join(page_contents[page_num])
-                full_content += f"\nPage {page_num}: {page_text}\n"
+            result = self._summarize(pages, f"{scope} of a PDF document", temperature, top_p, top_k, on_token, model)
+            return dict(result, type='page_range_summary', first_page=first_page, last_page=last_page)
 
-            # Create comprehensive summary prompt
-            prompt = f"""Please provide a comprehensive summary of the following PDF document. 
+        except Exception as e:
+            return f"Error generating summary: {e}"
+
+    def _summarize(self, pages, scope, temperature, top_p, top_k, on_token, model):
+        """Summarize ``[(page_number, text)]``, shortening every page alike if they do not fit the model."""
+        # Create structured content by page
+        full_content = ""
+        for page_num, page_text in pages:
+            full_content += f"\nPage {page_num}: {page_text}\n"
+
+        model = model or self.model_name
+        prompt = self._summary_prompt(full_content, scope)
+        sizer = get_request_sizer()
+        sizing = sizer.plan(model, prompt, 'summary')
+        truncated = not sizing['fits']
+        if truncated:
+            # Shorten every page alike so the whole range stays represented
+            needed, budget, keep = sizing['prompt_tokens'], sizer.prompt_budget(model, 'summary'), 1.0
+            while not sizing['fits'] and keep > 0.01:
+                keep *= 0.95 * budget / sizing['prompt_tokens']
+                full_content = ""
+                for page_num, page_text in pages:
+                    full_content += f"\nPage {page_num}: {page_text[:int(len(page_text) * keep)]}\n"
+                prompt = self._summary_prompt(full_content, scope)
+                sizing = sizer.plan(model, prompt, 'summary')
+            print(f"Content needs {needed} prompt tokens but {model} fits {budget}; "
+                  f"summarizing the first {keep:.0%} of each page")
+
+        response_text, cancelled = self._generate(prompt, {
+            'temperature': temperature,
+            'top_p': top_p,
+            'top_k': top_k
+        }, on_token, model, sizing)
+
+        return {
+            'response': response_text,
+            'pages_covered': len(pages),
+            'model': model,
+            'cancelled': cancelled,
+            'coverage': self.coverage(),
+            'truncated': truncated,
+            'sizing': sizing
+        }
+
+    def _summary_prompt(self, full_content, scope="PDF document"):
+        # Create comprehensive summary prompt
+        return f"""Please provide a comprehensive summary of the following {scope}. 
             Include the main topics, key concepts, and overall structure of the document.
             
             PDF Content:
@@ -207,74 +649,195 @@ class PDFRAGChatbot:
             
             Summary:"""
 
-            response = ollama.generate(
-                model=self.model_name,
-                prompt=prompt,
-                options={
-                    'temperature': temperature,
-                    'top_p': top_p,
-                    'top_k': top_k
-                }
-            )
-
-            return {
-                'response': response['response'],
-                'content_analyzed': len(all_docs),
-                'pages_covered': len(page_contents),
-                'model': self.model_name,
-                'type': 'comprehensive_summary'
-            }
-
-        except Exception as e:
-            return f"Error generating summary: {e}"
-
-    def generate_response(self, query, temperature=0.2, top_p=0.9, top_k=40):
+    def _extractive_answer(self, query_embedding, context_docs, started):
+        """Answer with the best sentence of the top chunk, or None if retrieval is not decisive."""
+        if not is_decisive(context_docs, self.extractive_min_score, self.extractive_min_margin):
+            return None
+        top_doc = context_docs[0]
+        sentence, sentence_score = best_sentence(
+            query_embedding, top_doc['content'],
+            lambda texts: self.embedding_model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        )
+        pages = chunk_pages(top_doc['metadata'])
+        top_score, margin = retrieval_margin(context_docs)
+        return {
+            'response': f"{sentence}\n\n(Source: {page_label(top_doc['metadata']).lower()})",
+            'context_used': [top_doc],
+            'model': 'extractive',
+            'answer_path': 'extractive',
+            'extractive': {
+                'page': pages[0],
+                'pages': pages,
+                'retrieval_score': top_score,
+                'margin': margin,
+                'sentence_score': sentence_score
+            },
+            'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+            'cancelled': False,
+            'coverage': self.coverage()
+        }
+
+    @profiled('generate_response')
+    def generate_response(self, query, temperature=0.2, top_p=0.9, top_k=40, on_token=None, extractive=None,
+                          model=None):
+        """Answer a question from the retrieved context.
+
+        With ``extractive`` (defaults to ``extractive_mode``) a decisive
+        retrieval is answered with the best matching sentence and its page,
+        skipping the LLM. ``answer_path`` in the result says which path was taken.
+        """
         try:
+            started = time.perf_counter()
             # Check if this is a summarization request
             if any(word in query.lower() for word in ['summarize', 'summary', 'overview', 'main topic']):
-                return self.generate_summary(temperature, top_p, top_k)
+                return self.generate_summary(temperature, top_p, top_k, on_token=on_token, model=model)
 
-            context_docs = self.search_context(query)
+            query_embedding = self._encode_query(query)
+            context_docs = self.search_context(query, query_embedding=query_embedding)
             if not context_docs:
                 return "I couldn't find relevant information in the PDF to answer your question."
 
-            context_str = "\n\n".join([
-                f"Chunk {i+1} (Page {doc['metadata']['page']}):\n{doc['content']}\nRelevance: {doc['relevance_score']:.2f}"
-                for i, doc in enumerate(context_docs)
-            ])
-
-            prompt = f"""Based on the following context from the PDF, answer the user's question. Only use information from the provided context. If the context doesn't contain enough information, say so.
-
-Context:
-{context_str}
-
-Question: {query}
-
-Answer:"""
-
-            response = ollama.generate(
-                model=self.model_name,
-                prompt=prompt,
-                options={
-                    'temperature': temperature,
-                    'top_p': top_p,
-                    'top_k': top_k
-                }
-            )
+            if self.extractive_mode if extractive is None else extractive:
+                result = self._extractive_answer(query_embedding, context_docs, started)
+                if result is not None:
+                    return result
+
+            model = model or self.model_name
+            prompt = self._answer_prompt(query, context_docs)
+            sizer = get_request_sizer()
+            sizing = sizer.plan(model, prompt, 'answer')
+            if not sizing['fits']:
+                # Leave out the least relevant chunks until the prompt fits the model
+                retrieved = len(context_docs)
+                while not sizing['fits'] and len(context_docs) > 1:
+                    context_docs = context_docs[:-1]
+                    prompt = self._answer_prompt(query, context_docs)
+                    sizing = sizer.plan(model, prompt, 'answer')
+                print(f"Prompt exceeds the {sizing['capacity']} token context of {model}; "
+                      f"using {len(context_docs)} of {retrieved} chunks")
+
+            response_text, cancelled = self._generate(prompt, {
+                'temperature': temperature,
+                'top_p': top_p,
+                'top_k': top_k
+            }, on_token, model, sizing)
             return {
-                'response': response['response'],
+                'response': response_text,
                 'context_used': context_docs,
-                'model': self.model_name,
+                'model': model,
                 'parameters': {
                     'temperature': temperature,
                     'top_p': top_p,
                     'top_k': top_k
-                }
+                },
+                'cancelled': cancelled,
+                'coverage': self.coverage(),
+                'answer_path': 'llm',
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+                'sizing': sizing
+            }
+        except Exception as e:
+            return f"Error generating response: {e}"
+
+    @profiled('answer_from_pages')
+    def answer_from_pages(self, query, first_page=None, last_page=None, section=None, temperature=0.2, top_p=0.9,
+                          top_k=40, on_token=None, model=None):
+        """Answer ``query`` from a page range (inclusive) or an outline section only.
+
+        Whole pages are passed as context when they fit the model; otherwise
+        the range's indexed chunks are ranked against the question.
+        """
+        try:
+            started = time.perf_counter()
+            first_page, last_page, scope = self._resolve_range(first_page, last_page, section)
+            pages = self.read_pages(first_page, last_page)
+            if not pages:
+                return f"No content available for {scope}."
+
+            model = model or self.model_name
+            sizer = get_request_sizer()
+            # Whole pages as context when they fit
+            context_docs = [
+                {'content': text, 'metadata': {'page': page}, 'relevance_score': 1.0} for page, text in pages
+            ]
+            prompt = self._answer_prompt(query, context_docs)
+            sizing = sizer.plan(model, prompt, 'answer')
+            if not sizing['fits']:
+                context_docs = self._rank_range_chunks(query, first_page, last_page, model)
+                prompt = self._answer_prompt(query, context_docs)
+                sizing = sizer.plan(model, prompt, 'answer')
+
+            response_text, cancelled = self._generate(prompt, {
+                'temperature': temperature,
+                'top_p': top_p,
+                'top_k': top_k
+            }, on_token, model, sizing)
+            return {
+                'response': response_text,
+                'context_used': context_docs,
+                'model': model,
+                'first_page': first_page,
+                'last_page': last_page,
+                'cancelled': cancelled,
+                'coverage': self.coverage(),
+                'answer_path': 'llm',
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+                'sizing': sizing
             }
         except Exception as e:
             return f"Error generating response: {e}"
 
+    def _rank_range_chunks(self, query, first_page, last_page, model):
+        """The range's chunks closest to ``query`` that fit an answer prompt, best first."""
+        conditions = [{'page': {'$gte': first_page}}] if first_page else []
+        if last_page:
+            conditions.append({'page': {'$lte': last_page}})
+        if not conditions:
+            return self.search_context(query, n_results=self.retrieval_config['summary_n_results'])
+        filters = [conditions[0] if len(conditions) == 1 else {'$and': conditions}]
+        if first_page:
+            # Deduplicated chunks first found before the range but repeated inside it
+            filters.append({'$and': [{'page': {'$lt': first_page}}, {'last_page': {'$gte': first_page}}]})
+
+        results = {'documents': [], 'metadatas': [], 'embeddings': []}
+        for where in filters:
+            found = self.collection.get(where=where, include=['embeddings', 'documents', 'metadatas'])
+            for document, metadata, embedding in zip(found['documents'], found['metadatas'], found['embeddings']):
+                if any((first_page or 1) <= page <= (last_page or page) for page in chunk_pages(metadata)):
+                    results['documents'].append(document)
+                    results['metadatas'].append(metadata)
+                    results['embeddings'].append(embedding)
+        if not results['documents']:
+            return []
+        scores = np.asarray(results['embeddings'], dtype=np.float32) @ self._encode_query(query).reshape(-1)
+        sizer = get_request_sizer()
+        budget = sizer.prompt_budget(model, 'answer') - sizer.count(model, self._answer_prompt(query, []))
+        context_docs = []
+        for i in np.argsort(-scores)[:self.retrieval_config['summary_n_results']]:
+            budget -= sizer.count(model, results['documents'][i]) + CHUNK_PROMPT_OVERHEAD_TOKENS
+            if budget < 0 and context_docs:
+                break
+            context_docs.append({'content': results['documents'][i], 'metadata': results['metadatas'][i],
+                                 'relevance_score': float(scores[i])})
+        return context_docs
+
+    def _answer_prompt(self, query, context_docs):
+        context_str = "\n\n".join([
+            f"Chunk {i+1} ({page_label(doc['metadata'])}):\n{doc['content']}\nRelevance: {doc['relevance_score']:.2f}"
+            for i, doc in enumerate(context_docs)
+        ])
+
+        return f"""Based on the following context from the PDF, answer the user's question. Only use information from the provided context. If the context doesn't contain enough information, say so.
+
+Context:
+{context_str}
+
+Question: {query}
+
+Answer:"""
+
 if __name__ == "__main__":
+    # To index many PDFs at once use: python -m rag.bulk_ingest <directory>
     chatbot = PDFRAGChatbot()
     query = "Summarize the main topic of the PDF."
     response = chatbot.generate_response(query)
@@ -0,0 +1,287 @@
+"""PDF text extraction backends.
+
+``pdfplumber`` runs a full layout analysis for every page, which makes it the
+slowest stage of ingestion on large PDFs. ``pypdfium2`` and PyMuPDF read the
+text layer natively and are usually an order of magnitude faster. A
+``TextExtractor`` uses the fastest installed backend and falls back to
+``pdfplumber`` only for pages whose fast-path text looks wrong (empty,
+garbled or run together), which is typical of layout-heavy pages.
+
+    python -m rag.pdf_extract document.pdf --max-pages 50
+
+benchmarks every installed backend and reports how closely its text matches
+``pdfplumber``.
+"""
+import argparse
+import re
+import threading
+import time
+from collections import Counter
+
+import pdfplumber
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+# Fast backends in order of preference
+FAST_BACKENDS = ('pdfium', 'pymupdf')
+
+# PDFium is not thread-safe; every call into it goes through this lock
+_pdfium_lock = threading.Lock()
+
+
+class PdfplumberDocument:
+    name = 'pdfplumber'
+
+    def __init__(self, path):
+        self._pdf = pdfplumber.open(path)
+        self.page_count = len(self._pdf.pages)
+
+    def page_text(self, index):
+        page = self._pdf.pages[index]
+        text = page.extract_text() or ""
+        # Drop the cached layout objects of pages already read
+        if hasattr(page, 'close'):
+            page.close()
+        return text
+
+    def outline(self):
+        # pdfminer's outline destinations would have to be resolved against the page objects
+        return []
+
+    def close(self):
+        self._pdf.close()
+
+
+class PdfiumDocument:
+    name = 'pdfium'
+
+    def __init__(self, path):
+        with _pdfium_lock:
+            self._pdf = pdfium.PdfDocument(path)
+            self.page_count = len(self._pdf)
+
+    def page_text(self, index):
+        with _pdfium_lock:
+            page = self._pdf[index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+        return text.replace("\r\n", "\n")
+
+    def outline(self):
+        entries = []
+        with _pdfium_lock:
+            for bookmark in self._pdf.get_toc():
+                dest = bookmark.get_dest()
+                index = dest.get_index() if dest is not None else None
+                if index is not None:
+                    entries.append((bookmark.level + 1, bookmark.get_title(), index + 1))
+        return entries
+
+    def close(self):
+        with _pdfium_lock:
+            self._pdf.close()
+
+
+class PyMuPDFDocument:
+    name = 'pymupdf'
+
+    def __init__(self, path):
+        self._pdf = pymupdf.open(path)
+        self.page_count = self._pdf.page_count
+
+    def page_text(self, index):
+        return self._pdf[index].get_text()
+
+    def outline(self):
+        return [(level, title, page) for level, title, page in self._pdf.get_toc() if page > 0]
+
+    def close(self):
+        self._pdf.close()
+
+
+BACKENDS = {
+    'pdfplumber': PdfplumberDocument,
+    'pdfium': PdfiumDocument,
+    'pymupdf': PyMuPDFDocument
+}
+
+
+def available_backends():
+    """Names of the backends whose library is installed, fastest first."""
+    installed = {'pdfium': pdfium is not None, 'pymupdf': pymupdf is not None, 'pdfplumber': True}
+    return [name for name in FAST_BACKENDS + ('pdfplumber',) if installed[name]]
+
+
+def resolve_backend(name='auto'):
+    """Map ``'auto'`` to the fastest installed backend and validate explicit names."""
+    if name == 'auto':
+        return available_backends()[0]
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{name}', expected 'auto' or one of {list(BACKENDS)}")
+    if name not in available_backends():
+        raise ImportError(f"PDF backend '{name}' is not installed")
+    return name
+
+
+def needs_fallback(text, max_bad_ratio=0.05, max_avg_word_length=25):
+    """Heuristic for fast-path text that should be re-extracted with pdfplumber.
+
+    Flags empty pages, text with many replacement or control characters, and
+    text whose words run together (missing spaces from column layouts).
+    """
+    stripped = text.strip()
+    if not stripped:
+        return True
+    bad = sum(1 for ch in stripped if ch == "�" or (ord(ch) < 32 and ch not in "\n\t"))
+    if bad / len(stripped) > max_bad_ratio:
+        return True
+    words = stripped.split()
+    return sum(len(word) for word in words) / len(words) > max_avg_word_length
+
+
+class ExtractedDocument:
+    """An open PDF that returns page text from the primary backend or the fallback."""
+
+    def __init__(self, path, backend, fallback):
+        self.path = path
+        self.fallback = fallback
+        self._primary = BACKENDS[backend](path)
+        self._fallback_doc = None
+        self.page_count = self._primary.page_count
+        self.pages_by_backend = Counter()
+
+    def page_text(self, index):
+        text = self._primary.page_text(index)
+        backend = self._primary.name
+        if self.fallback and self.fallback != backend and needs_fallback(text):
+            if self._fallback_doc is None:
+                self._fallback_doc = BACKENDS[self.fallback](self.path)
+            fallback_text = self._fallback_doc.page_text(index)
+            if fallback_text.strip():
+                text, backend = fallback_text, self.fallback
+        self.pages_by_backend[backend] += 1
+        return text
+
+    def outline(self):
+        """Bookmarks as ``[(level, title, page_number)]`` (levels and pages from 1), if the backend reads them."""
+        try:
+            return self._primary.outline()
+        except Exception as e:
+            print(f"Could not read the outline of {self.path}: {e}")
+            return []
+
+    def close(self):
+        self._primary.close()
+        if self._fallback_doc is not None:
+            self._fallback_doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TextExtractor:
+    """Choose an extraction backend per document and fall back per page.
+
+    ``backend`` is ``'auto'`` (fastest installed), ``'pdfium'``, ``'pymupdf'``
+    or ``'pdfplumber'``; ``fallback`` is used for pages the fast backend
+    handles poorly (None disables it).
+    """
+
+    def __init__(self, backend='auto', fallback='pdfplumber'):
+        self.backend = resolve_backend(backend)
+        self.fallback = fallback
+
+    def open(self, path):
+        try:
+            return ExtractedDocument(path, self.backend, self.fallback)
+        except Exception as e:
+            if self.backend == 'pdfplumber' or not self.fallback:
+                raise
+            # Some files only open with pdfplumber's more lenient parser
+            print(f"{self.backend} could not open {path} ({e}), using {self.fallback}")
+            return ExtractedDocument(path, self.fallback, None)
+
+
+def _words(text):
+    return Counter(re.findall(r"\w+", text.lower()))
+
+
+def text_similarity(reference, candidate):
+    """Word-level F1 between two texts (1.0 means the same words with the same counts)."""
+    ref_words, cand_words = _words(reference), _words(candidate)
+    if not ref_words and not cand_words:
+        return 1.0
+    overlap = sum((ref_words & cand_words).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(cand_words.values())
+    recall = overlap / sum(ref_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def benchmark(path, backends=None, max_pages=None, reference='pdfplumber'):
+    """Time each backend over the same pages and compare its text with ``reference``.
+
+    Returns one dict per backend with ``seconds``, ``pages_per_s``, ``chars`` and
+    ``similarity`` (mean per-page word F1 against the reference backend).
+    """
+    backends = backends or available_backends()
+    texts = {}
+    results = []
+    for name in [reference] + [b for b in backends if b != reference]:
+        document = BACKENDS[name](path)
+        try:
+            pages = min(document.page_count, max_pages or document.page_count)
+            start = time.perf_counter()
+            texts[name] = [document.page_text(i) for i in range(pages)]
+            seconds = time.perf_counter() - start
+        finally:
+            document.close()
+        similarities = [text_similarity(ref, text) for ref, text in zip(texts[reference], texts[name])]
+        results.append({
+            'backend': name,
+            'pages': pages,
+            'seconds': round(seconds, 3),
+            'pages_per_s': round(pages / seconds, 1) if seconds else None,
+            'chars': sum(len(text) for text in texts[name]),
+            'similarity': round(sum(similarities) / len(similarities), 4) if similarities else 1.0,
+            'fallback_pages': sum(1 for text in texts[name] if needs_fallback(text))
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF text extraction backends")
+    parser.add_argument("pdf")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS))
+    parser.add_argument("--max-pages", type=int)
+    args = parser.parse_args()
+
+    print(f"{'backend':<12}{'pages':>7}{'seconds':>10}{'pages/s':>10}{'chars':>10}{'similarity':>12}{'fallback':>10}")
+    for row in benchmark(args.pdf, args.backends, args.max_pages):
+        print(f"{row['backend']:<12}{row['pages']:>7}{row['seconds']:>10}{row['pages_per_s'] or '-':>10}"
+              f"{row['chars']:>10}{row['similarity']:>12}{row['fallback_pages']:>10}")
+    print("similarity: mean per-page word F1 against pdfplumber; "
+          "fallback: pages the auto extractor would re-read with pdfplumber")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Opt-in per-request profiling of the chatbot's expensive calls.
+
+``load_and_embed_pdf`` (the ingest job), ``search_context``,
+``generate_response``, ``generate_summary``, ``summarize_pages`` and
+``answer_from_pages`` run under ``profile_request`` when profiling is enabled, either with ``RAG_PROFILE=1`` or with
+``PDFRAGChatbot(profile=True)``. Each profiled call writes these files to
+``RAG_PROFILE_DIR``:
+
+    <time>-<name>-<pid>-<id>.prof        cProfile stats (``python -m pstats``, snakeviz)
+    <time>-<name>-<pid>-<id>.tracemalloc allocation snapshot (``tracemalloc.Snapshot.load``)
+    <time>-<name>-<pid>-<id>.json        wall time, details, top functions and allocation growth
+
+``RAG_PROFILE_SAMPLE_RATE`` profiles only that fraction of calls, which
+keeps the overhead acceptable when profiling is left on in production.
+``RAG_PROFILE_MEMORY=0`` skips tracemalloc, which is the costlier part.
+Calls made inside a profiled call are part of its profile rather than
+profiled on their own. On Python 3.12+ only one cProfile can be active per
+process, so a call overlapping another profiled call runs unprofiled.
+tracemalloc is process-wide, so allocation figures include other threads.
+
+Usage (from the shared/ directory):
+    python -m rag.profiling                  list saved profiles, slowest first
+    python -m pstats ../data/profiles/<file>.prof
+"""
+import argparse
+import cProfile
+import functools
+import glob
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+PROFILE_ENV = "RAG_PROFILE"
+PROFILE_DIR = os.environ.get("RAG_PROFILE_DIR", "../data/profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("RAG_PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_MEMORY = os.environ.get("RAG_PROFILE_MEMORY", "1") != "0"
+
+TRACEMALLOC_FRAMES = 5
+TOP_FUNCTIONS = 20
+TOP_ALLOCATIONS = 15
+
+_active = threading.local()
+_memory_lock = threading.Lock()
+_memory_users = 0
+_memory_started_here = False
+
+
+def profiling_enabled(flag=None):
+    """An explicit flag wins; otherwise ``RAG_PROFILE`` decides."""
+    if flag is not None:
+        return bool(flag)
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+def _start_memory():
+    global _memory_users, _memory_started_here
+    with _memory_lock:
+        if _memory_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _memory_started_here = True
+        _memory_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_memory():
+    """Snapshot at the end of a request; tracing stops with the last profiled request."""
+    global _memory_users, _memory_started_here
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    with _memory_lock:
+        _memory_users -= 1
+        if _memory_users == 0 and _memory_started_here:
+            tracemalloc.stop()
+            _memory_started_here = False
+    return snapshot, current, peak
+
+
+def _describe(value):
+    """JSON-friendly, size-limited description of a call argument."""
+    if isinstance(value, str):
+        return value if len(value) <= 200 else value[:200] + "…"
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return type(value).__name__
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler).sort_stats('cumulative')
+    top = []
+    for func in stats.fcn_list[:TOP_FUNCTIONS]:
+        primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[func]
+        filename, line, name = func
+        top.append({
+            'function': f"{os.path.basename(filename)}:{line}({name})" if line else name,
+            'calls': calls,
+            'tottime_s': round(total_time, 4),
+            'cumtime_s': round(cumulative_time, 4)
+        })
+    return top
+
+
+def _write_profile(base_path, summary, profiler, memory):
+    os.makedirs(os.path.dirname(base_path) or '.', exist_ok=True)
+    profiler.dump_stats(base_path + ".prof")
+    summary['top_functions'] = _top_functions(profiler)
+    if memory is not None:
+        start_snapshot, end_snapshot, current, peak = memory
+        # Leave out the profilers' own bookkeeping
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__)]
+        end_snapshot = end_snapshot.filter_traces(ignore)
+        end_snapshot.dump(base_path + ".tracemalloc")
+        growth = end_snapshot.compare_to(start_snapshot.filter_traces(ignore), 'lineno')
+        summary['memory'] = {
+            'traced_current_mb': round(current / 1e6, 2),
+            'traced_peak_mb': round(peak / 1e6, 2),
+            'top_allocations': [
+                {'where': str(stat.traceback[0]), 'size_diff_kb': round(stat.size_diff / 1024, 1),
+                 'count_diff': stat.count_diff}
+                for stat in growth[:TOP_ALLOCATIONS]
+            ]
+        }
+    with open(base_path + ".json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+
+@contextmanager
+def profile_request(name, enabled=False, details=None, profile_dir=None):
+    """Profile the enclosed block and save its files; a no-op unless ``enabled``.
+
+    Yields the ``cProfile.Profile`` in use, or None when this call is not profiled.
+    """
+    if not enabled or getattr(_active, 'profiling', False) or random.random() >= PROFILE_SAMPLE_RATE:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another thread's profiler is active (Python 3.12+)
+        yield None
+        return
+
+    _active.profiling = True
+    start_snapshot = _start_memory() if PROFILE_MEMORY else None
+    started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    started = time.perf_counter()
+    error = None
+    try:
+        yield profiler
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        _active.profiling = False
+        memory = None
+        if start_snapshot is not None:
+            memory = (start_snapshot,) + _stop_memory()
+
+        base_path = os.path.join(profile_dir or PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-"
+                                                             f"{os.getpid()}-{uuid.uuid4().hex[:6]}")
+        summary = {
+            'name': name,
+            'started_at': started_at,
+            'elapsed_s': round(elapsed, 4),
+            'error': error,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'details': details or {}
+        }
+        try:
+            _write_profile(base_path, summary, profiler, memory)
+            print(f"Profile of {name} ({elapsed:.2f}s) written to {base_path}.prof")
+        except Exception as e:
+            print(f"Could not write profile for {name}: {e}")
+
+
+def profiled(name):
+    """Decorate a ``PDFRAGChatbot`` method to run under ``profile_request`` when ``self.profile`` is set."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not getattr(self, 'profile', False):
+                return method(self, *args, **kwargs)
+            details = {
+                'collection': getattr(self, 'collection_name', None),
+                'args': [_describe(arg) for arg in args],
+                'kwargs': {key: _describe(value) for key, value in kwargs.items()}
+            }
+            with profile_request(name, enabled=True, details=details):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List saved request profiles, slowest first")
+    parser.add_argument("profile_dir", nargs="?", default=PROFILE_DIR)
+    parser.add_argument("--name", help="Only profiles of this call (e.g. generate_response)")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    summaries = []
+    for path in glob.glob(os.path.join(args.profile_dir, "*.json")):
+        with open(path, encoding='utf-8') as f:
+            summary = json.load(f)
+        if not args.name or summary['name'] == args.name:
+            summaries.append((path, summary))
+    summaries.sort(key=lambda item: item[1]['elapsed_s'], reverse=True)
+    if not summaries:
+        print(f"No profiles in {args.profile_dir}")
+        return
+
+    for path, summary in summaries[:args.top]:
+        peak = summary.get('memory', {}).get('traced_peak_mb')
+        print(f"{summary['elapsed_s']:8.3f}s  {summary['name']:<20} {summary['started_at']}  "
+              f"{'peak ' + str(peak) + ' MB  ' if peak is not None else ''}{os.path.basename(path)[:-5]}")
+        for func in summary.get('top_functions', [])[:3]:
+            print(f"           {func['cumtime_s']:8.3f}s cumulative  {func['function']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Prompt-length-aware sizing of Ollama requests.
+
+Ollama runs every request with the model's default context window unless
+``num_ctx`` is given, silently dropping the start of longer prompts, and
+lets the model generate until it stops on its own. ``RequestSizer`` counts
+the prompt's tokens locally and sets ``num_ctx`` just large enough for the
+prompt plus the answer, and caps ``num_predict`` by request kind, so
+KV-cache memory and latency follow the actual work.
+
+``num_ctx`` is rounded up to a power of two: Ollama reloads a model whose
+context size changes, so a few sizes keep reloads rare. The largest size
+is the model's trained context length (from ``/api/show``), capped by
+``RAG_MAX_NUM_CTX``. Token counts are estimated without the model's
+tokenizer and corrected per model from the ``prompt_eval_count`` Ollama
+reports for finished requests.
+"""
+import math
+import os
+import re
+import sys
+import threading
+
+# Workspace-level shared modules (model manager)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'shared'))
+from llm.models import get_model_manager
+
+# Largest num_ctx requested, whatever the model supports (KV-cache memory grows with it)
+MAX_NUM_CTX = int(os.environ.get("RAG_MAX_NUM_CTX", "32768"))
+MIN_NUM_CTX = 2048
+
+# Context length assumed when Ollama does not report one
+DEFAULT_CONTEXT_LENGTH = 8192
+
+# Answer length caps (num_predict) per request kind
+NUM_PREDICT = {
+    'answer': 512,
+    'summary': 1024
+}
+
+# Prompt tokens of a context chunk's header and relevance line
+CHUNK_PROMPT_OVERHEAD_TOKENS = 12
+
+# Head room for the estimate being low
+SAFETY_MARGIN = 1.1
+
+# Weight of the newest prompt_eval_count in the per-model correction
+CALIBRATION_WEIGHT = 0.2
+
+# Words, up to three digits (as Llama 3 style tokenizers group them) and single other characters
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|\S")
+# Letters per token in long words, which BPE vocabularies split up
+_CHARS_PER_WORD_PIECE = 7
+
+
+def count_tokens(text):
+    """Estimate the number of tokens in ``text`` for a typical BPE tokenizer."""
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        count += 1 + (len(piece) - 1) // _CHARS_PER_WORD_PIECE if piece.isalpha() else 1
+    return count
+
+
+def context_size(tokens, capacity):
+    """Smallest power-of-two ``num_ctx`` (at least ``MIN_NUM_CTX``) holding ``tokens``, at most ``capacity``."""
+    size = max(MIN_NUM_CTX, 2 ** math.ceil(math.log2(max(tokens, 1))))
+    return min(size, capacity)
+
+
+class RequestSizer:
+    def __init__(self, model_manager=None, max_num_ctx=MAX_NUM_CTX, num_predict=None):
+        self.model_manager = model_manager or get_model_manager()
+        self.max_num_ctx = max_num_ctx
+        self.num_predict = dict(NUM_PREDICT, **(num_predict or {}))
+        self._ratios = {}
+        self._lock = threading.Lock()
+
+    def count(self, model, text):
+        """Tokens in ``text`` for ``model``, corrected by what Ollama reported for earlier requests."""
+        with self._lock:
+            ratio = self._ratios.get(model, 1.0)
+        return math.ceil(count_tokens(text) * ratio)
+
+    def capacity(self, model):
+        """Largest ``num_ctx`` to use for ``model``."""
+        length = self.model_manager.context_length(model) or DEFAULT_CONTEXT_LENGTH
+        return min(length, self.max_num_ctx)
+
+    def prompt_budget(self, model, kind):
+        """Prompt tokens that fit next to a full-length answer of this kind."""
+        return int((self.capacity(model) - self.num_predict[kind]) / SAFETY_MARGIN)
+
+    def plan(self, model, prompt, kind):
+        """Size one request; ``fits`` is False when prompt and answer exceed the model's capacity."""
+        prompt_tokens = self.count(model, prompt)
+        num_predict = self.num_predict[kind]
+        capacity = self.capacity(model)
+        needed = math.ceil(prompt_tokens * SAFETY_MARGIN) + num_predict
+        return {
+            'kind': kind,
+            'prompt_tokens': prompt_tokens,
+            'num_predict': num_predict,
+            'num_ctx': context_size(needed, capacity),
+            'capacity': capacity,
+            'fits': needed <= capacity
+        }
+
+    def record(self, model, plan, prompt_eval_count):
+        """Correct the model's token estimate from the prompt size Ollama reported."""
+        # Ollama reports fewer tokens when part of the prompt was cached; skip those
+        if not prompt_eval_count or prompt_eval_count < plan['prompt_tokens'] / 2:
+            return
+        with self._lock:
+            ratio = self._ratios.get(model, 1.0)
+            observed = ratio * prompt_eval_count / plan['prompt_tokens']
+            self._ratios[model] = (1 - CALIBRATION_WEIGHT) * ratio + CALIBRATION_WEIGHT * observed
+
+
+_sizer = None
+_sizer_lock = threading.Lock()
+
+
+def get_request_sizer():
+    """Return the process-wide RequestSizer (sharing its token calibration across chatbots)."""
+    global _sizer
+    with _sizer_lock:
+        if _sizer is None:
+            _sizer = RequestSizer()
+        return _sizer
@@ -0,0 +1,374 @@
+"""Headless HTTP service for PDF question answering.
+
+Runs ``PDFRAGChatbot`` behind a small FastAPI app so both UIs (through
+``rag.client``), scripts and other tools share one indexing and retrieval
+backend. Several uvicorn worker processes serve requests over the same
+on-disk index: uploads are stored by content hash (see rag.uploads) and each
+document is indexed into its own ``doc_<id>`` collection, so any worker can
+open a document another worker indexed.
+
+Chroma does not support concurrent writers, so only one process ingests at a
+time; it holds an advisory lock on ``<db>/service_ingest.lock`` while any of
+its ingests run. Other workers report the document as ``pending``/``running``
+and answer ``409`` for it until the ingest is done (the ingesting worker
+itself answers from the pages indexed so far). A document uploaded while
+another process holds the lock is picked up by the next status request that
+finds the lock free, which is what ``RemoteRAGChatbot`` polling does.
+
+Blocking work (parsing, embedding, retrieval, generation) runs in the thread
+pool, so a worker keeps serving requests while others wait on the model. On
+shutdown uvicorn stops accepting connections and lets in-flight requests
+finish (up to ``--graceful-timeout``); remaining generations are then
+cancelled and running ingests checkpointed so they resume on the next start.
+Every worker loads its own embedding model (~100 MB) unless
+``RAG_EMBEDDING_SOCKET`` points them at a shared rag.embedding_server.
+
+Usage (from the shared/ directory):
+    python -m rag.service --workers 4 --port 8800
+
+Endpoints:
+    GET  /health
+    POST /documents                          upload a PDF (multipart field ``file``)
+    GET  /documents/{doc_id}                 ingest progress, coverage and chunk count
+    GET  /documents/{doc_id}/pages           page texts in order (``first_page``/``last_page`` query parameters)
+    GET  /documents/{doc_id}/sections        outline sections with their page ranges
+    POST /documents/{doc_id}/search          retrieved chunks for ``query``
+    POST /documents/{doc_id}/answer          answer (``mode`` "answer" or "summary"), optionally only from
+                                             ``first_page``-``last_page`` or an outline ``section``
+    POST /documents/{doc_id}/answer/stream   the same as NDJSON lines, Ollama style:
+                                             ``{"response": token, "done": false}`` then
+                                             ``{"response": "", "done": true, "result": ...}``
+"""
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+
+import uvicorn
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from rag.ingestion import read_ingest_state
+from rag.pdf_chatbot import CHROMA_DB_PATH, embedding_stats, ingest_state_path
+from rag.session_manager import UPLOADS_DIR, SessionManager
+from rag.uploads import UploadError, save_upload
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8800
+DEFAULT_WORKERS = int(os.environ.get("RAG_SERVICE_WORKERS", "2"))
+# Model used when a request does not name one (set by --model for all workers)
+DEFAULT_MODEL = os.environ.get("RAG_SERVICE_MODEL", "llama3.2")
+GRACEFUL_TIMEOUT = 30
+
+_DOC_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+class IndexWriterLock:
+    """Inter-process lock that makes one worker the only writer to the index.
+
+    Re-entrant within the process, so one worker can run several ingests at
+    once. The OS releases it if the process dies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._holders = 0
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self._holders == 0:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(fd)
+                    return False
+                self._fd = fd
+            self._holders += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+
+
+# Per worker process: resident documents (keyed by doc id) and the writer lock
+documents = SessionManager(background_ingest=True, retention=float('inf'))
+index_writer = IndexWriterLock(os.path.join(CHROMA_DB_PATH, "service_ingest.lock"))
+# doc_id -> lock held while this worker opens the document, so it builds one chatbot for it
+_open_locks = {}
+_open_locks_guard = threading.Lock()
+
+
+def collection_name(doc_id):
+    return f"doc_{doc_id}"
+
+
+def document_path(doc_id):
+    return os.path.join(UPLOADS_DIR, f"{doc_id}.pdf")
+
+
+def ingest_state(doc_id):
+    return read_ingest_state(ingest_state_path(collection_name(doc_id)))
+
+
+def state_progress(state):
+    """Progress in the shape of ``IngestionJob.progress()`` from a saved ingest state.
+
+    ``chunks_indexed`` and ``elapsed_s`` are None when the state does not
+    record them (before the ingest started, or written by an older version).
+    """
+    state = state or {}
+    total = state.get('total_pages') or 0
+    pages_done = state.get('pages_done', 0)
+    return {
+        'status': 'done' if state.get('complete') else ('running' if state else 'pending'),
+        'pages_done': pages_done,
+        'total_pages': total,
+        'chunks_indexed': state.get('chunks_indexed'),
+        'fraction': pages_done / total if total else 0.0,
+        'elapsed_s': state.get('elapsed_s'),
+        'pages_by_backend': {},
+        'error': None
+    }
+
+
+def _release_after(job):
+    job.wait()
+    index_writer.release()
+
+
+def open_document(doc_id):
+    """Return this worker's chatbot for ``doc_id``, or None while another process indexes it."""
+    if not _DOC_ID.match(doc_id) or not os.path.exists(document_path(doc_id)):
+        raise HTTPException(status_code=404, detail=f"Unknown document {doc_id}")
+
+    with _open_locks_guard:
+        open_lock = _open_locks.setdefault(doc_id, threading.Lock())
+    # Other documents open (and build their chatbots) meanwhile
+    with open_lock:
+        if documents.peek(doc_id) is not None:
+            return documents.get(doc_id)
+
+        state = ingest_state(doc_id)
+        if state and state.get('complete'):
+            return documents.open(doc_id, document_path(doc_id), DEFAULT_MODEL,
+                                  collection_name=collection_name(doc_id))
+
+        # Not indexed yet, or an ingest was interrupted: index it here if no other process writes
+        if not index_writer.try_acquire():
+            return None
+        try:
+            chatbot = documents.open(doc_id, document_path(doc_id), DEFAULT_MODEL,
+                                     collection_name=collection_name(doc_id))
+        except BaseException:
+            index_writer.release()
+            raise
+        if chatbot.ingestion_job is not None and chatbot.ingestion_job.running:
+            threading.Thread(target=_release_after, args=(chatbot.ingestion_job,), daemon=True).start()
+        else:
+            index_writer.release()
+        return chatbot
+
+
+def ready_document(doc_id):
+    """Chatbot for a document this worker can query; 409 while another worker indexes it."""
+    chatbot = open_document(doc_id)
+    if chatbot is None:
+        raise HTTPException(status_code=409, detail={
+            'message': "Document is being indexed by another worker",
+            'progress': state_progress(ingest_state(doc_id))
+        })
+    return chatbot
+
+
+def document_status(doc_id, chatbot):
+    if chatbot is None:
+        progress = state_progress(ingest_state(doc_id))
+        coverage = {'partial': True, 'pages_indexed': progress['pages_done'],
+                    'total_pages': progress['total_pages'] or None}
+        chunks = None
+    else:
+        # Documents opened from an existing index have no job of their own
+        progress = chatbot.ingestion_progress() or dict(state_progress(ingest_state(doc_id)), status='done')
+        coverage = chatbot.coverage()
+        chunks = chatbot.chunk_count()
+    return {'doc_id': doc_id, 'progress': progress, 'coverage': coverage, 'chunks': chunks, 'worker': os.getpid()}
+
+
+class SearchRequest(BaseModel):
+    query: str
+    n_results: Optional[int] = None  # Default: the document's retrieval config
+
+
+class AnswerRequest(BaseModel):
+    query: str = ""
+    mode: Literal['answer', 'summary'] = 'answer'
+    model: Optional[str] = None
+    temperature: float = 0.2
+    top_p: float = 0.9
+    top_k: int = 40
+    extractive: Optional[bool] = None
+    # Restrict to a page range (inclusive) or an outline section
+    first_page: Optional[int] = None
+    last_page: Optional[int] = None
+    section: Optional[str] = None
+
+    def page_range(self):
+        return self.first_page is not None or self.last_page is not None or bool(self.section)
+
+
+class ClientDisconnected(Exception):
+    """Raised from the token callback to stop generating for a client that went away."""
+
+
+def run_answer(chatbot, request, on_token=None):
+    if request.page_range():
+        pages = {'first_page': request.first_page, 'last_page': request.last_page, 'section': request.section}
+        if request.mode == 'summary':
+            return chatbot.summarize_pages(temperature=request.temperature, top_p=request.top_p,
+                                           top_k=request.top_k, on_token=on_token, model=request.model, **pages)
+        return chatbot.answer_from_pages(request.query, temperature=request.temperature, top_p=request.top_p,
+                                         top_k=request.top_k, on_token=on_token, model=request.model, **pages)
+    if request.mode == 'summary':
+        return chatbot.generate_summary(request.temperature, request.top_p, request.top_k,
+                                        on_token=on_token, model=request.model)
+    return chatbot.generate_response(request.query, request.temperature, request.top_p, request.top_k,
+                                     on_token=on_token, extractive=request.extractive, model=request.model)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # In-flight requests have finished or hit the graceful timeout by now
+    await run_in_threadpool(documents.shutdown)
+
+
+app = FastAPI(title="PDF RAG service", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {'status': 'ok', 'worker': os.getpid(), 'documents': documents.stats(), 'embedding': embedding_stats()}
+
+
+@app.post("/documents")
+async def upload_document(file: UploadFile = File(...)):
+    try:
+        upload = await run_in_threadpool(save_upload, file.file, UPLOADS_DIR, file.filename or "upload.pdf")
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+    doc_id = upload['sha256'][:16]
+    chatbot = await run_in_threadpool(open_document, doc_id)
+    return dict(document_status(doc_id, chatbot), filename=upload['filename'], duplicate=upload['duplicate'])
+
+
+@app.get("/documents/{doc_id}")
+async def get_document(doc_id: str):
+    chatbot = await run_in_threadpool(open_document, doc_id)
+    return document_status(doc_id, chatbot)
+
+
+@app.get("/documents/{doc_id}/pages")
+async def read_pages(doc_id: str, first_page: Optional[int] = None, last_page: Optional[int] = None):
+    chatbot = await run_in_threadpool(ready_document, doc_id)
+    pages = await run_in_threadpool(chatbot.read_pages, first_page, last_page)
+    return {'doc_id': doc_id, 'pages': [{'page': page, 'text': text} for page, text in pages]}
+
+
+@app.get("/documents/{doc_id}/sections")
+async def sections(doc_id: str):
+    chatbot = await run_in_threadpool(ready_document, doc_id)
+    return {'doc_id': doc_id, 'sections': await run_in_threadpool(chatbot.sections)}
+
+
+@app.post("/documents/{doc_id}/search")
+async def search(doc_id: str, request: SearchRequest):
+    chatbot = await run_in_threadpool(ready_document, doc_id)
+    results = await run_in_threadpool(chatbot.search_context, request.query, request.n_results)
+    return {'doc_id': doc_id, 'results': results, 'coverage': chatbot.coverage()}
+
+
+@app.post("/documents/{doc_id}/answer")
+async def answer(doc_id: str, request: AnswerRequest):
+    chatbot = await run_in_threadpool(ready_document, doc_id)
+    result = await run_in_threadpool(run_answer, chatbot, request)
+    return {'doc_id': doc_id, 'result': result}
+
+
+@app.post("/documents/{doc_id}/answer/stream")
+async def stream_answer(doc_id: str, request: AnswerRequest):
+    chatbot = await run_in_threadpool(ready_document, doc_id)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    disconnected = threading.Event()
+
+    def on_token(piece):
+        # Aborts only this request's generation (cancel_generation() would hit the document's latest one)
+        if disconnected.is_set():
+            raise ClientDisconnected()
+        loop.call_soon_threadsafe(events.put_nowait, ('token', piece))
+
+    def generate():
+        try:
+            loop.call_soon_threadsafe(events.put_nowait, ('done', run_answer(chatbot, request, on_token)))
+        except Exception as e:
+            loop.call_soon_threadsafe(events.put_nowait, ('error', str(e)))
+
+    async def body():
+        loop.run_in_executor(None, generate)
+        try:
+            while True:
+                kind, payload = await events.get()
+                if kind == 'token':
+                    yield json.dumps({'response': payload, 'done': False}) + "\n"
+                elif kind == 'done':
+                    yield json.dumps({'response': "", 'done': True, 'result': payload}, default=str) + "\n"
+                    break
+                else:
+                    yield json.dumps({'error': payload}) + "\n"
+                    break
+        finally:
+            # Also runs when the client disconnects and Starlette cancels the stream
+            disconnected.set()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve PDF question answering over HTTP")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Worker processes sharing the index (each loads the embedding model "
+                             "unless RAG_EMBEDDING_SOCKET is set)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model for requests that do not name one")
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT,
+                        help="Seconds in-flight requests may take to finish on shutdown")
+    args = parser.parse_args()
+
+    # Worker processes import this module afresh and read their settings from the environment
+    os.environ["RAG_SERVICE_MODEL"] = args.model
+    shared_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    uvicorn.run("rag.service:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=shared_dir, timeout_graceful_shutdown=args.graceful_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""Per-session document working sets under a process-wide memory budget.
+
+Uploads are stored and indexed by content hash (see rag.uploads): the file
+is ``<sha256[:16]>.pdf`` and its collection ``doc_<sha256[:16]>``, as in
+rag.service. Concurrent uploads do not overwrite each other, and any
+session uploading a document that is already indexed reuses its embeddings.
+Documents opened by path get a collection of their own per session. The
+in-memory part of a session (its ``PDFRAGChatbot`` and vector mirror) is
+tracked by a ``SessionManager``. Sessions idle longer than ``idle_ttl`` are evicted, and the
+least recently used sessions are evicted while the total exceeds
+``memory_budget_mb``. An evicted session keeps its persistent collection,
+so the next ``get()`` rebuilds its chatbot from Chroma without re-embedding.
+Sessions unused for ``retention`` are removed completely, including their
+collection and uploaded file unless another session still uses them.
+
+``chatbot_factory`` replaces the local ``PDFRAGChatbot`` with another class
+taking the same arguments, e.g. ``rag.client.RemoteRAGChatbot`` to use a
+running ``rag.service``. The local RAG stack is only imported when needed.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from rag.uploads import save_upload
+
+UPLOADS_DIR = "../data/uploads"
+
+DEFAULT_MEMORY_BUDGET_MB = 512
+DEFAULT_IDLE_TTL = 30 * 60          # Evict in-memory state after 30 minutes idle
+DEFAULT_RETENTION = 24 * 60 * 60    # Delete collections unused for a day
+
+
+def session_collection_name(session_id):
+    """Chroma collection name for a session (names allow a limited character set)."""
+    return f"session_{hashlib.sha1(str(session_id).encode('utf-8')).hexdigest()[:16]}"
+
+
+def document_collection_name(sha256):
+    """Collection of an uploaded document, keyed by content like rag.service's ``doc_<id>``."""
+    return f"doc_{sha256[:16]}"
+
+
+class SessionManager:
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, idle_ttl=DEFAULT_IDLE_TTL,
+                 retention=DEFAULT_RETENTION, uploads_dir=UPLOADS_DIR, chatbot_factory=None,
+                 **chatbot_kwargs):
+        """``chatbot_kwargs`` are passed to every chatbot created."""
+        self.chatbot_factory = chatbot_factory
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.idle_ttl = idle_ttl
+        self.retention = retention
+        self.uploads_dir = uploads_dir
+        self.chatbot_kwargs = chatbot_kwargs
+        # session_id -> {'spec', 'chatbot', 'last_used', 'shared'}; most recently used last
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        # collection_name -> lock held while a chatbot on it is built and registered
+        self._collection_locks = {}
+        self.evictions = 0
+        self.reloads = 0
+
+    def _collection_lock(self, collection_name):
+        """Serialises building chatbots on one collection, so concurrent opens of a document build it once."""
+        with self._lock:
+            return self._collection_locks.setdefault(collection_name, threading.Lock())
+
+    def _create_chatbot(self, spec, session_id):
+        """Build a session's chatbot; callers hold the collection's ``_collection_lock``."""
+        if self.chatbot_factory is not None:
+            return self.chatbot_factory(**spec)
+        # Another session may still be indexing the same collection; a second
+        # chatbot would resume that ingest alongside it
+        collection_name = spec.get('collection_name')
+        with self._lock:
+            jobs = [entry['chatbot'].ingestion_job for sid, entry in self._sessions.items()
+                    if sid != session_id and entry['chatbot'] is not None
+                    and entry['spec'].get('collection_name') == collection_name]
+        for job in jobs:
+            if job is not None and job.running:
+                job.wait()
+        from rag.pdf_chatbot import PDFRAGChatbot
+        return PDFRAGChatbot(**spec)
+
+    def _collection_users(self, collection_name, exclude=None):
+        """Sessions (other than ``exclude``) whose document lives in ``collection_name``."""
+        with self._lock:
+            return [sid for sid, entry in self._sessions.items()
+                    if sid != exclude and entry['spec'].get('collection_name') == collection_name]
+
+    def _is_indexed(self, collection_name, pdf_path):
+        """True if ``pdf_path`` was completely indexed into ``collection_name`` before."""
+        from rag.ingestion import read_ingest_state
+        from rag.pdf_chatbot import ingest_state_path
+        state = read_ingest_state(ingest_state_path(collection_name))
+        return bool(state and state.get('source') == pdf_path and state.get('complete'))
+
+    def open_upload(self, session_id, source, filename, model_name, **kwargs):
+        """Stream an upload to disk and open it as the session's document.
+
+        Uploads are stored and indexed by content hash, so a document any
+        session has indexed before is opened from its existing collection
+        instead of being parsed and embedded again. Returns ``(chatbot,
+        upload)`` where ``upload`` is the dict from
+        ``rag.uploads.save_upload`` plus ``reused`` (True when the document's
+        embeddings already existed).
+        """
+        upload = save_upload(source, self.uploads_dir, filename)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            current = entry['spec'].get('pdf_file_path') if entry else None
+        if current == upload['path']:
+            upload['reused'] = True
+            return self.get(session_id), upload
+
+        kwargs.setdefault('collection_name', document_collection_name(upload['sha256']))
+        if self.chatbot_factory is None:
+            upload['reused'] = self._is_indexed(kwargs['collection_name'], upload['path'])
+            return self.open(session_id, upload['path'], model_name, **kwargs), upload
+        chatbot = self.open(session_id, upload['path'], model_name, **kwargs)
+        # The service keys documents by content as well
+        upload['reused'] = upload['duplicate'] and not chatbot.coverage()['partial']
+        return chatbot, upload
+
+    def open(self, session_id, pdf_file_path, model_name, shared_collection=False, **kwargs):
+        """Create (or replace) the working set of a session and return its chatbot.
+
+        ``shared_collection`` uses the default collection, for documents every
+        session reads the same way (e.g. the bundled test.pdf), and keeps it
+        when the session is removed. An explicit ``collection_name`` keyword
+        is used as given.
+        """
+        spec = dict(self.chatbot_kwargs, **kwargs)
+        spec.update(pdf_file_path=pdf_file_path, model_name=model_name)
+        if not shared_collection:
+            spec.setdefault('collection_name', session_collection_name(session_id))
+
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+        if previous:
+            if previous['chatbot'] is not None:
+                # Stop the old document's ingest before a chatbot on the same collection replaces it
+                self._stop(previous['chatbot'])
+            if previous['spec'].get('collection_name') != spec.get('collection_name'):
+                self._discard(previous)
+
+        # Registered before the lock is released, so a concurrent open of the
+        # same document sees this chatbot's ingest and waits for it
+        with self._collection_lock(spec.get('collection_name')):
+            chatbot = self._create_chatbot(spec, session_id)
+            with self._lock:
+                self._sessions[session_id] = {'spec': spec, 'chatbot': chatbot, 'last_used': time.monotonic(),
+                                              'shared': shared_collection}
+        self.enforce(keep=session_id)
+        return chatbot
+
+    def get(self, session_id):
+        """Return the session's chatbot, reloading it from Chroma if it was evicted."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            entry['last_used'] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            chatbot = entry['chatbot']
+            spec = entry['spec']
+
+        if chatbot is None:
+            with self._collection_lock(spec.get('collection_name')):
+                with self._lock:
+                    # Another thread may have reloaded the session meanwhile
+                    chatbot = entry['chatbot']
+                if chatbot is None:
+                    # Pages were committed to the persistent collection, so this skips re-embedding
+                    chatbot = self._create_chatbot(spec, session_id)
+                    with self._lock:
+                        if self._sessions.get(session_id) is entry:
+                            entry['chatbot'] = chatbot
+                        self.reloads += 1
+        self.enforce(keep=session_id)
+        return chatbot
+
+    def peek(self, session_id):
+        """Return the session's chatbot if it is resident, without reloading or touching it."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry['chatbot'] if entry else None
+
+    def has_session(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def update(self, session_id, **spec):
+        """Change how an evicted session is rebuilt (e.g. ``model_name``)."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry:
+                entry['spec'].update(spec)
+
+    def evict(self, session_id):
+        """Drop a session's in-memory state; its collection stays for a later reload."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry['chatbot'] is None or entry['chatbot'].is_busy():
+                return False
+            entry['chatbot'] = None
+            self.evictions += 1
+        return True
+
+    @staticmethod
+    def _stop(chatbot):
+        """Abort the chatbot's generation and wait for its ingest to stop."""
+        chatbot.cancel_generation()
+        if chatbot.ingestion_job is not None:
+            chatbot.ingestion_job.cancel()
+
+    def close(self, session_id):
+        """Forget a session and delete its private collection and (unshared) upload."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return
+        if entry['chatbot'] is not None:
+            self._stop(entry['chatbot'])
+        self._discard(entry)
+
+    def _discard(self, entry):
+        """Delete the collection and upload of a removed session unless another session uses them."""
+        if entry.get('shared'):
+            # Shared collections (e.g. the bundled test.pdf's) outlive every session
+            return
+        collection_name = entry['spec'].get('collection_name')
+        # A remote chatbot's collection (and possibly its upload file) belongs to the service
+        if collection_name and self.chatbot_factory is None and not self._collection_users(collection_name):
+            from rag.pdf_chatbot import delete_collection_data
+            try:
+                delete_collection_data(collection_name)
+            except Exception as e:
+                print(f"Could not delete the data of collection {collection_name}: {e}")
+            pdf_path = entry['spec'].get('pdf_file_path')
+            with self._lock:
+                # Uploads are stored by content, so another session may use the same file
+                shared = any(other['spec'].get('pdf_file_path') == pdf_path for other in self._sessions.values())
+            if pdf_path and not shared and os.path.abspath(pdf_path).startswith(os.path.abspath(self.uploads_dir)):
+                try:
+                    os.remove(pdf_path)
+                except OSError:
+                    pass
+
+    def shutdown(self):
+        """Stop every resident session's generation and ingest; collections are kept.
+
+        Cancelled ingests are checkpointed, so they resume when the document
+        is opened again.
+        """
+        with self._lock:
+            chatbots = [entry['chatbot'] for entry in self._sessions.values() if entry['chatbot'] is not None]
+        for chatbot in chatbots:
+            chatbot.cancel_generation()
+            if chatbot.ingestion_job is not None and chatbot.ingestion_job.running:
+                chatbot.ingestion_job.cancel()
+
+    def memory_usage(self):
+        with self._lock:
+            chatbots = [entry['chatbot'] for entry in self._sessions.values() if entry['chatbot'] is not None]
+        return sum(chatbot.memory_usage() for chatbot in chatbots)
+
+    def enforce(self, keep=None):
+        """Apply retention, the idle TTL and the memory budget (never evicting ``keep``)."""
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._sessions.items())
+        for session_id, entry in entries:
+            if session_id == keep:
+                continue
+            idle = now - entry['last_used']
+            if idle > self.retention:
+                self.close(session_id)
+            elif idle > self.idle_ttl and entry['chatbot'] is not None:
+                self.evict(session_id)
+
+        # Least recently used first
+        with self._lock:
+            candidates = [sid for sid, entry in self._sessions.items()
+                          if sid != keep and entry['chatbot'] is not None]
+        usage = self.memory_usage()
+        for session_id in candidates:
+            if usage <= self.memory_budget:
+                break
+            with self._lock:
+                entry = self._sessions.get(session_id)
+                size = entry['chatbot'].memory_usage() if entry and entry['chatbot'] is not None else 0
+            if self.evict(session_id):
+                usage -= size
+
+    def stats(self):
+        with self._lock:
+            sessions = len(self._sessions)
+            resident = sum(1 for entry in self._sessions.values() if entry['chatbot'] is not None)
+        return {
+            'sessions': sessions,
+            'resident': resident,
+            'memory_mb': round(self.memory_usage() / (1024 * 1024), 1),
+            'budget_mb': round(self.memory_budget / (1024 * 1024), 1),
+            'evictions': self.evictions,
+            'reloads': self.reloads
+        }
@@ -0,0 +1,79 @@
+"""Streaming, content-addressed PDF uploads.
+
+An upload is copied in fixed-size chunks to a unique ``.part`` file while its
+SHA-256 is computed, so no full in-memory copy of the PDF is made and the
+size limit is enforced as the bytes arrive. The finished file is renamed to
+``<sha256[:16]>.pdf``. Uploading the same content again resolves to the same
+path, and ``SessionManager.open_upload`` opens it from the collection keyed
+by the same hash, so duplicates are detected before any parsing or
+embedding happens.
+"""
+import hashlib
+import os
+import uuid
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024   # 1 MiB
+MAX_UPLOAD_MB = 500
+PDF_MAGIC = b"%PDF-"
+
+
+class UploadError(ValueError):
+    """The upload is not a PDF or exceeds the size limit."""
+
+
+def _open_source(source):
+    """Return ``(file object, should_close)`` for a path or a readable object."""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb"), True
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source, False
+
+
+def save_upload(source, dest_dir, filename="upload.pdf", chunk_size=UPLOAD_CHUNK_SIZE,
+                max_mb=MAX_UPLOAD_MB):
+    """Stream ``source`` (a path or binary file object) into ``dest_dir``.
+
+    Returns a dict with ``path``, ``sha256``, ``size``, ``filename`` and
+    ``duplicate`` (True when a file with the same content was already
+    stored). Raises ``UploadError`` for non-PDF data or uploads larger than
+    ``max_mb``.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    max_bytes = max_mb * 1024 * 1024
+    part_path = os.path.join(dest_dir, f"upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    reader, should_close = _open_source(source)
+    try:
+        with open(part_path, "wb") as out:
+            while True:
+                chunk = reader.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0 and not chunk.startswith(PDF_MAGIC):
+                    raise UploadError(f"{filename} is not a PDF file")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"{filename} is larger than the {max_mb} MB upload limit")
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise UploadError(f"{filename} is empty")
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    finally:
+        if should_close:
+            reader.close()
+
+    sha256 = digest.hexdigest()
+    final_path = os.path.join(dest_dir, f"{sha256[:16]}.pdf")
+    duplicate = os.path.exists(final_path)
+    if duplicate:
+        os.remove(part_path)
+    else:
+        os.replace(part_path, final_path)
+    return {'path': final_path, 'sha256': sha256, 'size': size, 'filename': filename, 'duplicate': duplicate}
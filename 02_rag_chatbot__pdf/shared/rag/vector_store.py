@@ -0,0 +1,253 @@
+"""Vector store backends for the PDF RAG chatbot.
+
+Chroma stays the persistent store of record. For the collection sizes a
+single PDF produces (a few thousand 384-dim vectors) an exact dot product
+over a contiguous float32 matrix is faster than a Chroma query and involves
+no SQLite I/O, so ``select_vector_store`` mirrors small collections into a
+``NumpyVectorStore`` and leaves large ones on Chroma's HNSW index. The
+mirror can also be a float16/int8 memory-mapped ``QuantizedVectorStore``
+(see rag.embedding_storage).
+
+All backends share one interface:
+
+    add(ids, embeddings, documents, metadatas)
+    query(query_embeddings, n_results)  -> one list of hits per query
+    get()                               -> {'ids', 'documents', 'metadatas'}
+    count()
+
+A hit is ``{'id', 'content', 'metadata', 'relevance_score'}`` where the score
+is the cosine similarity of the normalized embeddings.
+"""
+import numpy as np
+
+from rag.embedding_storage import QuantizedVectorStore, top_k
+
+# Vector index defaults: cosine space with Chroma's HNSW parameters made explicit
+DEFAULT_INDEX_CONFIG = {
+    'space': 'cosine',        # 'cosine', 'l2' or 'ip'
+    'construction_ef': 100,   # Candidate list size while building the graph
+    'search_ef': 50,          # Candidate list size at query time (recall vs latency)
+    'M': 16                   # Graph links per node (recall vs memory)
+}
+
+# Collections up to this many vectors are searched by brute force in memory
+# (20k x 384 float32 is about 30 MB)
+BRUTE_FORCE_MAX_VECTORS = 20000
+
+VECTOR_BACKENDS = ('auto', 'numpy', 'chroma')
+
+
+def index_metadata(index_config):
+    """Translate an index config into Chroma collection metadata."""
+    return {
+        'hnsw:space': index_config['space'],
+        'hnsw:construction_ef': index_config['construction_ef'],
+        'hnsw:search_ef': index_config['search_ef'],
+        'hnsw:M': index_config['M']
+    }
+
+
+def distance_to_similarity(distance, space):
+    """Convert a Chroma distance into a similarity score in [-1, 1].
+
+    Embeddings are L2-normalized, so every space maps back to cosine similarity:
+    cosine and ip distances are ``1 - cos`` and squared L2 is ``2 - 2 * cos``.
+    """
+    if space == 'l2':
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def as_matrix(embeddings):
+    """Return embeddings as a C-contiguous 2-D float32 array without copying when possible."""
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return matrix
+
+
+class ChromaVectorStore:
+    """Persistent backend wrapping a Chroma collection (HNSW index)."""
+
+    name = 'chroma'
+
+    def __init__(self, collection, space=DEFAULT_INDEX_CONFIG['space'], batch_size=5000):
+        self.collection = collection
+        self.space = space
+        self.batch_size = batch_size
+
+    def count(self):
+        return self.collection.count()
+
+    def memory_bytes(self):
+        """Vectors and documents stay in Chroma, nothing is held in process memory."""
+        return 0
+
+    def add(self, ids, embeddings, documents, metadatas):
+        matrix = as_matrix(embeddings)
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            self.collection.add(
+                ids=list(ids[start:end]),
+                embeddings=matrix[start:end].tolist(),
+                documents=list(documents[start:end]),
+                metadatas=list(metadatas[start:end])
+            )
+
+    def update_metadatas(self, ids, metadatas):
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            self.collection.update(ids=list(ids[start:end]), metadatas=list(metadatas[start:end]))
+
+    def query(self, query_embeddings, n_results=5):
+        results = self.collection.query(
+            query_embeddings=as_matrix(query_embeddings).tolist(),
+            n_results=n_results
+        )
+        hits = []
+        for q in range(len(results['ids'])):
+            hits.append([
+                {
+                    'id': results['ids'][q][i],
+                    'content': results['documents'][q][i],
+                    'metadata': results['metadatas'][q][i],
+                    'relevance_score': distance_to_similarity(results['distances'][q][i], self.space)
+                }
+                for i in range(len(results['ids'][q]))
+            ])
+        return hits
+
+    def get(self):
+        results = self.collection.get(include=['documents', 'metadatas'])
+        return {'ids': results['ids'], 'documents': results['documents'], 'metadatas': results['metadatas']}
+
+    def iter_batches(self, batch_size=None, embeddings=True):
+        """Yield ``(ids, embeddings, documents, metadatas)`` batches of the whole collection.
+
+        Without ``embeddings`` the vectors are not fetched and yielded as None.
+        """
+        batch_size = batch_size or self.batch_size
+        include = ['embeddings', 'documents', 'metadatas'] if embeddings else ['documents', 'metadatas']
+        offset = 0
+        while True:
+            results = self.collection.get(include=include, limit=batch_size, offset=offset)
+            if not results['ids']:
+                break
+            yield (results['ids'], results['embeddings'] if embeddings else None, results['documents'],
+                   results['metadatas'])
+            offset += len(results['ids'])
+
+
+class NumpyVectorStore:
+    """In-memory exact search over a contiguous float32 matrix.
+
+    Vectors are appended into a preallocated array that grows geometrically,
+    and queries are answered with one matrix product plus ``argpartition``
+    for the top k, so a batch of queries costs a single BLAS call.
+    """
+
+    name = 'numpy'
+
+    def __init__(self, dim=None, initial_capacity=1024):
+        self.dim = dim
+        self._matrix = np.empty((initial_capacity, dim), dtype=np.float32) if dim else None
+        self._size = 0
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+
+    @classmethod
+    def from_store(cls, store, batch_size=5000):
+        """Load every vector of another backend (e.g. a Chroma collection) into memory."""
+        numpy_store = cls()
+        for ids, embeddings, documents, metadatas in store.iter_batches(batch_size):
+            numpy_store.add(ids, embeddings, documents, metadatas)
+        return numpy_store
+
+    @property
+    def embeddings(self):
+        """View of the stored vectors (no copy)."""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def count(self):
+        return self._size
+
+    def memory_bytes(self):
+        """Approximate resident size: the allocated matrix plus document text."""
+        matrix = self._matrix.nbytes if self._matrix is not None else 0
+        return matrix + sum(len(doc) for doc in self.documents)
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add(self, ids, embeddings, documents, metadatas):
+        matrix = as_matrix(embeddings)
+        if not len(matrix):
+            return
+        if self._matrix is None:
+            self.dim = matrix.shape[1]
+            self._matrix = np.empty((max(1024, len(matrix)), self.dim), dtype=np.float32)
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim embeddings, got {matrix.shape[1]}")
+
+        self._reserve(len(matrix))
+        self._matrix[self._size:self._size + len(matrix)] = matrix
+        self._size += len(matrix)
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+
+    def update_metadatas(self, ids, metadatas):
+        position = {id_: i for i, id_ in enumerate(self.ids)}
+        for id_, metadata in zip(ids, metadatas):
+            self.metadatas[position[id_]] = metadata
+
+    def query(self, query_embeddings, n_results=5):
+        queries = as_matrix(query_embeddings)
+        if self._size == 0:
+            return [[] for _ in range(len(queries))]
+
+        top, top_scores = top_k(queries @ self.embeddings.T, n_results)
+        return [
+            [
+                {
+                    'id': self.ids[i],
+                    'content': self.documents[i],
+                    'metadata': self.metadatas[i],
+                    'relevance_score': float(score)
+                }
+                for i, score in zip(row.tolist(), row_scores.tolist())
+            ]
+            for row, row_scores in zip(top, top_scores)
+        ]
+
+    def get(self):
+        return {'ids': list(self.ids), 'documents': list(self.documents), 'metadatas': list(self.metadatas)}
+
+
+def select_vector_store(chroma_store, backend='auto', max_brute_force=BRUTE_FORCE_MAX_VECTORS,
+                        embedding_dtype='float32', storage_path=None):
+    """Pick the query backend for a Chroma-backed collection.
+
+    ``'auto'`` mirrors the collection into memory when it has at most
+    ``max_brute_force`` vectors and otherwise queries Chroma directly. With a
+    float16 or int8 ``embedding_dtype`` the mirror is a memory-mapped file at
+    ``storage_path`` (see rag.embedding_storage) instead of a float32 array.
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend '{backend}', expected one of {VECTOR_BACKENDS}")
+    if backend == 'chroma' or (backend == 'auto' and chroma_store.count() > max_brute_force):
+        return chroma_store
+    if embedding_dtype != 'float32' and storage_path:
+        return QuantizedVectorStore.from_store(chroma_store, storage_path, embedding_dtype)
+    return NumpyVectorStore.from_store(chroma_store)
@@ -29,4 +29,4 @@ fi
 # Start Streamlit from root directory
 echo "🌐 Starting Streamlit application..."
 echo "   Access at: http://localhost:8501"
-cd streamlit_app && streamlit run app.py
+cd streamlit_app && streamlit run app.py --server.maxUploadSize 500
@@ -1,22 +1,38 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-import json
 import os
 import sys
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-# Add the shared directory to the path
+# Add the project and workspace shared directories to the path
 shared_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-if shared_path not in sys.path:
-    sys.path.insert(0, shared_path)
+workspace_shared_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+for path in (shared_path, workspace_shared_path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
 
 try:
-    from rag.pdf_chatbot import PDFRAGChatbot
+    from rag.session_manager import SessionManager
+    from rag.client import RemoteRAGChatbot
+    from rag.dedup import page_label
 except ImportError as e:
-    st.error(f"Could not import PDFRAGChatbot: {e}")
+    st.error(f"Could not import the RAG modules: {e}")
     st.error("Please ensure the shared/rag directory exists and contains pdf_chatbot.py")
     st.stop()
 
+from chat_history.store import ChatHistoryStore
+from chat_history.export import ChatExporter
+from llm.models import get_model_manager
+
+# Used when the installed models cannot be fetched from Ollama
+DEFAULT_MODELS = ["llama3.2", "llama3.1", "mistral", "codellama"]
+
+# Chat history store shared with the Chainlit app, keyed by user and session
+CHAT_HISTORY_DB = os.path.join(os.path.dirname(__file__), '..', 'data', 'pdf_chat_history.db')
+LEGACY_CHAT_HISTORY_FILE = "pdf_chat_history.json"
+CHAT_HISTORY_USER = "default"
+HISTORY_PAGE_SIZE = 20  # Conversations loaded at a time; older ones on request
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="PDF RAG Chatbot",
@@ -27,87 +43,162 @@ st.set_page_config(
 # Initialize session state
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
-if 'chatbot' not in st.session_state:
-    st.session_state.chatbot = None
+if 'history_has_older' not in st.session_state:
+    st.session_state.history_has_older = False
 if 'processing' not in st.session_state:
     st.session_state.processing = False
 if 'cancel_generation' not in st.session_state:
     st.session_state.cancel_generation = False
 
+@st.cache_resource
+def get_session_manager():
+    """Per-session document working sets shared by all sessions of this server process.
+
+    With ``RAG_SERVICE_URL`` set, documents are indexed and queried by a running rag.service.
+    """
+    factory = RemoteRAGChatbot if os.environ.get("RAG_SERVICE_URL") else None
+    return SessionManager(background_ingest=True, chatbot_factory=factory)
+
+def get_chatbot():
+    """Return this session's chatbot, reloading it from the index if it was evicted."""
+    return get_session_manager().get(get_session_id())
+
 def initialize_chatbot(pdf_file, model_name):
     """Initialize the PDF chatbot with the uploaded file."""
     try:
+        manager = get_session_manager()
+        session_id = get_session_id()
         if pdf_file is not None:
-            # Save uploaded file temporarily - updated path for new structure
-            temp_path = "../data/temp_pdf.pdf"
-            os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-            with open(temp_path, "wb") as f:
-                f.write(pdf_file.getvalue())
-
-            # Initialize chatbot with the uploaded file and force reload
-            chatbot = PDFRAGChatbot(pdf_file_path=temp_path, model_name=model_name)
-            # Force reload to ensure we're using the new file
-            reload_message = chatbot.force_reload_pdf(temp_path)
-            return chatbot, f"PDF uploaded and loaded successfully! {reload_message}"
+            # Stream the upload to a content-addressed file (no extra in-memory copy);
+            # pages are indexed in the background so questions can be asked right away
+            chatbot, upload = manager.open_upload(session_id, pdf_file, pdf_file.name, model_name)
+            size_mb = upload['size'] / (1024 * 1024)
+            if upload['reused']:
+                return chatbot, f"{pdf_file.name} ({size_mb:.1f} MB) was already indexed - reusing its embeddings"
+            return chatbot, f"PDF uploaded ({size_mb:.1f} MB), indexing started!"
         else:
             # Try to use existing test.pdf - updated path
             test_pdf_path = "../data/test.pdf"
             if os.path.exists(test_pdf_path):
-                chatbot = PDFRAGChatbot(pdf_file_path=test_pdf_path, model_name=model_name)
+                chatbot = manager.open(session_id, test_pdf_path, model_name, shared_collection=True)
                 return chatbot, "Using existing test.pdf file"
             else:
                 return None, "Please upload a PDF file"
     except Exception as e:
         return None, f"Error initializing chatbot: {str(e)}"
 
-def save_to_csv(chat_history):
-    """Save chat history to CSV with timestamp."""
-    if not chat_history:
-        return "No chat history to save"
-
+def show_ingestion_progress():
+    """Show how far the current document has been indexed."""
+    manager = get_session_manager()
+    chatbot = manager.peek(get_session_id())
+    progress = chatbot.ingestion_progress() if chatbot else None
+    stats = manager.stats()
+    if stats['sessions']:
+        st.caption(f"🧠 Working sets: {stats['resident']}/{stats['sessions']} in memory, "
+                   f"{stats['memory_mb']}/{stats['budget_mb']} MB")
+    if not progress:
+        return
+    total = progress['total_pages'] or '?'
+    if progress['status'] in ('pending', 'running'):
+        st.progress(progress['fraction'],
+                    text=f"📄 Indexing page {progress['pages_done']}/{total} - questions use the pages indexed so far")
+    elif progress['status'] == 'failed':
+        st.error(f"Indexing failed after {progress['pages_done']} pages: {progress['error']}")
+    elif progress['status'] == 'cancelled':
+        st.warning(f"Indexing stopped at page {progress['pages_done']}/{total}")
+    elif progress['chunks_indexed'] is None:
+        # Indexed by another rag.service worker that did not record the details
+        st.caption(f"📄 Indexed {total} pages")
+    else:
+        st.caption(f"📄 Indexed {total} pages ({progress['chunks_indexed']} chunks) in {progress['elapsed_s']}s")
+
+# Refresh the progress on its own while indexing (fragments need Streamlit 1.37+)
+if hasattr(st, 'fragment'):
+    show_ingestion_progress = st.fragment(run_every=1)(show_ingestion_progress)
+
+def describe_partial_coverage(result):
+    """Return e.g. '12/40 pages' when an answer was based on a partial index, else None."""
+    coverage = result.get('coverage') if isinstance(result, dict) else None
+    if not coverage or not coverage.get('partial'):
+        return None
+    return f"{coverage['pages_indexed']}/{coverage['total_pages'] or '?'} pages"
+
+EXPORT_COLUMNS = ['timestamp', 'query', 'response', 'model', 'temperature', 'top_p', 'top_k']
+
+def entry_to_export_row(entry):
+    """Map a stored chat entry to an export row."""
+    return {
+        'timestamp': entry['timestamp'],
+        'query': entry['query'],
+        'response': entry['response'],
+        'model': entry.get('model', 'N/A'),
+        'temperature': entry.get('temperature', 'N/A'),
+        'top_p': entry.get('top_p', 'N/A'),
+        'top_k': entry.get('top_k', 'N/A')
+    }
+
+def export_chat_history(file_format="csv"):
+    """Stream chat history from the store into a timestamped CSV or Parquet file."""
     try:
-        # Prepare data for CSV
-        csv_data = []
-        for entry in chat_history:
-            csv_data.append({
-                'timestamp': entry['timestamp'],
-                'query': entry['query'],
-                'response': entry['response'],
-                'model': entry.get('model', 'N/A'),
-                'temperature': entry.get('temperature', 'N/A'),
-                'top_p': entry.get('top_p', 'N/A'),
-                'top_k': entry.get('top_k', 'N/A')
-            })
-
-        df = pd.DataFrame(csv_data)
+        exporter = ChatExporter(get_history_store(), EXPORT_COLUMNS, entry_to_export_row)
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"chat_history_{timestamp}.csv"
-        df.to_csv(filename, index=False)
-        return f"Chat history saved to {filename}"
+        filename = f"chat_history_{timestamp}.{file_format}"
+        if file_format == "parquet":
+            rows = exporter.export_parquet(filename, user_id=CHAT_HISTORY_USER)
+        else:
+            rows = exporter.export_csv(filename, user_id=CHAT_HISTORY_USER)
+        return f"Chat history ({rows} entries) saved to {filename}"
     except Exception as e:
-        return f"Error saving to CSV: {str(e)}"
-
-def load_chat_history():
-    """Load chat history from JSON file."""
+        return f"Error saving to {file_format.upper()}: {str(e)}"
+
+@st.cache_resource
+def get_history_store():
+    """Open the chat history store once per server process."""
+    store = ChatHistoryStore(CHAT_HISTORY_DB)
+    store.import_legacy_json(LEGACY_CHAT_HISTORY_FILE, user_id=CHAT_HISTORY_USER)
+    return store
+
+def get_session_id():
+    """Return the Streamlit session id used to key history entries."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
+
+def load_chat_history(before_id=None):
+    """Load one page of chat history (newest first) and whether older entries exist."""
     try:
-        if os.path.exists("pdf_chat_history.json"):
-            with open("pdf_chat_history.json", "r") as f:
-                return json.load(f)
+        entries = get_history_store().page(user_id=CHAT_HISTORY_USER, limit=HISTORY_PAGE_SIZE + 1,
+                                           before_id=before_id)
+        return entries[:HISTORY_PAGE_SIZE], len(entries) > HISTORY_PAGE_SIZE
     except Exception as e:
         st.error(f"Error loading chat history: {e}")
-    return []
-
-def save_chat_history(chat_history):
-    """Save chat history to JSON file."""
+    return [], False
+
+def load_older_chat_history():
+    """Append the next older page to the history shown in this session."""
+    stored = [entry for entry in st.session_state.chat_history if '_id' in entry]
+    if not stored:
+        return
+    entries, has_older = load_chat_history(before_id=stored[-1]['_id'])
+    st.session_state.chat_history.extend(entries)
+    st.session_state.history_has_older = has_older
+
+def save_chat_entry(chat_entry):
+    """Append a single chat entry to the history store."""
     try:
-        with open("pdf_chat_history.json", "w") as f:
-            json.dump(chat_history, f, indent=2)
+        get_history_store().append(chat_entry, user_id=CHAT_HISTORY_USER, session_id=get_session_id())
     except Exception as e:
         st.error(f"Error saving chat history: {e}")
 
+def clear_chat_history():
+    """Delete this user's chat history from the history store."""
+    try:
+        get_history_store().clear(user_id=CHAT_HISTORY_USER)
+    except Exception as e:
+        st.error(f"Error clearing chat history: {e}")
+
 # Load existing chat history
 if not st.session_state.chat_history:
-    st.session_state.chat_history = load_chat_history()
+    st.session_state.chat_history, st.session_state.history_has_older = load_chat_history()
 
 # Main UI
 st.title("📚 PDF RAG Chatbot")
@@ -120,12 +211,22 @@ with st.sidebar:
     # PDF file upload
     uploaded_file = st.file_uploader("Upload PDF", type=['pdf'])
 
-    # Model selection
+    # Model selection from the models installed in Ollama
+    model_manager = get_model_manager()
     model_name = st.selectbox(
         "Select Model",
-        ["llama3.2", "llama3.1", "mistral", "codellama"],
+        model_manager.list_models(fallback=DEFAULT_MODELS) or DEFAULT_MODELS,
         index=0
     )
+    if st.session_state.get('warm_model') != model_name:
+        # Load the newly selected model in the background before the first request
+        st.session_state.warm_model = model_name
+        model_manager.warm_async(model_name)
+        chatbot = get_session_manager().peek(get_session_id())
+        if chatbot:
+            chatbot.model_name = model_name
+        get_session_manager().update(get_session_id(), model_name=model_name)
+    st.caption(f"📦 {model_manager.describe(model_name)}")
 
     # Parameters
     st.subheader("Generation Parameters")
@@ -141,6 +242,11 @@ with st.sidebar:
     summary_mode = st.checkbox("📋 Full Document Summary Mode",
                               help="Get comprehensive summary of entire document")
 
+    # Extractive fast path toggle
+    extractive_mode = st.checkbox("⚡ Extractive Fast Path",
+                                  help="Answer lookup questions with the best matching sentence and its page "
+                                       "when retrieval is decisive, skipping the LLM")
+
     st.divider()
 
     # Initialize chatbot button
@@ -148,28 +254,38 @@ with st.sidebar:
         with st.spinner("Initializing chatbot..."):
             chatbot, message = initialize_chatbot(uploaded_file, model_name)
             if chatbot:
-                st.session_state.chatbot = chatbot
                 st.success(message)
                 # Show document info
-                if hasattr(chatbot, 'collection') and chatbot.collection.count() > 0:
-                    st.info(f"📄 Document loaded with {chatbot.collection.count()} text chunks")
+                chunk_count = chatbot.chunk_count()
+                if chunk_count > 0 and not chatbot.coverage()['partial']:
+                    st.info(f"📄 Document loaded with {chunk_count} text chunks")
             else:
                 st.error(message)
 
+    show_ingestion_progress()
+
     st.divider()
 
     # Export options
     st.subheader("Export Options")
     if st.button("💾 Save to CSV"):
         if st.session_state.chat_history:
-            message = save_to_csv(st.session_state.chat_history)
+            message = export_chat_history("csv")
+            st.success(message)
+        else:
+            st.warning("No chat history to save")
+
+    if st.button("📦 Save to Parquet"):
+        if st.session_state.chat_history:
+            message = export_chat_history("parquet")
             st.success(message)
         else:
             st.warning("No chat history to save")
 
     if st.button("🗑️ Clear Chat History"):
         st.session_state.chat_history = []
-        save_chat_history([])
+        st.session_state.history_has_older = False
+        clear_chat_history()
         st.success("Chat history cleared")
         st.rerun()
 
@@ -201,61 +317,103 @@ with col2:
         if st.button("❌ Cancel", type="secondary", use_container_width=True):
             st.session_state.cancel_generation = True
             st.session_state.processing = False
-
-# Process query
-if send_button and query.strip() and st.session_state.chatbot:
+            st.session_state.pending_query = None
+            # The interrupted run closes its own request; this also stops one still in flight
+            chatbot = get_session_manager().peek(get_session_id())
+            if chatbot:
+                chatbot.cancel_generation()
+            st.warning("Generation cancelled by user")
+
+def record_chat_entry(query, response_text, model_used, cancelled=False, partial_coverage=None):
+    """Add a chat entry to the session history and the history store."""
+    chat_entry = {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'query': query,
+        'response': response_text,
+        'model': model_used,
+        'temperature': temperature,
+        'top_p': top_p,
+        'top_k': top_k
+    }
+    if cancelled:
+        chat_entry['cancelled'] = True
+    if partial_coverage:
+        chat_entry['partial_coverage'] = partial_coverage
+
+    # Add to chat history (new responses at top)
+    st.session_state.chat_history.insert(0, chat_entry)
+    save_chat_entry(chat_entry)
+
+# Start processing on the next run so the Cancel button is shown while generating
+has_chatbot = get_session_manager().has_session(get_session_id())
+if send_button and query.strip() and has_chatbot:
     st.session_state.processing = True
     st.session_state.cancel_generation = False
+    st.session_state.pending_query = query
+    st.rerun()
+
+elif send_button and not has_chatbot:
+    st.error("Please initialize the chatbot first by uploading a PDF or using the existing test.pdf file")
+
+# Process query
+if st.session_state.processing and st.session_state.get('pending_query') and has_chatbot:
+    pending_query = st.session_state.pending_query
+    received = []
+    progress_box = st.empty()
+
+    def on_token(piece):
+        # Regular Streamlit calls give a Cancel click the chance to interrupt this run
+        received.append(piece)
+        if len(received) % 10 == 0:
+            progress_box.caption(f"⏳ {len(received)} tokens received...")
 
     # Show processing indicator
     with st.spinner("Generating response..."):
         try:
             # Generate response
-            result = st.session_state.chatbot.generate_response(
-                query,
+            chatbot = get_chatbot()
+            chatbot.model_name = model_name
+            result = chatbot.generate_response(
+                pending_query,
                 temperature=temperature,
                 top_p=top_p,
-                top_k=top_k
+                top_k=top_k,
+                on_token=on_token,
+                extractive=extractive_mode
             )
 
-            # Check if generation was cancelled
-            if not st.session_state.cancel_generation:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                if isinstance(result, dict):
-                    response_text = result['response']
-                    model_used = result.get('model', model_name)
-                else:
-                    response_text = str(result)
-                    model_used = model_name
-
-                # Add to chat history (new responses at top)
-                chat_entry = {
-                    'timestamp': timestamp,
-                    'query': query,
-                    'response': response_text,
-                    'model': model_used,
-                    'temperature': temperature,
-                    'top_p': top_p,
-                    'top_k': top_k
-                }
-
-                st.session_state.chat_history.insert(0, chat_entry)
-                save_chat_history(st.session_state.chat_history)
-
-                st.success("Response generated successfully!")
+            if isinstance(result, dict):
+                response_text = result['response']
+                model_used = result.get('model', model_name)
+                cancelled = result.get('cancelled', False)
             else:
+                response_text = str(result)
+                model_used = model_name
+                cancelled = False
+
+            partial_coverage = describe_partial_coverage(result)
+            record_chat_entry(pending_query, response_text, model_used, cancelled, partial_coverage)
+            if cancelled:
                 st.warning("Generation cancelled by user")
+            elif isinstance(result, dict) and result.get('answer_path') == 'extractive':
+                source = page_label(result['context_used'][0]['metadata']).lower()
+                st.success(f"⚡ Extractive answer from {source} "
+                           f"in {result['latency_ms']} ms")
+            else:
+                st.success("Response generated successfully!")
 
         except Exception as e:
             st.error(f"Error generating response: {str(e)}")
+        except BaseException:
+            # Cancel clicked: the request is already aborted, keep the partial answer
+            if received:
+                record_chat_entry(pending_query, "".join(received), model_name, cancelled=True)
+            raise
 
     st.session_state.processing = False
+    st.session_state.pending_query = None
     st.rerun()
 
-elif send_button and not st.session_state.chatbot:
-    st.error("Please initialize the chatbot first by uploading a PDF or using the existing test.pdf file")
-
 # Display chat history
 st.header("💬 Chat History")
 
@@ -273,6 +431,10 @@ if st.session_state.chat_history:
             # Display response
             st.markdown("**🤖 Response:**")
             st.write(entry['response'])
+            if entry.get('cancelled'):
+                st.caption("⏹️ Cancelled - partial response")
+            if entry.get('partial_coverage'):
+                st.caption(f"⚠️ Partial coverage - answered while indexing, from {entry['partial_coverage']}")
 
             # Display metadata
             col1, col2, col3, col4 = st.columns(4)
@@ -288,6 +450,10 @@ if st.session_state.chat_history:
         # Add separator between entries
         if i < len(st.session_state.chat_history) - 1:
             st.divider()
+
+    if st.session_state.history_has_older and st.button("⬇️ Load older conversations"):
+        load_older_chat_history()
+        st.rerun()
 else:
     st.info("No chat history yet. Start by asking a question about your PDF!")
 
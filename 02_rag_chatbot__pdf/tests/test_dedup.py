@@ -0,0 +1,50 @@
+"""Page furniture learning must not strip the content of short, form-like pages.
+
+Run from the 02_rag_chatbot__pdf/ directory:
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+from rag.dedup import learn_furniture, strip_furniture
+
+
+def invoice_page(number):
+    return "\n".join([
+        f"Invoice number: INV-{1000 + number}",
+        f"Amount due: ${100 + number * 7}.50",
+        f"Due date: 2024-03-{number:02d}",
+        f"Page {number} of 20"
+    ])
+
+
+def report_page(number):
+    body = "\n".join(f"Finding {number}.{line}: measured value {number * 13 + line}" for line in range(1, 11))
+    return f"ACME Corp Annual Report\n\n{body}\n\nPage {number} of 20"
+
+
+def test_short_form_pages_keep_their_content():
+    pages = [(number, invoice_page(number)) for number in range(1, 21)]
+    furniture = learn_furniture(pages)
+    for number, text in pages:
+        stripped, _ = strip_furniture(text, furniture, number)
+        assert f"INV-{1000 + number}" in stripped
+        assert "Amount due" in stripped
+
+
+def test_page_made_only_of_repeated_lines_is_kept():
+    pages = [(number, "Confidential\nDraft\nInternal use only\nDo not copy") for number in range(1, 11)]
+    furniture = learn_furniture(pages)
+    stripped, _ = strip_furniture(pages[0][1], furniture, 1)
+    assert "Draft" in stripped and "Internal use only" in stripped
+
+
+def test_running_header_and_page_numbers_are_stripped():
+    pages = [(number, report_page(number)) for number in range(1, 21)]
+    furniture = learn_furniture(pages)
+    stripped, removed = strip_furniture(pages[4][1], furniture, 5)
+    assert removed == 2
+    assert "ACME Corp Annual Report" not in stripped
+    assert "Page 5 of 20" not in stripped
+    assert "Finding 5.1: measured value 66" in stripped
@@ -0,0 +1,98 @@
+"""Ingest into an empty collection with every embedding storage dtype.
+
+Run from the 02_rag_chatbot__pdf/ directory:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+from rag.embedding_storage import STORAGE_DTYPES, EmbeddingFile, QuantizedVectorStore
+from rag.vector_store import select_vector_store
+
+
+class MemoryStore:
+    """Stand-in for ``ChromaVectorStore``: the store of record the mirrors are built from."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.ids, self.embeddings, self.documents, self.metadatas = [], [], [], []
+        self.embeddings_fetched = 0
+
+    def count(self):
+        return len(self.ids)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.ids.extend(ids)
+        self.embeddings.extend(np.asarray(embeddings, dtype=np.float32))
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+
+    def iter_batches(self, batch_size=None, embeddings=True):
+        if self.ids:
+            self.embeddings_fetched += len(self.ids) if embeddings else 0
+            yield self.ids, self.embeddings if embeddings else None, self.documents, self.metadatas
+
+
+def vectors(n, dim=384, seed=0):
+    matrix = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def ingest(store, mirror, matrix, first_id=0):
+    """Commit vectors the way ``PDFRAGChatbot._add_to_index`` does."""
+    ids = [f"chunk_{i}" for i in range(first_id, first_id + len(matrix))]
+    documents = [f"text {i}" for i in range(first_id, first_id + len(matrix))]
+    metadatas = [{'page': i + 1} for i in range(first_id, first_id + len(matrix))]
+    store.add(ids, matrix, documents, metadatas)
+    if mirror is not store:
+        mirror.add(ids, matrix, documents, metadatas)
+
+
+@pytest.mark.parametrize("dtype", STORAGE_DTYPES)
+def test_ingest_into_empty_collection(tmp_path, dtype):
+    path = str(tmp_path / "embeddings" / "collection")
+    store = MemoryStore()
+    mirror = select_vector_store(store, 'numpy', embedding_dtype=dtype, storage_path=path)
+    assert mirror.count() == 0
+
+    matrix = vectors(50)
+    ingest(store, mirror, matrix)
+    hits = mirror.query(matrix[7], n_results=3)[0]
+    assert mirror.count() == 50
+    assert hits[0]['id'] == "chunk_7"
+    assert hits[0]['metadata'] == {'page': 8}
+
+    if isinstance(mirror, QuantizedVectorStore):
+        mirror.check_recall(store)
+        assert mirror.file.info['recall_at_k'] > 0.9
+
+
+@pytest.mark.parametrize("dtype", ('float16', 'int8'))
+def test_rebuilt_collection_replaces_file(tmp_path, dtype):
+    path = str(tmp_path / "collection")
+    first = MemoryStore()
+    ingest(first, select_vector_store(first, 'numpy', embedding_dtype=dtype, storage_path=path), vectors(20))
+
+    # The collection was dropped and recreated empty; the old file must not be reused
+    rebuilt = MemoryStore()
+    mirror = select_vector_store(rebuilt, 'numpy', embedding_dtype=dtype, storage_path=path)
+    assert mirror.count() == 0
+    ingest(rebuilt, mirror, vectors(10, seed=1))
+    assert EmbeddingFile(path).count == 10
+
+
+def test_existing_file_is_shared_without_fetching_vectors(tmp_path):
+    path = str(tmp_path / "collection")
+    store = MemoryStore()
+    ingest(store, select_vector_store(store, 'numpy', embedding_dtype='float16', storage_path=path), vectors(30))
+    store.embeddings_fetched = 0
+
+    shared = QuantizedVectorStore.from_store(store, path, 'float16')
+    assert store.embeddings_fetched == 0
+    assert shared.count() == 30
+    assert shared.query(vectors(30)[4], n_results=1)[0][0]['content'] == "text 4"
@@ -0,0 +1,114 @@
+"""Incremental and streaming export of chat history.
+
+Exports read the history store in batches, so large histories are never
+materialized in memory. ``append_new`` keeps one rolling CSV file per target
+and only writes rows that were added since its last run, tracked by a row-id
+watermark kept in the store's metadata table.
+"""
+import csv
+import os
+
+
+class ChatExporter:
+    def __init__(self, store, columns, row_builder=None, batch_size=500):
+        """Create an exporter for ``store``.
+
+        ``columns`` is the ordered list of output columns and ``row_builder``
+        maps a stored entry to a dict of column values; by default the entry
+        keys are used as-is.
+        """
+        self.store = store
+        self.columns = list(columns)
+        self.row_builder = row_builder or (lambda entry: entry)
+        self.batch_size = batch_size
+
+    def _row(self, entry):
+        values = self.row_builder(entry)
+        return [values.get(column, '') for column in self.columns]
+
+    def _watermark_key(self, path, user_id, session_id):
+        return f"export:{os.path.abspath(path)}:{user_id or '*'}:{session_id or '*'}"
+
+    def append_entry(self, path, entry):
+        """Append a single entry to a rolling CSV file, writing the header if needed."""
+        file_exists = os.path.isfile(path) and os.path.getsize(path) > 0
+        with open(path, mode='a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            if not file_exists:
+                writer.writerow(self.columns)
+            writer.writerow(self._row(entry))
+        return path
+
+    def append_new(self, path, user_id=None, session_id=None):
+        """Append entries added since the last call to the rolling CSV at ``path``.
+
+        Returns the number of rows written.
+        """
+        key = self._watermark_key(path, user_id, session_id)
+        file_exists = os.path.isfile(path) and os.path.getsize(path) > 0
+        # Start over if the rolling file was removed since the last export
+        after_id = int(self.store.get_meta(key, 0)) if file_exists else 0
+
+        rows_written = 0
+        last_id = after_id
+        with open(path, mode='a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            if not file_exists:
+                writer.writerow(self.columns)
+            for entry in self.store.iter_entries(user_id, session_id, after_id=after_id,
+                                                 batch_size=self.batch_size):
+                writer.writerow(self._row(entry))
+                last_id = entry['_id']
+                rows_written += 1
+
+        if last_id != after_id:
+            self.store.set_meta(key, last_id)
+        return rows_written
+
+    def export_csv(self, path, user_id=None, session_id=None):
+        """Stream the full history (oldest first) into a new CSV file."""
+        rows_written = 0
+        with open(path, mode='w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(self.columns)
+            for entry in self.store.iter_entries(user_id, session_id, batch_size=self.batch_size):
+                writer.writerow(self._row(entry))
+                rows_written += 1
+        return rows_written
+
+    def export_parquet(self, path, user_id=None, session_id=None, compression='zstd'):
+        """Stream the full history into a compressed Parquet file.
+
+        Each batch read from the store becomes one row group, so memory use is
+        bounded by ``batch_size``. Values are written as strings so mixed-type
+        columns (e.g. ``'N/A'`` placeholders) stay readable. Requires pyarrow.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+
+        schema = pa.schema([(column, pa.string()) for column in self.columns])
+        rows_written = 0
+        batch = []
+
+        def flush(writer, rows):
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array([None if value is None else str(value) for value in values], type=pa.string())
+                for values in columns
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+        with pq.ParquetWriter(path, schema, compression=compression) as writer:
+            for entry in self.store.iter_entries(user_id, session_id, batch_size=self.batch_size):
+                batch.append(self._row(entry))
+                if len(batch) >= self.batch_size:
+                    flush(writer, batch)
+                    rows_written += len(batch)
+                    batch = []
+            if batch:
+                flush(writer, batch)
+                rows_written += len(batch)
+        return rows_written
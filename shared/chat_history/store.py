@@ -0,0 +1,248 @@
+"""Append-only chat history store shared by the chatbot apps.
+
+Every chat entry is one row in a SQLite table keyed by user and session, so
+saving a message is a single INSERT instead of rewriting the whole history
+file. Reads are paginated newest-first using the row id as a cursor, and
+deleted space is reclaimed by periodic compaction.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+DEFAULT_USER = "default"
+DEFAULT_SESSION = "default"
+
+
+class ChatHistoryStore:
+    def __init__(self, db_path, max_entries_per_user=None, compact_every=500):
+        """Open (or create) the history database at ``db_path``.
+
+        ``max_entries_per_user`` caps how many entries are kept per user when
+        compacting; ``None`` keeps everything. Compaction runs automatically
+        after every ``compact_every`` appends.
+        """
+        self.db_path = db_path
+        self.max_entries_per_user = max_entries_per_user
+        self.compact_every = compact_every
+        self._appends_since_compact = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        # Autocommit mode: every append is its own small WAL transaction
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            # auto_vacuum only takes effect before the first table is created
+            self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    entry TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chat_history_user ON chat_history (user_id, id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_id, id)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+
+    @staticmethod
+    def _where(user_id=None, session_id=None):
+        """Build the WHERE clause and parameters for a user/session filter."""
+        clauses = []
+        params = []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        return clauses, params
+
+    def append(self, entry, user_id=DEFAULT_USER, session_id=DEFAULT_SESSION):
+        """Append one entry and return its row id."""
+        payload = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO chat_history (user_id, session_id, entry) VALUES (?, ?, ?)",
+                (user_id, session_id, payload)
+            )
+            self._appends_since_compact += 1
+            row_id = cursor.lastrowid
+
+        if self.compact_every and self._appends_since_compact >= self.compact_every:
+            self.compact()
+        return row_id
+
+    def page(self, user_id=None, session_id=None, limit=50, before_id=None):
+        """Return up to ``limit`` entries, newest first.
+
+        Pass the ``_id`` of the last entry of a page as ``before_id`` to get
+        the next (older) page. ``limit=None`` returns everything.
+        """
+        clauses, params = self._where(user_id, session_id)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+
+        sql = "SELECT id, entry FROM chat_history"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(-1 if limit is None else limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        entries = []
+        for row_id, payload in rows:
+            entry = json.loads(payload)
+            entry['_id'] = row_id
+            entries.append(entry)
+        return entries
+
+    def iter_entries(self, user_id=None, session_id=None, after_id=None, batch_size=500):
+        """Yield entries oldest first, fetching ``batch_size`` rows at a time.
+
+        Only rows with an id greater than ``after_id`` are returned, which
+        lets callers resume from the last row they have already processed.
+        """
+        clauses, params = self._where(user_id, session_id)
+        clauses.append("id > ?")
+        last_id = after_id or 0
+
+        sql = "SELECT id, entry FROM chat_history WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id ASC LIMIT ?"
+
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, params + [last_id, batch_size]).fetchall()
+            if not rows:
+                return
+            for row_id, payload in rows:
+                entry = json.loads(payload)
+                entry['_id'] = row_id
+                yield entry
+            last_id = rows[-1][0]
+
+    def get_meta(self, key, default=None):
+        """Read a value from the store's key/value metadata table."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM store_meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        """Write a value to the store's key/value metadata table."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+                (key, str(value))
+            )
+
+    def count(self, user_id=None, session_id=None):
+        """Count stored entries for a user and/or session."""
+        clauses, params = self._where(user_id, session_id)
+        sql = "SELECT COUNT(*) FROM chat_history"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def clear(self, user_id=None, session_id=None):
+        """Delete the entries of a user and/or session (everything if neither is given)."""
+        clauses, params = self._where(user_id, session_id)
+        sql = "DELETE FROM chat_history"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            self._conn.execute(sql, params)
+        self.compact()
+
+    def compact(self):
+        """Apply the retention limit and give freed pages back to the filesystem."""
+        with self._lock:
+            if self.max_entries_per_user:
+                self._conn.execute("""
+                    DELETE FROM chat_history WHERE id IN (
+                        SELECT id FROM (
+                            SELECT id, ROW_NUMBER() OVER (
+                                PARTITION BY user_id ORDER BY id DESC
+                            ) AS rn
+                            FROM chat_history
+                        ) WHERE rn > ?
+                    )
+                """, (self.max_entries_per_user,))
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._appends_since_compact = 0
+
+    def import_legacy_json(self, json_path, user_id=DEFAULT_USER, session_id=DEFAULT_SESSION, transform=None):
+        """Import a legacy whole-file JSON history once.
+
+        The legacy files store entries newest first. ``transform`` can convert
+        the loaded list into store entries (still newest first) when the old
+        format differs. Returns the number of imported entries.
+        """
+        if not os.path.exists(json_path):
+            return 0
+
+        meta_key = f"imported:{os.path.abspath(json_path)}"
+        with self._lock:
+            already_imported = self._conn.execute(
+                "SELECT 1 FROM store_meta WHERE key = ?", (meta_key,)
+            ).fetchone()
+        if already_imported:
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading legacy chat history {json_path}: {e}")
+            return 0
+
+        if transform:
+            entries = transform(entries)
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # Insert oldest first so row ids follow chronological order
+                self._conn.executemany(
+                    "INSERT INTO chat_history (user_id, session_id, entry) VALUES (?, ?, ?)",
+                    [
+                        (user_id, session_id, json.dumps(entry, ensure_ascii=False))
+                        for entry in reversed(entries)
+                    ]
+                )
+                self._conn.execute(
+                    "INSERT INTO store_meta (key, value) VALUES (?, ?)",
+                    (meta_key, str(len(entries)))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(entries)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,180 @@
+"""Cancellable streaming requests against the Ollama HTTP API.
+
+The ``ollama`` client hides the underlying HTTP response, so iterating its
+stream cannot be interrupted from another thread and an abandoned stream
+keeps the model generating. A ``GenerationHandle`` owns the response
+instead: ``cancel()`` closes the connection, which makes Ollama stop
+generating immediately, and the text received so far stays available.
+"""
+import json
+import os
+import threading
+
+import httpx
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+
+def ollama_base_url(base_url=None):
+    """Resolve the Ollama URL from the argument, ``OLLAMA_HOST`` or the default."""
+    url = base_url or os.environ.get("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST
+    if not url.startswith(("http://", "https://")):
+        url = f"http://{url}"
+    return url.rstrip("/")
+
+
+class GenerationCancelled(Exception):
+    """Raised by ``GenerationHandle.result()`` when the generation was cancelled."""
+
+
+class GenerationHandle:
+    """One streaming ``/api/chat`` or ``/api/generate`` request.
+
+    Iterate the handle to receive the parsed JSON chunks. ``cancel()`` may be
+    called from any thread; iteration then stops and ``cancelled`` is set.
+    """
+
+    def __init__(self, endpoint, payload, base_url=None, timeout=None):
+        self.endpoint = endpoint
+        self.payload = dict(payload, stream=True)
+        self.base_url = ollama_base_url(base_url)
+        self.timeout = timeout
+        self.cancelled = False
+        self.done = False
+        self.final_chunk = {}
+        self._parts = []
+        self._lock = threading.Lock()
+        self._client = None
+        self._response = None
+
+    @property
+    def text(self):
+        """Text received so far (the full answer once ``done``)."""
+        return "".join(self._parts)
+
+    def _open(self):
+        with self._lock:
+            if self.cancelled:
+                return None
+            client = self._client = httpx.Client(base_url=self.base_url, timeout=self.timeout)
+
+        # Sending blocks until Ollama has loaded the model, so it runs outside
+        # the lock; cancel() closes the client, which aborts the send
+        request = client.build_request("POST", self.endpoint, json=self.payload)
+        try:
+            response = client.send(request, stream=True)
+        except (httpx.StreamError, httpx.TransportError, RuntimeError):
+            if self.cancelled:
+                return None
+            raise
+
+        with self._lock:
+            if not self.cancelled:
+                self._response = response
+                return response
+        response.close()
+        client.close()
+        return None
+
+    def __iter__(self):
+        response = self._open()
+        if response is None:
+            return
+        try:
+            if response.status_code >= 400:
+                response.read()
+                raise RuntimeError(f"Ollama error {response.status_code}: {response.text}")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if 'error' in chunk:
+                    raise RuntimeError(chunk['error'])
+                content = chunk.get('message', {}).get('content') or chunk.get('response') or ""
+                if content:
+                    self._parts.append(content)
+                if chunk.get('done'):
+                    self.done = True
+                    self.final_chunk = chunk
+                yield chunk
+        except (httpx.StreamError, httpx.TransportError):
+            # Closing the response from cancel() surfaces as a stream error here
+            if not self.cancelled:
+                raise
+        finally:
+            self._close()
+
+    def iter_text(self):
+        """Iterate only the non-empty text pieces of the stream."""
+        for chunk in self:
+            content = chunk.get('message', {}).get('content') or chunk.get('response') or ""
+            if content:
+                yield content
+
+    def result(self):
+        """Consume the stream and return the full text."""
+        for _ in self:
+            pass
+        if self.cancelled:
+            raise GenerationCancelled(self.text)
+        return self.text
+
+    def cancel(self):
+        """Abort the request and close the connection so Ollama stops generating."""
+        with self._lock:
+            if self.done or self.cancelled:
+                return
+            self.cancelled = True
+        self._close()
+
+    def _close(self):
+        with self._lock:
+            response, client = self._response, self._client
+            self._response = self._client = None
+        if response is not None:
+            response.close()
+        if client is not None:
+            client.close()
+
+
+def chat(model, messages, options=None, base_url=None, **kwargs):
+    """Start a cancellable streaming chat request."""
+    payload = {'model': model, 'messages': messages, 'options': options or {}}
+    payload.update(kwargs)
+    return GenerationHandle("/api/chat", payload, base_url=base_url)
+
+
+def generate(model, prompt, options=None, base_url=None, **kwargs):
+    """Start a cancellable streaming completion request."""
+    payload = {'model': model, 'prompt': prompt, 'options': options or {}}
+    payload.update(kwargs)
+    return GenerationHandle("/api/generate", payload, base_url=base_url)
+
+
+class GenerationRegistry:
+    """Process-wide map of running generations, so another script run or
+    callback can cancel a request it did not start."""
+
+    def __init__(self):
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def register(self, key, handle):
+        with self._lock:
+            self._handles[key] = handle
+
+    def unregister(self, key, handle=None):
+        with self._lock:
+            if handle is None or self._handles.get(key) is handle:
+                self._handles.pop(key, None)
+
+    def cancel(self, key):
+        """Cancel the generation registered under ``key``; returns its handle or None."""
+        with self._lock:
+            handle = self._handles.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        return handle
+
+
+active_generations = GenerationRegistry()
@@ -0,0 +1,223 @@
+"""Ollama model discovery, preloading and keep-alive management.
+
+``ModelManager`` lists the models installed in Ollama (cached for a short
+time), warms a model in the background when the user selects it so the first
+real request does not pay the load time, and chooses a ``keep_alive`` value
+per model from how often this process has used it recently. Load times
+reported by Ollama are recorded per model, and each model's trained context
+length is looked up once with ``/api/show``.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from llm.generation import ollama_base_url
+
+# keep_alive values understood by Ollama
+KEEP_ALIVE_HOT = "30m"
+KEEP_ALIVE_WARM = "10m"
+KEEP_ALIVE_DEFAULT = "5m"
+
+# Ollama reports a load_duration of a few milliseconds for a model that is
+# already loaded; only longer ones are counted as loads
+COLD_LOAD_MIN_SECONDS = 0.25
+
+
+class ModelManager:
+    def __init__(self, base_url=None, cache_ttl=60, usage_window=900, hot_uses=3, request_timeout=10):
+        """``usage_window`` (seconds) is how far back usage counts; a model used
+        at least ``hot_uses`` times within it is kept loaded longest."""
+        self.base_url = ollama_base_url(base_url)
+        self.cache_ttl = cache_ttl
+        self.usage_window = usage_window
+        self.hot_uses = hot_uses
+        self.request_timeout = request_timeout
+
+        self._models = None
+        self._models_fetched_at = 0.0
+        self._usage = defaultdict(deque)
+        # model -> {'last', 'total', 'count'} of cold loads, in seconds
+        self._loads = {}
+        self._warming = {}
+        self._context_lengths = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-warmup")
+
+    def _post(self, path, payload, timeout=None):
+        response = httpx.post(f"{self.base_url}{path}", json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def list_models(self, fallback=None, refresh=False):
+        """Names of installed models, cached for ``cache_ttl`` seconds.
+
+        Returns ``fallback`` (or the last known list) if Ollama is unreachable.
+        """
+        with self._lock:
+            fresh = self._models is not None and time.monotonic() - self._models_fetched_at < self.cache_ttl
+            if fresh and not refresh:
+                return list(self._models)
+
+        try:
+            response = httpx.get(f"{self.base_url}/api/tags", timeout=self.request_timeout)
+            response.raise_for_status()
+            models = sorted(m['name'] for m in response.json().get('models', []))
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Could not list Ollama models: {e}")
+            with self._lock:
+                return list(self._models) if self._models else list(fallback or [])
+
+        with self._lock:
+            self._models = models
+            self._models_fetched_at = time.monotonic()
+        return list(models)
+
+    def loaded_models(self):
+        """Names of models currently loaded in Ollama's memory."""
+        try:
+            response = httpx.get(f"{self.base_url}/api/ps", timeout=self.request_timeout)
+            response.raise_for_status()
+            return [m['name'] for m in response.json().get('models', [])]
+        except (httpx.HTTPError, ValueError):
+            return []
+
+    def context_length(self, model):
+        """Trained context length of ``model`` in tokens, or None if Ollama does not report it."""
+        with self._lock:
+            if model in self._context_lengths:
+                return self._context_lengths[model]
+        try:
+            info = self._post("/api/show", {'model': model}, timeout=self.request_timeout).get('model_info') or {}
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Could not look up the context length of {model}: {e}")
+            return None
+        # Keyed by architecture, e.g. "llama.context_length"
+        length = next((value for key, value in info.items() if key.endswith(".context_length")), None)
+        with self._lock:
+            self._context_lengths[model] = length
+        return length
+
+    def record_use(self, model):
+        """Note that a request for ``model`` is about to be made."""
+        now = time.monotonic()
+        with self._lock:
+            uses = self._usage[model]
+            uses.append(now)
+            while uses and now - uses[0] > self.usage_window:
+                uses.popleft()
+
+    def record_load(self, model, load_duration_ns):
+        """Record a load time reported by Ollama (``load_duration`` in nanoseconds).
+
+        Requests served by an already loaded model are ignored.
+        """
+        seconds = (load_duration_ns or 0) / 1e9
+        if seconds < COLD_LOAD_MIN_SECONDS:
+            return
+        with self._lock:
+            loads = self._loads.setdefault(model, {'last': 0.0, 'total': 0.0, 'count': 0})
+            loads['last'] = seconds
+            loads['total'] += seconds
+            loads['count'] += 1
+
+    def keep_alive_for(self, model):
+        """Pick how long Ollama should keep ``model`` loaded after a request."""
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._usage.get(model, ()) if now - t <= self.usage_window]
+        if len(recent) >= self.hot_uses:
+            return KEEP_ALIVE_HOT
+        if recent:
+            return KEEP_ALIVE_WARM
+        return KEEP_ALIVE_DEFAULT
+
+    def preload(self, model):
+        """Load ``model`` into memory now and return the load time in seconds."""
+        start = time.perf_counter()
+        # An empty prompt makes Ollama load the model without generating
+        result = self._post("/api/generate", {
+            'model': model,
+            'prompt': "",
+            'keep_alive': self.keep_alive_for(model),
+            'stream': False
+        })
+        load_duration = result.get('load_duration')
+        if load_duration:
+            self.record_load(model, load_duration)
+            return load_duration / 1e9
+        return time.perf_counter() - start
+
+    def warm_async(self, model):
+        """Preload ``model`` in the background (once at a time per model).
+
+        Idle models this process used earlier are released first to make room.
+        Returns a future resolving to the load time in seconds.
+        """
+        with self._lock:
+            future = self._warming.get(model)
+            if future is not None and not future.done():
+                return future
+
+            def warm():
+                self.release_idle(keep=model)
+                return self.preload(model)
+
+            future = self._executor.submit(warm)
+            self._warming[model] = future
+            return future
+
+    def unload(self, model):
+        """Ask Ollama to unload ``model`` immediately."""
+        try:
+            self._post("/api/generate", {'model': model, 'keep_alive': 0, 'stream': False},
+                       timeout=self.request_timeout)
+        except httpx.HTTPError as e:
+            print(f"Could not unload {model}: {e}")
+
+    def release_idle(self, keep=None):
+        """Unload loaded models that this process used before but not within the usage window.
+
+        Models this process never used are left alone, since another app may
+        be relying on them.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = {
+                model for model, uses in self._usage.items()
+                if model != keep and (not uses or now - uses[-1] > self.usage_window)
+            }
+        for model in self.loaded_models():
+            if model in idle:
+                self.unload(model)
+
+    def load_stats(self, model):
+        """Return ``(last, average, count)`` load times in seconds for ``model``."""
+        with self._lock:
+            loads = self._loads.get(model)
+            if not loads:
+                return None
+            return loads['last'], loads['total'] / loads['count'], loads['count']
+
+    def describe(self, model):
+        """Short human-readable load-time summary for display."""
+        stats = self.load_stats(model)
+        if not stats:
+            return f"{model}: no load measured yet"
+        last, average, count = stats
+        return f"{model}: last load {last:.2f}s, average {average:.2f}s over {count} load(s)"
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_model_manager(base_url=None):
+    """Return the process-wide ModelManager for an Ollama URL."""
+    url = ollama_base_url(base_url)
+    with _managers_lock:
+        if url not in _managers:
+            _managers[url] = ModelManager(url)
+        return _managers[url]